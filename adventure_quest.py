@@ -6,6 +6,17 @@ import math # Used for sqrt in scoring
 # Set a seed for testing, as required
 random.seed(42)
 
+# Binary save slot next to the readable save_game_state.txt (see save_journal.py)
+SAVE_JOURNAL_PATH = "save_game_state.aqj"
+SAVE_JOURNAL = None # Opened by the first save and kept, so later saves only append their changes
+# Final scores of every finished game (see leaderboard.py)
+LEADERBOARD_PATH = "leaderboard.aql"
+LEADERBOARD = None # (loader thread, [Leaderboard or the error]) once open_leaderboard() started it
+# Gameplay event recorder (an event_log.SessionEvents), set up by main() when AQ_EVENTS names a log directory
+EVENTS = None
+# Everything a turn prints is buffered here and written together with the next prompt (see screen())
+SCREEN = None
+
 # --- Global Game State Setup ---
 # Player dictionary structure
 PLAYER = {
@@ -28,6 +39,29 @@ def welcome_screen():
     print("The Quest for the Ancient Relic".center(60))
     print("=" * 60)
 
+def screen():
+    """
+    The game's renderer.Renderer over stdout, created on first use: once the
+    name prompt is up, so the first frame never waits for it.
+    """
+    global SCREEN
+    if SCREEN is None:
+        import renderer
+        SCREEN = renderer.Renderer(renderer.StreamSink())
+    return SCREEN
+
+
+def show(text: str = ""):
+    """print() for the game's turn text: buffered until the next prompt."""
+    screen().write(text)
+
+
+def ask(prompt: str = "") -> str:
+    """Writes the turn's text and `prompt` in one go, then reads the player's answer."""
+    screen().flush(prompt)
+    return input()
+
+
 def player_creation():
     """2. Player name input and character creation."""
     global PLAYER
@@ -35,18 +69,18 @@ def player_creation():
     PLAYER['name'] = name if name else "Traveler"
     
     # Bonus Challenge: Difficulty System
-    print("\nSelect Difficulty:")
-    print("1: Normal (1.0x Challenge)")
-    print("2: Hard (1.5x Challenge)")
+    show("\nSelect Difficulty:")
+    show("1: Normal (1.0x Challenge)")
+    show("2: Hard (1.5x Challenge)")
     
     # Use validate_input for a simple choice
-    choice = gu.validate_input("Choose a number", ['1', '2'])
+    choice = gu.validate_input("Choose a number", ['1', '2'], show, ask)
     
     if choice == '2':
         PLAYER['difficulty'] = 1.5
-        print(f"\nWelcome, **{PLAYER['name']}**! You have chosen **Hard** difficulty.")
+        show(f"\nWelcome, **{PLAYER['name']}**! You have chosen **Hard** difficulty.")
     else:
-        print(f"\nWelcome, **{PLAYER['name']}**! You have chosen **Normal** difficulty.")
+        show(f"\nWelcome, **{PLAYER['name']}**! You have chosen **Normal** difficulty.")
     
     PLAYER['visited_locations'].add(PLAYER['location'])
 
@@ -56,200 +90,256 @@ def display_location():
     location_key = PLAYER['location']
     location_data = gu.get_location_data(location_key)
     
-    # Bonus: Display ASCII art
-    print(gu.get_location_ascii(location_key))
+    # Bonus: ASCII art, title, description and actions come as one cached frame
+    import renderer
+    show(renderer.location_frame(location_key, location_data))
     
-    print(f"\n🗺️ You are at the **{location_key.replace('_', ' ').title()}**.")
-    print("-" * 50)
-    print(location_data['description'])
-    print("-" * 50)
-    
-    # For loop to display available actions
-    print("Available actions:")
-    for i, action in enumerate(location_data['actions']):
-        print(f"- {action.title()}")
-    
-    # Add standard commands
-    standard_actions = ['status', 'inventory', 'quit', 'save']
-    for action in standard_actions:
-         print(f"- {action.title()}")
-        
-    all_valid_actions = location_data['actions'] + standard_actions
-    
-    return all_valid_actions
+    # Its actions plus the standard commands, compiled once per location
+    return gu.location_commands(location_key)
+
+
+def event_rules():
+    """
+    The event_engine module with the declared random events and challenges.
+    Imported on first use, since nothing needs it before the first turn.
+    """
+    import event_engine
+    return event_engine
 
 
 def handle_challenge(challenge_type: str):
     """
     Handles combat or challenge system using random and scoring.
+    The odds and effects are resolved by event_engine; this function only talks to the player.
     """
     global PLAYER
-    
-    if challenge_type == 'GHOSTLY_ENCOUNTER':
-        print("\n👻 **A spectral guardian blocks your path! Combat initiated!**")
-        
+    rules = event_rules()
+    challenge = rules.shared_engine().challenges.get(challenge_type)
+    if challenge is None:
+        return True
+    show(challenge.intro)
+
+    if challenge.kind == 'combat':
         # Bonus: Simple Combat System using a while loop and health tracking
         while PLAYER['health'] > 0:
-            print(f"\n--- Your Health: {PLAYER['health']} HP ---")
+            show(f"\n--- Your Health: {PLAYER['health']} HP ---")
             
             # Nested Conditional (Level 1)
-            action = gu.validate_input("Attack or Run?", ['attack', 'run'])
+            action = gu.validate_input("Attack or Run?", ['attack', 'run'], show, ask)
+            result = rules.combat_round(challenge, action, PLAYER['health'], PLAYER['score'],
+                                        PLAYER['difficulty'], random)
+            PLAYER['health'], PLAYER['score'] = result.health, result.score
             
             if action == 'run':
-                print("You attempt to flee...")
-                # Random event using random.random()
-                if random.random() > 0.6: 
-                    print("You escape successfully, but you lose 10 points for cowardice!")
-                    PLAYER['score'] = max(0, PLAYER['score'] - 10)
+                show("You attempt to flee...")
+                if result.escaped:
+                    show(f"You escape successfully, but you lose {challenge.flee_penalty} points for cowardice!")
+                    if EVENTS is not None:
+                        EVENTS.emit('flee', escaped=True, location=PLAYER['location'])
+                        EVENTS.milestone('fled_ghost')
+                        EVENTS.milestone('passed_ghost')
                     return True # Challenge passed by fleeing
-                else:
-                    print("The ghost catches you! You must fight.")
-                    action = 'attack' # Force attack if run fails
-
-            if action == 'attack':
-                # Nested Conditional (Level 2)
-                damage_taken, message = gu.calculate_damage(PLAYER['difficulty'])
-                PLAYER['health'] -= damage_taken
-                print(message)
+                show("The ghost catches you! You must fight.") # Failed escapes turn into an attack
+                if EVENTS is not None:
+                    EVENTS.emit('flee', escaped=False, location=PLAYER['location'])
+
+            show(result.message)
+            if EVENTS is not None:
+                EVENTS.emit('combat_round', damage=result.damage, health=PLAYER['health'], won=result.won,
+                            location=PLAYER['location'])
+                if result.won:
+                    EVENTS.milestone('defeated_ghost')
+                    EVENTS.milestone('passed_ghost')
+            # Combat success/failure check
+            if result.damage == 0:
+                # Player landed a 'hit' or dodged successfully (higher reward on harder setting)
+                show(f"You strike a blow! +{challenge.hit_score} score.")
                 
-                # Combat success/failure check
-                if damage_taken == 0:
-                    # Player landed a 'hit' or dodged successfully
-                    PLAYER['score'] += int(5 * (1/PLAYER['difficulty'])) # Higher reward on harder setting
-                    print("You strike a blow! +5 score.")
+                # Nested Conditional (Level 2 - Victory Check)
+                if result.won:
+                    show(challenge.victory)
+                    show(f"You gained {math.floor(math.sqrt(PLAYER['score']))} bonus points for bravery!") # Math demonstration: sqrt
+                    # Remove the challenge from the location after completion
+                    gu.clear_location_challenge(PLAYER['location'])
+                    return True
                     
-                    # Nested Conditional (Level 3 - Victory Check)
-                    if random.randint(1, 100) <= 20: # 20% chance to win per hit
-                        PLAYER['score'] += 50
-                        print("✨ **You defeated the spectral guardian!**")
-                        print(f"You gained {math.floor(math.sqrt(PLAYER['score']))} bonus points for bravery!") # Math demonstration: sqrt
-                        # Remove the challenge from the location after completion
-                        gu.LOCATIONS[PLAYER['location']]['challenge'] = None 
-                        return True
-                        
-                elif PLAYER['health'] <= 0:
-                    return False # Player defeated
-                
-                else:
-                    print("You miss! The guardian lunges at you.")
+            elif PLAYER['health'] <= 0:
+                return False # Player defeated
+            
+            else:
+                show("You miss! The guardian lunges at you.")
         
         return False # Should only be reached if health <= 0
 
-    elif challenge_type == 'FINAL_PUZZLE':
-        print("\n🧩 **The chest is locked. An inscription reads: 'The number of places you've been, multiplied by the first letter's value (A=1), minus the points lost by running.**")
-        
-        # Required concepts for math scoring
-        num_visited = len(PLAYER['visited_locations'])
-        first_letter_value = ord(PLAYER['name'][0].upper()) - ord('A') + 1 # String slicing demo: PLAYER['name'][0]
-        points_lost_running = 10 if "coward" in PLAYER['visited_locations'] else 0 # Simple flag
-        
-        correct_answer = num_visited * first_letter_value - points_lost_running
-        
-        try:
-            # Use int() for math operation
-            user_answer = int(input("What is the answer to unlock the chest? "))
-        except ValueError:
-            user_answer = -1
-
-        if user_answer == correct_answer:
-            print("🔓 **CLANK!** The chest opens! The relic is yours!")
-            PLAYER['inventory'].append('Ancient Relic')
-            gu.LOCATIONS[PLAYER['location']]['challenge'] = None
+    elif challenge.kind == 'puzzle':
+        # Places visited times the name's first letter value, minus the points lost by running
+        user_answer = ask("What is the answer to unlock the chest? ")
+        correct = rules.check_answer(challenge, user_answer, PLAYER)
+        if EVENTS is not None:
+            EVENTS.emit('puzzle', answer=user_answer, correct=correct)
+
+        if correct:
+            show("🔓 **CLANK!** The chest opens! The relic is yours!")
+            PLAYER['inventory'].append(challenge.reward)
+            gu.clear_location_challenge(PLAYER['location'])
+            if EVENTS is not None:
+                EVENTS.milestone('solved_puzzle')
             return True
         else:
-            print("❌ The mechanism whirs and locks tighter. You lose 5 points for the mistake.")
-            PLAYER['score'] = max(0, PLAYER['score'] - 5)
+            show(f"❌ The mechanism whirs and locks tighter. You lose {challenge.penalty} points for the mistake.")
+            PLAYER['score'] = max(0, PLAYER['score'] - challenge.penalty)
             return True # Player can try again, but the puzzle isn't 'defeated'
+    return True
 
 
-def handle_action(action: str):
-    """
-    Processes the player's chosen action.
-    """
-    global PLAYER
-    location_data = gu.get_location_data(PLAYER['location'])
+def trigger_events(events: tuple):
+    """Resolves triggered random events (squirrels, fishing, ...) and prints what happened."""
+    rules = event_rules()
+    for event in events:
+        outcome = rules.resolve_event(event, PLAYER, random)
+        if outcome is None:
+            if event.unmet:
+                show(event.unmet) # Missing the required item
+            continue
+        if event.intro:
+            show(event.intro)
+        if outcome.message is not None:
+            if EVENTS is not None:
+                EVENTS.emit(event.name, outcome=outcome.name, **outcome.log)
+            show(outcome.message)
+            rules.apply_outcome(outcome, PLAYER)
 
-    # Standard Commands
-    if action == 'quit':
-        print("\nFarewell, adventurer. See you next time!")
-        sys.exit()
-    elif action == 'status':
-        gu.display_status(PLAYER)
-    elif action == 'inventory':
-        print("\n🎒 **Your Inventory**:")
-        if PLAYER['inventory']:
-            # For loop to display inventory
-            for item in PLAYER['inventory']:
-                print(f"- {item.title()}")
-        else:
-            print("- Empty.")
-    elif action == 'save':
-        save_string = gu.save_game(PLAYER)
-        print("\n--- Game Saved! (Check save_game_state.txt) ---")
-        print(save_string)
-        with open("save_game_state.txt", "w") as f:
-            f.write(save_string)
-        print("------------------------------------------")
-
-    # Movement Commands
-    elif action.startswith('go '):
-        direction = action.split(' ')[1]
-        description, success = gu.move_player(PLAYER, direction)
-        print(description)
-        # Random Events Demonstration (Only on successful move)
-        if success and random.random() < 0.1: # 10% chance
-            print("A mischievous squirrel throws a nut at you! Lose 1 health.")
-            PLAYER['health'] -= 1
-            PLAYER['score'] += 1 # Small consolation point
-
-    # Location-Specific Actions (Inventory system and scoring)
-    elif action.startswith('take '):
-        item_name = action[5:].strip() # String slicing to get item name
-        if item_name in location_data['items']:
-            # List method append()
-            PLAYER['inventory'].append(item_name)
-            # List method remove()
-            gu.LOCATIONS[PLAYER['location']]['items'].remove(item_name)
-            PLAYER['score'] += 10
-            print(f"You take the **{item_name.title()}** and gain 10 points.")
-        else:
-            print(f"There is no {item_name} here to take.")
 
-    elif action == 'examine chest' and PLAYER['location'] == 'secret_cave':
-        # Trigger the challenge
-        handle_challenge('FINAL_PUZZLE')
-        
-    elif action == 'fish' and PLAYER['location'] == 'river_bank':
-        if 'fishing rod' in PLAYER['inventory']:
-            print("You cast your line...")
-            if random.random() > 0.7:
-                print("🎣 You caught a **Golden Carp**! You feel revitalized.")
-                PLAYER['health'] = min(100, PLAYER['health'] + 15)
-                PLAYER['score'] += 20
-                # List method remove() demo
-                PLAYER['inventory'].remove('fishing rod')
-                PLAYER['inventory'].append('broken fishing rod')
-            else:
-                print("Only seaweed. Better luck next time.")
-        else:
-            print("You need a fishing rod to do that!")
-            
+def do_quit(command):
+    show("\nFarewell, adventurer. See you next time!")
+    if EVENTS is not None:
+        EVENTS.end('quit', PLAYER['score'], PLAYER)
+    screen().flush()
+    sys.exit()
+
+
+def do_status(command):
+    gu.display_status(PLAYER, show)
+
+
+def do_inventory(command):
+    show("\n🎒 **Your Inventory**:")
+    if PLAYER['inventory']:
+        # For loop to display inventory
+        for item in PLAYER['inventory']:
+            show(f"- {item.title()}")
+    else:
+        show("- Empty.")
+
+
+def do_save(command):
+    global SAVE_JOURNAL
+    save_string = gu.save_game(PLAYER)
+    show("\n--- Game Saved! (Check save_game_state.txt) ---")
+    show(save_string)
+    with open("save_game_state.txt", "w") as f:
+        f.write(save_string)
+    # Append only what changed since the last save to the binary journal
+    import save_journal # Deferred to the first save; startup never needs it
+    if SAVE_JOURNAL is None:
+        SAVE_JOURNAL = save_journal.SaveJournal(SAVE_JOURNAL_PATH)
+    world = save_journal.overlay_from_locations(gu.LOCATIONS)
+    try:
+        SAVE_JOURNAL.save(PLAYER, world)
+    except ValueError:
+        SAVE_JOURNAL.restart(PLAYER, world) # A foreign or corrupt journal: start a fresh one over it
+    show("------------------------------------------")
+
+
+def do_go(command):
+    """Movement Commands"""
+    rules = event_rules()
+    origin, visited = PLAYER['location'], len(PLAYER['visited_locations'])
+    description, success = gu.move_player(PLAYER, command.argument)
+    show(description)
+    if success and EVENTS is not None:
+        EVENTS.moved(origin, PLAYER['location'], len(PLAYER['visited_locations']) > visited)
+    # Random Events Demonstration (Only on successful move)
+    if success:
+        trigger_events(rules.shared_engine().events(PLAYER['location'], rules.MOVE_TRIGGER))
+
+
+def do_take(command):
+    """Location-Specific Actions (Inventory system and scoring)"""
+    item_name = command.argument.strip()
+    if item_name in gu.get_location_data(PLAYER['location'])['items']:
+        # List method append()
+        PLAYER['inventory'].append(item_name)
+        # List method remove() (pinned so the lazily loaded world keeps the change)
+        gu.take_location_item(PLAYER['location'], item_name)
+        PLAYER['score'] += 10
+        show(f"You take the **{item_name.title()}** and gain 10 points.")
+        if EVENTS is not None:
+            EVENTS.emit('take', item=item_name, location=PLAYER['location'])
+    else:
+        show(f"There is no {item_name} here to take.")
+
+
+def do_examine_chest(command):
+    if PLAYER['location'] != 'secret_cave':
+        return do_other(command)
+    # Trigger the challenge
+    handle_challenge('FINAL_PUZZLE')
+
+
+def do_other(command):
+    location_data = gu.get_location_data(PLAYER['location'])
+    # Action-triggered exits (like 'search for cave') lead somewhere new
+    if command.text in location_data.get('hidden_exits', {}):
+        origin, visited = PLAYER['location'], len(PLAYER['visited_locations'])
+        description, _ = gu.use_hidden_exit(PLAYER, command.text)
+        show(description)
+        if EVENTS is not None:
+            EVENTS.moved(origin, PLAYER['location'], len(PLAYER['visited_locations']) > visited)
+        return
+    # Actions with declared random events at this location (like 'fish' at the river)
+    events = event_rules().shared_engine().events(PLAYER['location'], command.text)
+    if events:
+        trigger_events(events)
     # Fallback for other valid but unhandled actions (like "look around")
-    elif action in location_data['actions']:
-        print("You don't notice anything new.")
-        
+    elif command.text in location_data['actions']:
+        show("You don't notice anything new.")
     else:
-        print(f"I don't understand the action: **{action}**")
+        show(f"I don't understand the action: **{command.text}**")
+
+
+# Same routes as game_session.GameSession (see gu.ACTION_ROUTES)
+ACTIONS, VERBS = gu.bind_routes({
+    'quit': do_quit,
+    'status': do_status,
+    'inventory': do_inventory,
+    'save': do_save,
+    'examine_chest': do_examine_chest,
+    'go': do_go,
+    'take': do_take,
+    'other': do_other,
+})
+
+
+def handle_action(action: str):
+    """
+    Processes the player's chosen action.
+    """
+    verb, _, argument = action.partition(' ')
+    command = gu.Command(action, verb, argument)
+    handler = ACTIONS.get(action) or VERBS.get(verb, do_other)
+    handler(command)
 
 
 def check_for_challenge():
     """Checks if the current location has a challenge and runs it."""
     location_key = PLAYER['location']
-    challenge = gu.get_location_data(location_key).get('challenge')
+    # Only declared challenge sites look at the location data, to see whether it was cleared
+    challenge = event_rules().shared_engine().challenge_at(location_key)
     
-    if challenge:
-        print("\n🚨 **A presence makes you uneasy... a challenge awaits!**")
-        if not handle_challenge(challenge):
+    if challenge is not None and gu.get_location_data(location_key).get('challenge'):
+        show("\n🚨 **A presence makes you uneasy... a challenge awaits!**")
+        if not handle_challenge(challenge.name):
             return False # Challenge failed (e.g., player died)
     
     return True
@@ -258,40 +348,94 @@ def victory_or_defeat_ending(win: bool):
     """
     6. Victory or defeat ending with final score calculation.
     """
-    print("\n" + "*" * 60)
+    show("\n" + "*" * 60)
     if win:
-        print("🎉 **VICTORY!** 🎉".center(60))
+        show("🎉 **VICTORY!** 🎉".center(60))
         final_message = f"You have secured the Ancient Relic and completed the quest!"
         final_score = PLAYER['score'] + 500 + int(len(PLAYER['visited_locations']) * 10) # Bonus for completion and exploration
     else:
-        print("💀 **DEFEAT!** 💀".center(60))
+        show("💀 **DEFEAT!** 💀".center(60))
         final_message = f"Your quest ends here, hero **{PLAYER['name']}**."
         final_score = PLAYER['score'] # No bonus, possibly a penalty for death
         
-    print(final_message.center(60))
-    print("*" * 60)
+    show(final_message.center(60))
+    show("*" * 60)
     
     # Mathematical Scoring Demonstration
-    print(f"Base Score: {PLAYER['score']}")
+    show(f"Base Score: {PLAYER['score']}")
     if win:
-        print(f"Completion Bonus: +500")
-        print(f"Exploration Bonus (Visited {len(PLAYER['visited_locations'])} places): +{len(PLAYER['visited_locations']) * 10}")
+        show(f"Completion Bonus: +500")
+        show(f"Exploration Bonus (Visited {len(PLAYER['visited_locations'])} places): +{len(PLAYER['visited_locations']) * 10}")
         
-    print("-" * 60)
+    show("-" * 60)
     # String Formatting Demonstration
-    print(f"**FINAL SCORE**: {final_score}".center(60))
-    print("-" * 60)
+    show(f"**FINAL SCORE**: {final_score}".center(60))
+    show("-" * 60)
+    record_final_score(final_score)
+    if EVENTS is not None:
+        EVENTS.end('victory' if win else 'defeat', final_score, PLAYER)
     
     # Save the final state
     gu.save_game(PLAYER)
+    screen().flush()
     sys.exit()
 
-def main_game_loop():
-    """3. Main game loop that continues until win/lose condition or player quits."""
+def open_leaderboard():
+    """
+    Starts loading the leaderboard (numpy and the whole file) on a background
+    thread, so the game's last turn does not wait for it. The game keeps it
+    open, and so holds its lock, until record_final_score().
+    """
+    global LEADERBOARD
+    import threading
+    loaded = []
+
+    def load():
+        try:
+            from leaderboard import Leaderboard
+            loaded.append(Leaderboard(LEADERBOARD_PATH))
+        except (ImportError, OSError, ValueError) as e: # numpy is missing, or the file is unusable
+            loaded.append(e)
+    thread = threading.Thread(target=load, name='leaderboard-loader', daemon=True)
+    thread.start()
+    LEADERBOARD = (thread, loaded)
+
+
+def record_final_score(final_score: int):
+    """Adds the finished game to the leaderboard and shows where it placed."""
+    if LEADERBOARD is None:
+        open_leaderboard()
+    thread, loaded = LEADERBOARD
+    thread.join() # Normally long done by the time a game ends
+    board = loaded[0]
+    try:
+        if isinstance(board, Exception):
+            raise board
+        with board:
+            rank = board.add(PLAYER['name'], final_score, PLAYER['difficulty'])
+            top = board.top(5, PLAYER['difficulty'])
+    except (ImportError, OSError, ValueError) as e:
+        show(f"(Leaderboard unavailable: {e})")
+        return
+    show(f"🏆 Leaderboard rank: #{rank}")
+    for entry in top:
+        show(f"  {entry['rank']}. {entry['name']:<20} {entry['score']:>6}")
+
+def main_game_loop(setup=None):
+    """
+    3. Main game loop that continues until win/lose condition or player quits.
+    `setup()` runs once the player is created, so it never delays the first prompt.
+    """
     global PLAYER
     
     welcome_screen()
     player_creation()
+    if setup is not None:
+        setup()
+    if EVENTS is not None:
+        EVENTS.emit('start', name=PLAYER['name'], difficulty=PLAYER['difficulty'], seed=42,
+                    location=PLAYER['location'])
+    open_leaderboard() # Loads while the game is played
     
     game_running = True
     
@@ -304,7 +448,7 @@ def main_game_loop():
             
         # Check Lose Condition
         if PLAYER['health'] <= 0:
-            print("\nYou collapse from exhaustion and wounds. You have been defeated.")
+            show("\nYou collapse from exhaustion and wounds. You have been defeated.")
             victory_or_defeat_ending(False)
             
         # 4. Location-based navigation and choice points
@@ -314,17 +458,53 @@ def main_game_loop():
         if not check_for_challenge():
             continue # Go back to top of loop, will hit the Lose Condition check
             
-        choice = gu.validate_input("What do you do?", valid_actions)
+        choice = gu.validate_input("What do you do?", valid_actions, show, ask)
+        if EVENTS is not None:
+            EVENTS.turn += 1
         handle_action(choice)
         
         # Small delay for better reading flow
-        print("\n" + "="*50)
+        show("\n" + "="*50)
 
 
-if __name__ == "__main__":
-    # Ensure all required modules are available and run the game
+def start_event_log(folder: str):
+    """Records this game's events into an event_log.EventLog in `folder`, closed when the process exits."""
+    global EVENTS
+    import atexit
+    import event_log
+    log = event_log.EventLog(folder)
+    atexit.register(log.close)
+    EVENTS = event_log.SessionEvents(log)
+
+
+def main():
+    """Command-line entry point (also used by play.py)."""
+    if '--measure-startup' in sys.argv[1:]:
+        import startup
+        startup.main()
+        sys.exit()
+    if '--script' in sys.argv[1:]:
+        # Non-interactive QA mode: plays command scripts headlessly and prints a JSON report
+        import script_runner
+        sys.exit(script_runner.main(sys.argv[1:]))
+    def setup():
+        # Opt-in metrics and event logging (see instrumentation.py and event_log.py)
+        import os
+        if os.environ.get('AQ_METRICS') or os.environ.get('AQ_PROFILE'):
+            import instrumentation
+            instrumentation.from_environment(sys.modules[__name__])
+        if os.environ.get('AQ_EVENTS'):
+            start_event_log(os.environ['AQ_EVENTS'])
     try:
-        main_game_loop()
+        main_game_loop(setup)
     except KeyboardInterrupt:
-        print("\n\nGame interrupted by player. Exiting.")
-        sys.exit()
\ No newline at end of file
+        show("\n\nGame interrupted by player. Exiting.")
+        screen().flush()
+        if EVENTS is not None:
+            EVENTS.end('incomplete', PLAYER['score'], PLAYER)
+        sys.exit()
+
+
+if __name__ == "__main__":
+    # Ensure all required modules are available and run the game
+    main()
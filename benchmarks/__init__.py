@@ -0,0 +1,7 @@
+# --- Benchmark Suite ---
+# Timed cases for the game's hot paths (cases.py) and the runner that measures
+# them, writes JSON results and compares them with a stored baseline
+# (runner.py). Run from the repository root:
+#   python -m benchmarks                     # run everything, compare with baseline.json
+#   python -m benchmarks -k combat move      # only cases whose name contains a filter
+#   python -m benchmarks --save-baseline     # record this machine's numbers as the baseline
@@ -0,0 +1,161 @@
+import builtins
+import io
+import itertools
+import random
+import sys
+from unittest import mock
+
+import adventure_quest as aq
+import game_utils as gu
+from game_session import GameSession, new_player
+
+# --- Benchmark Cases ---
+# A case is a setup function taking (stack, seed). It enters any patches it needs
+# on the ExitStack (mocked stdin/stdout, a fresh PLAYER) and returns a
+# zero-argument callable performing one operation. Everything random is seeded
+# from `seed`, so two runs time exactly the same work.
+
+CASES = {}
+
+# Beats the ghost (or dies trying), walks to the cave and answers the chest for "Hero"
+WINNING_SCRIPT = ['go north'] + ['attack'] * 30 + ['go west', 'search for cave', '32', 'go outside']
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class NullStream(io.TextIOBase):
+    """Stand-in stdout that accepts and drops everything."""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+def _mock_stdout(stack):
+    stack.enter_context(mock.patch('sys.stdout', new=NullStream()))
+
+
+def _mock_stdin(stack, next_line):
+    """Answers every input() with next_line()."""
+    stack.enter_context(mock.patch.object(builtins, 'input', new=lambda prompt='': next_line()))
+
+
+def _fresh_world(stack):
+    # Challenges cleared and items taken during a case must not leak into the next one
+    stack.callback(gu.LOCATIONS.discard_changes)
+
+
+@case('validate_input')
+def validate_input(stack, seed):
+    _mock_stdout(stack)
+    # Every third line is invalid, so the retry path is timed too
+    _mock_stdin(stack, itertools.cycle(['GO NORTH', 'dance', '  look around ', 'status']).__next__)
+    options = gu.get_location_data('start_clearing')['actions'] + list(gu.STANDARD_ACTIONS)
+    return lambda: gu.validate_input("What do you do?", options)
+
+
+@case('move_player')
+def move_player(stack, seed):
+    player = new_player('Hero')
+    directions = itertools.cycle(['north', 'south', 'up'])
+    return lambda: gu.move_player(player, next(directions))
+
+
+@case('calculate_damage')
+def calculate_damage(stack, seed):
+    rng = random.Random(seed)
+    return lambda: gu.calculate_damage(1.5, rng)
+
+
+@case('combat_loop')
+def combat_loop(stack, seed):
+    """One full aq.handle_challenge() ghost fight per operation, from 100 HP."""
+    _mock_stdout(stack)
+    _mock_stdin(stack, itertools.cycle(['attack', 'attack', 'attack', 'run']).__next__)
+    _fresh_world(stack)
+    stack.enter_context(mock.patch.object(aq, 'PLAYER', new=new_player('Hero')))
+    random.seed(seed)
+
+    def fight():
+        aq.PLAYER.update(health=100, score=0, location='dark_woods_edge')
+        return aq.handle_challenge('GHOSTLY_ENCOUNTER')
+    return fight
+
+
+@case('save_game')
+def save_game(stack, seed):
+    player = new_player('Hero')
+    player['inventory'] = ['old map fragment', 'fishing rod', 'healing potion']
+    player['visited_locations'].update(gu.LOCATIONS)
+    return lambda: gu.save_game(player)
+
+
+@case('display_location')
+def display_location(stack, seed):
+    _mock_stdout(stack)
+    stack.enter_context(mock.patch.object(aq, 'PLAYER', new=new_player('Hero')))
+    locations = itertools.cycle(list(gu.LOCATIONS))
+
+    def show():
+        aq.PLAYER['location'] = next(locations)
+        return aq.display_location()
+    return show
+
+
+@case('playthrough_script')
+def playthrough_script(stack, seed):
+    """adventure_quest.main_game_loop() end to end on WINNING_SCRIPT (stdin and stdout mocked)."""
+    _mock_stdout(stack)
+    _fresh_world(stack)
+    stack.enter_context(mock.patch.object(aq, 'PLAYER', new=new_player()))
+    # The leaderboard file would grow with every timed game; its cost is timed in leaderboard.py
+    stack.enter_context(mock.patch.object(aq, 'open_leaderboard', new=lambda: None))
+    stack.enter_context(mock.patch.object(aq, 'record_final_score', new=lambda final_score: None))
+    feed = {'lines': iter(())}
+    _mock_stdin(stack, lambda: next(feed['lines'], 'quit'))
+    seeds = itertools.count(seed)
+
+    def play():
+        gu.LOCATIONS.discard_changes()
+        aq.PLAYER = new_player()
+        random.seed(next(seeds))
+        feed['lines'] = iter(['Hero', '1'] + WINNING_SCRIPT)
+        try:
+            aq.main_game_loop()
+        except SystemExit:
+            pass
+        return aq.PLAYER['score']
+    return play
+
+
+@case('cold_start')
+def cold_start(stack, seed):
+    """Launching play.py in a fresh interpreter until its first prompt (vs the first commit's game)."""
+    import tempfile
+
+    import startup
+    command = [sys.executable, startup.GAME]
+    baseline = startup.baseline_launch(stack.enter_context(tempfile.TemporaryDirectory()))
+
+    def launch():
+        return startup.time_to_prompt(command)
+
+    def stats():
+        # Interleaved launches of both games, so the ratio is not skewed by load drift
+        if baseline is None:
+            return {}
+        report = startup.measure(10, {'game': command, 'baseline': baseline})
+        return {'baseline_ratio': report['game']['median_ms'] / report['baseline']['median_ms']}
+    launch.stats = stats
+    return launch
+
+
+@case('playthrough_session')
+def playthrough_session(stack, seed):
+    """The same script through a headless GameSession."""
+    seeds = itertools.count(seed)
+    return lambda: GameSession(seed=next(seeds), name='Hero', difficulty=1.0).run(WINNING_SCRIPT)
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import ExitStack
+
+from benchmarks.cases import CASES
+
+# --- Benchmark Runner ---
+# Each case is timed in batches: the batch size doubles until one batch takes
+# about `target_ms`, then `samples` batches are timed. A sample is the mean time
+# per operation within one batch, so p50/p99 are percentiles over batch means
+# (timer overhead stays negligible even for sub-microsecond operations) and
+# ops/sec is total operations over total time. An operation with a `stats()`
+# attribute adds what it returns to the case's results (cold_start's ratio to
+# the first commit's launch time).
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(HERE, 'results.json')
+DEFAULT_THRESHOLD = 0.15 # Slower than baseline by more than this fraction = regression
+MAX_BATCH = 1 << 20
+
+
+def _time_batch(op, count: int) -> float:
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for _ in range(count):
+        op()
+    return perf_counter() - started
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def measure(setup, seed: int = 42, samples: int = 50, target_ms: float = 5.0) -> dict:
+    """Times one case; returns ops/sec and per-operation p50/p99 in microseconds."""
+    with ExitStack() as stack:
+        op = setup(stack, seed)
+        batch = 1
+        while batch < MAX_BATCH and _time_batch(op, batch) < target_ms / 1000:
+            batch *= 2
+        timings = sorted(_time_batch(op, batch) / batch for _ in range(samples))
+        stats = getattr(op, 'stats', None)
+        extra = stats() if stats is not None else {}
+    total_ops = batch * samples
+    return {
+        'ops_per_sec': total_ops / (sum(timings) * batch),
+        'p50_us': _percentile(timings, 0.50) * 1e6,
+        'p99_us': _percentile(timings, 0.99) * 1e6,
+        'batch': batch,
+        'samples': samples,
+        **extra,
+    }
+
+
+def run_suite(names=None, seed: int = 42, samples: int = 50, target_ms: float = 5.0, report=None) -> dict:
+    """Runs the selected cases (all by default) and returns the JSON-ready results document."""
+    results = {}
+    for name in names or CASES:
+        results[name] = measure(CASES[name], seed, samples, target_ms)
+        if report is not None:
+            report(name, results[name])
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': seed,
+            'samples': samples,
+        },
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    """Ratio of current to baseline ops/sec per case, and the cases that regressed past `threshold`."""
+    ratios = {}
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        ratio = current['ops_per_sec'] / previous['ops_per_sec']
+        ratios[name] = ratio
+        if ratio < 1.0 - threshold:
+            regressions.append(name)
+    return {'ratios': ratios, 'regressions': regressions, 'threshold': threshold}
+
+
+def _write_json(path: str, document: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Time the game's hot paths.")
+    parser.add_argument('-k', '--filter', nargs='+', default=None, help="only cases whose name contains one of these")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--target-ms', type=float, default=5.0, help="approximate duration of one timed batch")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown versus the baseline as a fraction (0.15 = 15%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, setup in CASES.items():
+            print(f"{name:<22} {(setup.__doc__ or '').strip()}")
+        return
+    names = [name for name in CASES if not args.filter or any(part in name for part in args.filter)]
+    if not names:
+        parser.error(f"no case matches {args.filter}")
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    def report(name, result):
+        line = (f"{name:<22} {result['ops_per_sec']:>14,.1f} ops/sec   "
+                f"p50 {result['p50_us']:>10.2f} us   p99 {result['p99_us']:>10.2f} us")
+        previous = baseline['results'].get(name) if baseline else None
+        if previous:
+            line += f"   {result['ops_per_sec'] / previous['ops_per_sec'] - 1:>+7.1%} vs baseline"
+        if 'baseline_ratio' in result:
+            line += f"   {result['baseline_ratio']:.2f}x the first commit's time"
+        print(line, flush=True)
+
+    results = run_suite(names, args.seed, args.samples, args.target_ms, report)
+    _write_json(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if baseline is None:
+        print("No baseline to compare against (run with --save-baseline to create one).")
+        return
+    verdict = compare(results, baseline, args.threshold)
+    if verdict['regressions']:
+        print(f"REGRESSION (more than {args.threshold:.0%} slower than baseline): {', '.join(verdict['regressions'])}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} versus the baseline.")
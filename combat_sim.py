@@ -0,0 +1,211 @@
+import math
+import random
+import time
+
+import numpy as np
+
+import event_engine
+
+# --- Vectorized Combat Simulator ---
+# Resolves many fights against one combat challenge (GHOSTLY_ENCOUNTER by
+# default) at once with NumPy. Every round follows event_engine.combat_round()
+# and gu.calculate_damage, with the odds and scores read from the challenge as
+# declared in event_engine.CHALLENGES:
+#   run    -> escape with the challenge's flee chance (lose flee_penalty score), otherwise forced to attack
+#   attack -> hit if random() < 0.3 * difficulty, damage = floor(b + b * u * 0.5 * difficulty)
+#             with b = randint(15, 25), +5 if the result is even (critical)
+#          -> on a dodge: +int(hit_score / difficulty) score and a finish_percent victory roll
+#             (randint(1, 100) <= finish_percent) worth finish_score more
+
+OUTCOME_WIN = 0
+OUTCOME_DEATH = 1
+OUTCOME_FLEE = 2
+OUTCOME_NAMES = ('win', 'death', 'flee')
+
+CHUNK_SIZE = 1_000_000
+DEFAULT_CHALLENGE = 'GHOSTLY_ENCOUNTER'
+
+
+def combat_challenge(name: str = DEFAULT_CHALLENGE) -> event_engine.Challenge:
+    """The declared combat challenge `name`, from the shared EventEngine."""
+    challenge = event_engine.shared_engine().challenges[name]
+    if challenge.kind != 'combat':
+        raise ValueError(f"{name} is a {challenge.kind} challenge, not a fight")
+    return challenge
+
+
+def _resolve_chunk(rng, n: int, difficulty_mod: float, start_health: int, run_chance: float,
+                   challenge: event_engine.Challenge):
+    """Fights `n` encounters to the end; returns (outcome, turns, hp_lost, score_delta) arrays."""
+    health = np.full(n, start_health, dtype=np.int32)
+    score = np.zeros(n, dtype=np.int32)
+    turns = np.zeros(n, dtype=np.int32)
+    outcome = np.full(n, -1, dtype=np.int8)
+
+    hit_chance = 0.3 * difficulty_mod
+    dodge_score = int(challenge.hit_score * (1 / difficulty_mod))
+    flee_chance = challenge.flee.chance(True)
+    active = np.arange(n)
+
+    # The scalar loop only runs while health > 0
+    outcome[health <= 0] = OUTCOME_DEATH
+    active = active[health > 0]
+
+    while active.size:
+        m = active.size
+        turns[active] += 1
+
+        # Run attempt (a failed escape falls through to an attack, as in the game)
+        if run_chance > 0.0:
+            runs = rng.random(m) < run_chance
+            escaped = runs & (rng.random(m) >= 1 - flee_chance) # Escapes on the draws Sampler.pick() does
+            if escaped.any():
+                fled = active[escaped]
+                score[fled] = np.maximum(0, score[fled] - challenge.flee_penalty)
+                outcome[fled] = OUTCOME_FLEE
+                active = active[~escaped]
+                m = active.size
+                if not m:
+                    break
+
+        # calculate_damage
+        hit = rng.random(m) < hit_chance
+        hits = int(np.count_nonzero(hit))
+        if hits:
+            # Damage is only rolled for the fights that were actually hit
+            base = rng.integers(15, 26, size=hits)
+            final = np.floor(base + (base * (rng.random(hits) * 0.5 * difficulty_mod))).astype(np.int32)
+            final += (1 - final % 2) * 5
+            health[active[hit]] -= final
+
+        dodged = ~hit
+        score[active[dodged]] += dodge_score
+        victory = dodged & (rng.integers(1, 101, size=m) <= challenge.finish_percent)
+        score[active[victory]] += challenge.finish_score
+        died = hit & (health[active] <= 0)
+
+        outcome[active[victory]] = OUTCOME_WIN
+        outcome[active[died]] = OUTCOME_DEATH
+        active = active[~(victory | died)]
+
+    return outcome, turns, start_health - health, score
+
+
+def simulate_fights(n: int, difficulty_mods=(1.0, 1.5), start_health: int = 100,
+                    run_chance: float = 0.0, seed: int = 42, challenge: event_engine.Challenge = None) -> dict:
+    """
+    Simulates `n` fights against `challenge` (default: GHOSTLY_ENCOUNTER) for
+    every difficulty in `difficulty_mods`.
+    `run_chance` is the probability that the player chooses 'run' each round.
+    Returns a dict keyed by difficulty with rates, turn and HP-loss histograms.
+    """
+    challenge = challenge if challenge is not None else combat_challenge()
+    rng = np.random.default_rng(seed)
+    report = {}
+    for difficulty_mod in difficulty_mods:
+        outcome_counts = np.zeros(3, dtype=np.int64)
+        turn_hist = np.zeros(1, dtype=np.int64)
+        hp_hist = np.zeros(1, dtype=np.int64)
+        score_total = 0
+
+        remaining = n
+        while remaining > 0:
+            size = min(CHUNK_SIZE, remaining)
+            outcome, turns, hp_lost, score = _resolve_chunk(rng, size, difficulty_mod, start_health, run_chance,
+                                                            challenge)
+            outcome_counts += np.bincount(outcome, minlength=3)
+            turn_hist = _add_hist(turn_hist, np.bincount(turns))
+            hp_hist = _add_hist(hp_hist, np.bincount(hp_lost))
+            score_total += int(score.sum())
+            remaining -= size
+
+        report[difficulty_mod] = {
+            'fights': n,
+            'win_rate': outcome_counts[OUTCOME_WIN] / n,
+            'death_rate': outcome_counts[OUTCOME_DEATH] / n,
+            'flee_rate': outcome_counts[OUTCOME_FLEE] / n,
+            'mean_turns': float(np.dot(np.arange(turn_hist.size), turn_hist)) / n,
+            'mean_hp_lost': float(np.dot(np.arange(hp_hist.size), hp_hist)) / n,
+            'mean_score_delta': score_total / n,
+            'turn_histogram': turn_hist,
+            'hp_loss_histogram': hp_hist,
+        }
+    return report
+
+
+def _add_hist(total, counts):
+    """Adds two bincount arrays of possibly different lengths."""
+    if counts.size > total.size:
+        total, counts = counts, total
+    total = total.copy()
+    total[:counts.size] += counts
+    return total
+
+
+def simulate_fight_scalar(difficulty_mod: float, rng, start_health: int = 100, run_chance: float = 0.0,
+                          challenge: event_engine.Challenge = None) -> tuple:
+    """
+    Reference implementation on top of event_engine.combat_round, one round at a time.
+    Returns (outcome, turns, hp_lost, score_delta) for a single fight.
+    """
+    challenge = challenge if challenge is not None else combat_challenge()
+    health = start_health
+    score = 0
+    turns = 0
+    while health > 0:
+        turns += 1
+        action = 'run' if run_chance and rng.random() < run_chance else 'attack'
+        result = event_engine.combat_round(challenge, action, health, score, difficulty_mod, rng)
+        health, score = result.health, result.score
+        if result.escaped:
+            return OUTCOME_FLEE, turns, start_health - health, score
+        if result.won:
+            return OUTCOME_WIN, turns, start_health - health, score
+    return OUTCOME_DEATH, turns, start_health - health, score
+
+
+def format_report(report: dict) -> str:
+    """Builds a readable summary table of a simulate_fights() report."""
+    lines = [f"{'difficulty':>10} | {'win':>7} | {'death':>7} | {'flee':>7} | {'turns':>6} | {'hp lost':>7} | {'p99 turns':>9}"]
+    lines.append("-" * len(lines[0]))
+    for difficulty_mod, stats in report.items():
+        cumulative = np.cumsum(stats['turn_histogram'])
+        p99_turns = int(np.searchsorted(cumulative, math.ceil(0.99 * stats['fights'])))
+        lines.append(
+            f"{difficulty_mod:>10.2f} | {stats['win_rate']:>7.2%} | {stats['death_rate']:>7.2%} | "
+            f"{stats['flee_rate']:>7.2%} | {stats['mean_turns']:>6.2f} | {stats['mean_hp_lost']:>7.2f} | {p99_turns:>9}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Monte Carlo balance sweep for a combat challenge.")
+    parser.add_argument('--challenge', default=DEFAULT_CHALLENGE, help="combat challenge declared in event_engine")
+    parser.add_argument('-n', '--fights', type=int, default=10_000_000, help="fights per difficulty")
+    parser.add_argument('-d', '--difficulty', type=float, nargs='+', default=[1.0, 1.5])
+    parser.add_argument('--run-chance', type=float, default=0.0, help="chance of choosing 'run' each round")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--check', type=int, default=0, metavar='N',
+                        help="also play N fights with the scalar calculate_damage and compare rates")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    challenge = combat_challenge(args.challenge)
+    report = simulate_fights(args.fights, args.difficulty, run_chance=args.run_chance, seed=args.seed,
+                             challenge=challenge)
+    elapsed = time.perf_counter() - start
+    total = args.fights * len(args.difficulty)
+    print(format_report(report))
+    print(f"\n{total:,} fights in {elapsed:.2f}s ({total / elapsed:,.0f} fights/sec)")
+
+    if args.check:
+        rng = random.Random(args.seed)
+        for difficulty_mod in args.difficulty:
+            counts = [0, 0, 0]
+            for _ in range(args.check):
+                outcome = simulate_fight_scalar(difficulty_mod, rng, run_chance=args.run_chance, challenge=challenge)[0]
+                counts[outcome] += 1
+            scalar = ", ".join(f"{name} {count / args.check:.2%}" for name, count in zip(OUTCOME_NAMES, counts))
+            print(f"scalar check @ {difficulty_mod}: {scalar}")
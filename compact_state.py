@@ -0,0 +1,413 @@
+import threading
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping, Sequence
+
+import event_engine
+import game_utils as gu
+
+# --- Compact World and Player Representation ---
+# Location and item names are interned to small integer IDs once per process.
+# The world itself lives in one immutable WorldTable shared by every session;
+# a session only carries a WorldOverlay: two integers, taken item slots and
+# cleared challenges. Player packs a player record the same way (bitset
+# visited locations and inventory). Live sessions keep the PLAYER dict, whose
+# inventory lists items in pickup order as the game prints them; Player is
+# the form for keeping many players at rest.
+#
+# Each location is compiled into a LocationRow on first use, so a session on
+# a 100k-location map pays only for the places it reaches. A small world's
+# names are interned up front. An index-backed world_loader.LazyWorld already
+# numbers its locations, items and item placements in the index, so its
+# table looks names up there, on demand. Over such a world the compiled rows
+# and pristine dicts are kept in LRUs as big as the world's own cache_size.
+#
+# Sets of IDs (taken slots, cleared locations, visited locations) are "ID
+# sets": an int bitset while every ID stays below SPARSE_AT, a frozenset of the
+# IDs once one reaches it, so a player deep in a huge map does not carry an
+# integer as wide as the map. Both forms are immutable and hashable, and which
+# form a set takes depends only on its IDs.
+
+LocationRow = namedtuple('LocationRow', 'description ascii actions neighbors hidden_exits challenge items first_slot')
+
+SPARSE_AT = 4096
+
+
+def reward_items(locations=()) -> tuple:
+    """Items the rules create rather than place: what events add and what challenges award."""
+    specs = [spec for data in locations for spec in data.get('events', ())]
+    specs.extend(event_engine.DEFAULT_EVENTS)
+    items = {}
+    for spec in specs:
+        for outcome in spec['outcomes']:
+            items.update(dict.fromkeys(outcome.get('add', ())))
+    for spec in event_engine.CHALLENGES.values():
+        if spec.get('reward'):
+            items[spec['reward']] = None
+    return tuple(items)
+
+
+def bit_ids(bits):
+    """Yields the IDs in an ID set, lowest first."""
+    if isinstance(bits, frozenset):
+        yield from sorted(bits)
+        return
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def id_set(ids):
+    """The ID set holding `ids`."""
+    ids = frozenset(ids)
+    if ids and max(ids) >= SPARSE_AT:
+        return ids
+    bits = 0
+    for i in ids:
+        bits |= 1 << i
+    return bits
+
+
+def has_id(bits, i: int) -> bool:
+    if isinstance(bits, frozenset):
+        return i in bits
+    return bool(bits >> i & 1)
+
+
+def with_id(bits, i: int):
+    """`bits` plus ID `i` (ID sets are immutable)."""
+    if isinstance(bits, frozenset):
+        return bits | {i}
+    if i >= SPARSE_AT:
+        return frozenset(bit_ids(bits)) | {i}
+    return bits | 1 << i
+
+
+def any_id(bits, start: int, count: int) -> bool:
+    """Whether the ID set holds any of start .. start + count - 1."""
+    if isinstance(bits, frozenset):
+        return any(i in bits for i in range(start, start + count))
+    return bool(bits >> start & ((1 << count) - 1))
+
+
+class _LRU:
+    """A thread-safe least-recently-used cache of at most `size` entries (None: unbounded)."""
+
+    def __init__(self, size: int = None):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.size is None:
+            return self._entries.get(key) # Nothing is evicted or reordered, so no lock
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if self.size == 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            if self.size is not None and len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _IndexedIds(Mapping):
+    """location key -> ID of an index-backed world, looked up on first use."""
+
+    def __init__(self, world):
+        self._world = world
+        self._known = _LRU(world.cache_size)
+
+    def __getitem__(self, location_key: str) -> int:
+        loc_id = self._known.get(location_key)
+        if loc_id is None:
+            loc_id = self._world.position(location_key) if isinstance(location_key, str) else None
+            if loc_id is None:
+                raise KeyError(location_key)
+            self._known.put(location_key, loc_id)
+        return loc_id
+
+    def __len__(self) -> int:
+        return len(self._world)
+
+    def __iter__(self):
+        return iter(self._world)
+
+
+class _IndexedNames(Sequence):
+    """ID -> location key of an index-backed world, looked up on first use."""
+
+    def __init__(self, world):
+        self._world = world
+        self._known = _LRU(world.cache_size)
+
+    def __getitem__(self, loc_id: int) -> str:
+        key = self._known.get(loc_id)
+        if key is None:
+            key = self._known.put(loc_id, self._world.key_at(loc_id))
+        return key
+
+    def __len__(self) -> int:
+        return len(self._world)
+
+
+class WorldTable:
+    """Immutable, interned view of a LOCATIONS mapping; each location is compiled on first use."""
+
+    def __init__(self, locations: Mapping):
+        self.locations = locations
+        # Read worlds as stored on disk when they can be, so in-place edits made
+        # to their locations (adventure_quest.py pins and edits them) never leak in
+        self._read = getattr(locations, 'stored', locations.__getitem__)
+        cache_size = getattr(locations, 'cache_size', None)
+        self._rows = _LRU(cache_size)
+        self._pristine_entries = _LRU(cache_size)
+        self._content_hash = None
+        entries = None
+        if getattr(locations, 'indexed', False):
+            self.location_names = _IndexedNames(locations)
+            self.location_ids = _IndexedIds(locations)
+            item_names = dict.fromkeys(locations.item_names)
+            self._first_slot = locations.items_before
+        else:
+            self.location_names = tuple(locations)
+            self.location_ids = {name: i for i, name in enumerate(self.location_names)}
+            entries = [self._read(name) for name in self.location_names]
+            item_names, first_slots, placed = {}, [], 0
+            for data in entries:
+                first_slots.append(placed)
+                placed += len(data['items'])
+                item_names.update(dict.fromkeys(data['items']))
+            self._first_slot = first_slots.__getitem__
+        item_names.update(dict.fromkeys(reward_items(entries or ())))
+        self.item_names = tuple(item_names)
+        self.item_ids = {name: i for i, name in enumerate(self.item_names)}
+        if entries is not None and not hasattr(locations, 'stored'):
+            # A plain dict can be edited in place later on, so compile it now
+            for loc_id, data in enumerate(entries):
+                self._rows.put(loc_id, self._compile(loc_id, data))
+
+    @property
+    def content_hash(self) -> int:
+        """
+        64-bit hash of what the table's IDs mean: the world's content and the
+        item names. Saves store IDs, so they are only valid in a table with the same hash.
+        """
+        if self._content_hash is None:
+            from hashlib import blake2b
+
+            world_hash = getattr(self.locations, 'content_hash', None)
+            if world_hash is not None:
+                world = world_hash().to_bytes(8, 'little')
+            else:
+                world = repr([(name, self.row(i)) for i, name in enumerate(self.location_names)]).encode('utf-8')
+            digest = blake2b(world + repr(self.item_names).encode('utf-8'), digest_size=8).digest()
+            self._content_hash = int.from_bytes(digest, 'little')
+        return self._content_hash
+
+    def _compile(self, loc_id: int, data: dict) -> LocationRow:
+        first_slot = self._first_slot(loc_id)
+        items = tuple(self.item_ids[item] for item in data['items'])
+        return LocationRow(data['description'], data.get('ascii', ''), tuple(data['actions']),
+                           tuple(data['neighbors'].items()),
+                           tuple(data.get('hidden_exits', {}).items()), data.get('challenge'), items, first_slot)
+
+    def row(self, loc_id: int) -> LocationRow:
+        row = self._rows.get(loc_id)
+        if row is None:
+            # Racing threads compile equal rows; either one may stay cached
+            row = self._rows.put(loc_id, self._compile(loc_id, self._read(self.location_names[loc_id])))
+        return row
+
+    def slots_of(self, loc_id: int, item_id: int) -> tuple:
+        """The WorldOverlay.taken slots of an item's copies placed at the location."""
+        row = self.row(loc_id)
+        return tuple(row.first_slot + i for i, placed in enumerate(row.items) if placed == item_id)
+
+    def pristine(self, loc_id: int) -> dict:
+        """The untouched location's dict, built once and shared (treat as read-only)."""
+        entry = self._pristine_entries.get(loc_id)
+        if entry is None:
+            entry = self._pristine_entries.put(loc_id, self.materialize(loc_id, 0, 0))
+        return entry
+
+    def materialize(self, loc_id: int, taken, cleared) -> dict:
+        """A fresh location dict with the `taken` item slots and `cleared` challenges (ID sets) applied."""
+        row = self.row(loc_id)
+        return {
+            'description': row.description,
+            'ascii': row.ascii,
+            'actions': list(row.actions),
+            'items': [self.item_names[item] for i, item in enumerate(row.items)
+                      if not has_id(taken, row.first_slot + i)],
+            'challenge': None if has_id(cleared, loc_id) else row.challenge,
+            'neighbors': dict(row.neighbors),
+            'hidden_exits': dict(row.hidden_exits),
+        }
+
+
+_TABLE = None
+
+
+def shared_table() -> WorldTable:
+    """The process-wide WorldTable for gu.LOCATIONS, built on first use (rebuilt if the world is swapped)."""
+    global _TABLE
+    if _TABLE is None or _TABLE.locations is not gu.LOCATIONS:
+        _TABLE = WorldTable(gu.LOCATIONS)
+    return _TABLE
+
+
+class WorldOverlay:
+    """
+    Per-session diff over a shared WorldTable.
+    Drop-in replacement for game_session.WorldView: same get/[]/take_item/clear_challenge.
+    """
+    __slots__ = ('table', 'taken', 'cleared')
+
+    def __init__(self, table: WorldTable = None, taken=0, cleared=0):
+        self.table = table if table is not None else shared_table()
+        self.taken = taken
+        self.cleared = cleared
+
+    def _touched(self, loc_id: int) -> bool:
+        if has_id(self.cleared, loc_id):
+            return True
+        row = self.table.row(loc_id)
+        return any_id(self.taken, row.first_slot, len(row.items))
+
+    def get(self, location_key: str, default=None):
+        loc_id = self.table.location_ids.get(location_key)
+        if loc_id is None:
+            return default
+        if self._touched(loc_id):
+            return self.table.materialize(loc_id, self.taken, self.cleared)
+        return self.table.pristine(loc_id)
+
+    def __getitem__(self, location_key: str) -> dict:
+        entry = self.get(location_key)
+        if entry is None:
+            raise KeyError(location_key)
+        return entry
+
+    def __contains__(self, location_key: str) -> bool:
+        return location_key in self.table.location_ids
+
+    def take_item(self, location_key: str, item_name: str) -> bool:
+        loc_id = self.table.location_ids[location_key]
+        for slot in self.table.slots_of(loc_id, self.table.item_ids.get(item_name)):
+            if not has_id(self.taken, slot):
+                self.taken = with_id(self.taken, slot)
+                return True
+        return False
+
+    def clear_challenge(self, location_key: str):
+        self.cleared = with_id(self.cleared, self.table.location_ids[location_key])
+
+
+class Player:
+    """Compact player record: integer location, ID-set visited locations and inventory."""
+    __slots__ = ('name', 'health', 'score', 'location', 'difficulty', 'visited', 'inventory')
+
+    def __init__(self, name: str = '', health: int = 100, score: int = 0, location: int = 0,
+                 difficulty: float = 1.0, visited=0, inventory=0):
+        self.name = name
+        self.health = health
+        self.score = score
+        self.location = location
+        self.difficulty = difficulty
+        self.visited = visited
+        self.inventory = inventory
+
+    @classmethod
+    def from_dict(cls, player: dict, table: WorldTable = None) -> 'Player':
+        """Packs an adventure_quest-style player dict."""
+        table = table if table is not None else shared_table()
+        visited = id_set(table.location_ids[name] for name in player['visited_locations'])
+        inventory = id_set(table.item_ids[item] for item in player['inventory'])
+        return cls(player['name'], player['health'], player['score'], table.location_ids[player['location']],
+                   player['difficulty'], visited, inventory)
+
+    def to_dict(self, table: WorldTable = None) -> dict:
+        """Unpacks into the dict shape the game functions expect (inventory in item-ID order)."""
+        table = table if table is not None else shared_table()
+        return {
+            'name': self.name,
+            'health': self.health,
+            'inventory': [table.item_names[i] for i in bit_ids(self.inventory)],
+            'score': self.score,
+            'location': table.location_names[self.location],
+            'difficulty': self.difficulty,
+            'visited_locations': {table.location_names[i] for i in bit_ids(self.visited)},
+        }
+
+
+# --- Memory Benchmark ---
+
+def _measure(factory, sessions: int) -> int:
+    """Bytes allocated per session by `factory()`, measured with tracemalloc."""
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [factory() for _ in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) // sessions
+
+
+def memory_report(sessions: int = 100_000) -> dict:
+    """Compares per-session memory of the dict layout with what sessions carry now, live and at rest."""
+    import copy
+
+    from game_session import new_player
+
+    def visited_player():
+        player = new_player('Hero')
+        player['visited_locations'].update(('start_clearing', 'dark_woods_edge', 'mountain_path'))
+        return player
+
+    world = dict(gu.LOCATIONS.items())
+
+    def dict_session():
+        # What hosting a session used to cost: a PLAYER dict plus a private world copy
+        return visited_player(), copy.deepcopy(world)
+
+    table = shared_table()
+
+    def live_session():
+        # A GameSession today: the PLAYER dict over a shared table
+        return visited_player(), WorldOverlay(table)
+
+    def packed_session():
+        return Player('Hero', visited=0b1011), WorldOverlay(table)
+
+    return {
+        'sessions': sessions,
+        'dict_bytes_per_session': _measure(dict_session, sessions),
+        'live_bytes_per_session': _measure(live_session, sessions),
+        'packed_bytes_per_session': _measure(packed_session, sessions),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    report = memory_report(count)
+    baseline = report['dict_bytes_per_session']
+    print(f"Sessions:            {report['sessions']:,}")
+    print(f"Dict + world copy:   {baseline:,} bytes/session")
+    for label, key in (("Dict + overlay:", 'live_bytes_per_session'), ("Player + overlay:", 'packed_bytes_per_session')):
+        size = report[key]
+        print(f"{label:<20} {size:,} bytes/session ({baseline / max(1, size):.0f}x smaller)")
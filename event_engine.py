@@ -0,0 +1,342 @@
+import random
+from collections import Counter, namedtuple
+
+import game_utils as gu
+
+# --- Event and Challenge Engine ---
+# Random events and challenges are data. An event is declared with a trigger
+# ('move' fires after every successful 'go'; any other trigger is the action
+# text that sets it off, e.g. 'fish'), an optional required item and weighted
+# outcomes whose effects are plain numbers and item lists. DEFAULT_EVENTS apply
+# to every location; a world entry adds its own under "events" (and can switch
+# a default off by redeclaring its name with no outcomes). A location's
+# "challenge" names one of CHALLENGES.
+#
+# The engine compiles each location once, on first use, into a trigger table
+# {trigger: (Event, ...)} plus its challenge, so the game loop does one dict
+# lookup instead of re-reading location data. Every outcome draw costs one
+# rng.random() and O(1) time through a guide table over the cumulative
+# weights; outcomes keep inverse-CDF order, so the declared odds map random
+# numbers onto outcomes exactly like the threshold checks they replace and
+# recorded sessions replay unchanged.
+#
+# resolve_event(), apply_outcome(), combat_round() and the puzzle helpers never
+# print or prompt: GameSession and adventure_quest.py wrap them with the text
+# and input, and simulate_*() run them in a tight loop for batch statistics.
+
+MAX_HEALTH = 100
+MOVE_TRIGGER = 'move'
+
+DEFAULT_EVENTS = (
+    {'name': 'squirrel', 'trigger': MOVE_TRIGGER, 'outcomes': [
+        {'name': 'nut', 'weight': 0.1, 'message': "A mischievous squirrel throws a nut at you! Lose 1 health.",
+         'health': -1, 'score': 1}, # Small consolation point
+        {'name': 'nothing', 'weight': 0.9},
+    ]},
+)
+
+CHALLENGES = {
+    'GHOSTLY_ENCOUNTER': {
+        'kind': 'combat',
+        'intro': "\n👻 **A spectral guardian blocks your path! Combat initiated!**",
+        'victory': "✨ **You defeated the spectral guardian!**",
+        'flee_chance': 0.4,
+        'flee_penalty': 10,
+        'hit_score': 5, # Divided by the difficulty: higher reward on harder settings
+        'finish_percent': 20, # Chance that a landed blow ends the fight
+        'finish_score': 50,
+    },
+    'FINAL_PUZZLE': {
+        'kind': 'puzzle',
+        'intro': "\n🧩 **The chest is locked. An inscription reads: 'The number of places you've been, "
+                 "multiplied by the first letter's value (A=1), minus the points lost by running.**",
+        'reward': 'ancient relic', # Same name the victory check looks for
+        'penalty': 5,
+    },
+}
+
+Outcome = namedtuple('Outcome', 'name message health score remove add log')
+Event = namedtuple('Event', 'name trigger requires unmet intro sampler')
+Challenge = namedtuple('Challenge', 'name kind intro victory flee flee_penalty hit_score finish_percent '
+                                    'finish_score reward penalty')
+Round = namedtuple('Round', 'escaped caught damage message won health score')
+
+_NO_EVENTS = ()
+
+
+class Sampler:
+    """
+    Weighted choice among fixed outcomes in O(1): a guide table of one bucket
+    per outcome points at the first cumulative bound that can hold a uniform
+    number from that bucket, so a draw scans ~1 bound instead of bisecting.
+    """
+    __slots__ = ('outcomes', 'bounds', 'guide')
+
+    def __init__(self, outcomes, weights):
+        outcomes, weights = tuple(outcomes), [float(weight) for weight in weights]
+        if not outcomes or len(outcomes) != len(weights) or min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError("A sampler needs one non-negative weight per outcome and a positive total")
+        total = sum(weights)
+        bounds, running = [], 0.0
+        for weight in weights:
+            running += weight
+            bounds.append(running / total)
+        bounds[-1] = 1.0 # No rounding gap above the last outcome
+        guide, i = [], 0
+        for bucket in range(len(outcomes)):
+            while bounds[i] <= bucket / len(outcomes):
+                i += 1
+            guide.append(i)
+        self.outcomes = outcomes
+        self.bounds = tuple(bounds)
+        self.guide = tuple(guide)
+
+    def pick(self, u: float):
+        """The outcome for a uniform number 0 <= u < 1."""
+        i = self.guide[int(u * len(self.guide))]
+        bounds = self.bounds
+        while bounds[i] <= u:
+            i += 1
+        return self.outcomes[i]
+
+    def draw(self, rng=random):
+        return self.pick(rng.random())
+
+    def chance(self, outcome) -> float:
+        """Declared probability of `outcome`."""
+        i = self.outcomes.index(outcome)
+        return self.bounds[i] - (self.bounds[i - 1] if i else 0.0)
+
+
+# --- Compilation ---
+
+def compile_event(spec: dict) -> Event:
+    outcomes, weights = [], []
+    for entry in spec['outcomes']:
+        outcomes.append(Outcome(entry['name'], entry.get('message'), entry.get('health', 0), entry.get('score', 0),
+                                tuple(entry.get('remove', ())), tuple(entry.get('add', ())), entry.get('log', {})))
+        weights.append(entry['weight'])
+    return Event(spec['name'], spec['trigger'], spec.get('requires'), spec.get('unmet'), spec.get('intro'),
+                 Sampler(outcomes, weights))
+
+
+def compile_challenge(name: str, spec: dict) -> Challenge:
+    flee_chance = spec.get('flee_chance', 0.0)
+    return Challenge(name, spec['kind'], spec.get('intro'), spec.get('victory'),
+                     Sampler((False, True), (1 - flee_chance, flee_chance)), spec.get('flee_penalty', 0),
+                     spec.get('hit_score', 0), spec.get('finish_percent', 0), spec.get('finish_score', 0),
+                     spec.get('reward'), spec.get('penalty', 0))
+
+
+def _trigger_table(events) -> dict:
+    table = {}
+    for event in events:
+        table[event.trigger] = table.get(event.trigger, _NO_EVENTS) + (event,)
+    return table
+
+
+class EventEngine:
+    """Per-location trigger tables and challenges for a LOCATIONS mapping, compiled lazily."""
+
+    def __init__(self, locations=None, defaults=DEFAULT_EVENTS, challenges=None):
+        self.locations = gu.LOCATIONS if locations is None else locations
+        # A LazyWorld hands out entries as stored, so a challenge cleared in play is still compiled
+        self._source = getattr(self.locations, 'stored', self.locations.get)
+        self.defaults = tuple(compile_event(spec) for spec in defaults)
+        self._default_table = _trigger_table(self.defaults)
+        self.challenges = {name: compile_challenge(name, spec)
+                           for name, spec in (CHALLENGES if challenges is None else challenges).items()}
+        self._tables = {}
+
+    def _compile(self, location_key: str) -> tuple:
+        data = self._source(location_key) or {}
+        table = self._default_table
+        if data.get('events'):
+            events = {event.name: event for event in self.defaults}
+            for spec in data['events']:
+                if spec.get('outcomes'):
+                    events[spec['name']] = compile_event(spec)
+                else:
+                    events.pop(spec['name'], None)
+            table = _trigger_table(events.values())
+        name = data.get('challenge')
+        if name and name not in self.challenges:
+            raise ValueError(f"Location {location_key!r} declares unknown challenge {name!r}")
+        compiled = (table, self.challenges.get(name))
+        self._tables[location_key] = compiled
+        return compiled
+
+    def events(self, location_key: str, trigger: str) -> tuple:
+        """The location's events for `trigger`, in declaration order (defaults first)."""
+        compiled = self._tables.get(location_key) or self._compile(location_key)
+        return compiled[0].get(trigger, _NO_EVENTS)
+
+    def challenge_at(self, location_key: str):
+        """The Challenge declared at the location (whether or not it was cleared), or None."""
+        compiled = self._tables.get(location_key) or self._compile(location_key)
+        return compiled[1]
+
+
+_ENGINE = None
+
+
+def shared_engine() -> EventEngine:
+    """The process-wide EventEngine for gu.LOCATIONS (rebuilt if the world is swapped)."""
+    global _ENGINE
+    if _ENGINE is None or _ENGINE.locations is not gu.LOCATIONS:
+        _ENGINE = EventEngine(gu.LOCATIONS)
+    return _ENGINE
+
+
+# --- Resolution (no I/O) ---
+
+def resolve_event(event: Event, player: dict, rng=random):
+    """The drawn Outcome, or None when the player lacks the required item (nothing is drawn)."""
+    if event.requires is not None and event.requires not in player['inventory']:
+        return None
+    return event.sampler.draw(rng)
+
+
+def apply_outcome(outcome: Outcome, player: dict):
+    """Applies an outcome's effects to a player dict. Healing is capped at MAX_HEALTH."""
+    if outcome.health > 0:
+        player['health'] = min(MAX_HEALTH, player['health'] + outcome.health)
+    else:
+        player['health'] += outcome.health
+    player['score'] += outcome.score
+    for item in outcome.remove:
+        player['inventory'].remove(item)
+    player['inventory'].extend(outcome.add)
+
+
+def combat_round(challenge: Challenge, action: str, health: int, score: int, difficulty: float,
+                 rng=random) -> Round:
+    """
+    One 'attack' or 'run' against a combat challenge. A failed escape turns into
+    an attack. Returns the new health and score rather than changing a player.
+    """
+    caught = False
+    if action == 'run':
+        if challenge.flee.draw(rng):
+            return Round(True, False, 0, None, False, health, max(0, score - challenge.flee_penalty))
+        caught = True
+    damage, message = gu.calculate_damage(difficulty, rng)
+    health -= damage
+    won = False
+    if damage == 0:
+        score += int(challenge.hit_score * (1 / difficulty))
+        won = rng.randint(1, 100) <= challenge.finish_percent
+        if won:
+            score += challenge.finish_score
+    return Round(False, caught, damage, message, won, health, score)
+
+
+def puzzle_answer(player: dict) -> int:
+    """Places visited times the name's first letter (A=1), minus the points lost by running."""
+    num_visited = len(player['visited_locations'])
+    first_letter_value = ord(player['name'][0].upper()) - ord('A') + 1
+    points_lost_running = 10 if "coward" in player['visited_locations'] else 0
+    return num_visited * first_letter_value - points_lost_running
+
+
+def parse_answer(text: str) -> int:
+    """A typed puzzle answer as an int (-1 if it is not a number)."""
+    try:
+        return int(text)
+    except ValueError:
+        return -1
+
+
+def check_answer(challenge: Challenge, answer: str, player: dict) -> bool:
+    """Whether a typed answer opens the puzzle `challenge`."""
+    return parse_answer(answer) == puzzle_answer(player)
+
+
+# --- Batch Simulation ---
+
+def simulate_event(event: Event, player: dict, trials: int, rng=random) -> Counter:
+    """Outcome name counts over `trials` draws for `player` (effects are not applied)."""
+    counts = Counter()
+    if event.requires is not None and event.requires not in player['inventory']:
+        return counts
+    draw = event.sampler.draw
+    for _ in range(trials):
+        counts[draw(rng).name] += 1
+    return counts
+
+
+def simulate_combat(challenge: Challenge, difficulty: float = 1.0, rng=random, health: int = MAX_HEALTH,
+                    score: int = 0, action: str = 'attack') -> tuple:
+    """Fights to the end with one action: ('won'|'escaped'|'lost', rounds, health, score)."""
+    rounds = 0
+    while health > 0:
+        rounds += 1
+        result = combat_round(challenge, action, health, score, difficulty, rng)
+        health, score = result.health, result.score
+        if result.escaped:
+            return 'escaped', rounds, health, score
+        if result.won:
+            return 'won', rounds, health, score
+    return 'lost', rounds, health, score
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark weighted draws and batch event resolution.")
+    parser.add_argument('--draws', type=int, default=1_000_000)
+    parser.add_argument('--fights', type=int, default=100_000)
+    parser.add_argument('--outcomes', type=int, default=64, help="Outcomes in the synthetic draw benchmark")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    weights = [rng.random() for _ in range(args.outcomes)]
+    sampler = Sampler(range(args.outcomes), weights)
+    cumulative = list(sampler.bounds)
+    uniforms = [rng.random() for _ in range(args.draws)]
+
+    def linear(u):
+        for i, bound in enumerate(cumulative):
+            if u < bound:
+                return i
+
+    started = time.perf_counter()
+    for u in uniforms:
+        linear(u)
+    linear_s = time.perf_counter() - started
+    started = time.perf_counter()
+    rng.choices(range(args.outcomes), cum_weights=cumulative, k=args.draws)
+    bisect_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for u in uniforms:
+        sampler.pick(u)
+    guide_s = time.perf_counter() - started
+    print(f"{args.draws:,} draws over {args.outcomes} outcomes:")
+    print(f"  linear scan     {args.draws / linear_s:12,.0f} draws/s")
+    print(f"  random.choices  {args.draws / bisect_s:12,.0f} draws/s (bisect, batched)")
+    print(f"  guide table     {args.draws / guide_s:12,.0f} draws/s")
+
+    engine = shared_engine()
+    fishing = engine.events('river_bank', 'fish')
+    if fishing:
+        player = {'inventory': [fishing[0].requires]}
+        started = time.perf_counter()
+        counts = simulate_event(fishing[0], player, args.draws, rng)
+        elapsed = time.perf_counter() - started
+        print(f"Fishing: {args.draws / elapsed:,.0f} casts/s, "
+              + ", ".join(f"{name} {count / args.draws:.3f}" for name, count in counts.most_common()))
+
+    ghost = engine.challenges['GHOSTLY_ENCOUNTER']
+    for difficulty in (1.0, 1.5):
+        results, rounds = Counter(), 0
+        started = time.perf_counter()
+        for _ in range(args.fights):
+            result, fight_rounds, _, _ = simulate_combat(ghost, difficulty, rng)
+            results[result] += 1
+            rounds += fight_rounds
+        elapsed = time.perf_counter() - started
+        print(f"Ghost fights at {difficulty}x: {args.fights / elapsed:,.0f} fights/s "
+              f"({rounds / elapsed:,.0f} rounds/s), won {results['won'] / args.fights:.3f}, "
+              f"mean {rounds / args.fights:.2f} rounds")
@@ -0,0 +1,384 @@
+import gzip
+import json
+import os
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from sweep_runner import SweepStats
+
+# --- Session Event Logs ---
+# A GameSession created with `events=log` hands every gameplay event to an
+# EventLog as a dict: 'event', 'sid' (session id) and 'turn', plus the event's
+# own fields; the interactive adventure_quest.py game does the same through a
+# SessionEvents when AQ_EVENTS names a log directory. The log stamps 'ts' (unix seconds) and appends it as one line of
+# compact JSON to a gzip segment. Event kinds:
+#   start        name, difficulty, seed, location
+#   move         origin, to, dwell (turns spent at origin), first (first visit)
+#   take         item, location
+#   fish         outcome, caught
+#   squirrel     outcome (other declared random events log the same way)
+#   combat_round damage, health, won, location
+#   flee         escaped, location
+#   puzzle       answer, correct
+#   milestone    name ('reached:<location>', 'fled_ghost', 'defeated_ghost',
+#                'passed_ghost' (either of the two), 'solved_puzzle'); at
+#                most once per session
+#   end          outcome, final_score, score, health, location, dwell
+#
+# Segments rotate after `max_bytes` of uncompressed JSON. The segment being
+# written carries a '.part' suffix and is renamed when it is closed, so readers
+# only ever see complete files. Because milestones are already deduplicated per
+# session and moves carry their own dwell time, every statistic below is a sum
+# over independent records: the analysis keeps no per-session state, streams
+# any amount of logs in constant memory and merges per-file results in any order.
+#
+# A funnel's steps are milestones (plus 'start' and the ending outcomes) that
+# every session passes in order, so each step counts at most as many sessions
+# as the one before. Its exits, such as 'defeat', end sessions anywhere along
+# the way and are reported as a share of the first step only.
+
+EVENT_SUFFIX = '.jsonl.gz'
+PARTIAL_SUFFIX = '.part'
+DEFAULT_SEGMENT_BYTES = 64 << 20 # Uncompressed bytes per segment
+WRITE_CHUNK = 64 << 10 # Lines are compressed in chunks this large, not one by one
+DEFAULT_FUNNEL = ('start', 'reached:dark_woods_edge', 'passed_ghost', 'reached:secret_cave', 'solved_puzzle',
+                  'victory')
+DEFAULT_EXITS = ('defeat',)
+
+
+class EventLog:
+    """
+    Rotating, gzip-compressed JSON-lines sink; pass it as a GameSession's `events`.
+    `keep` limits how many closed segments this log leaves behind (oldest are
+    deleted first). close() (or leaving a with block) finishes the last segment.
+    """
+
+    def __init__(self, folder: str, prefix: str = 'events', max_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 keep: int = None, compresslevel: int = 6, clock=time.time):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.prefix = f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.compresslevel = compresslevel
+        self.clock = clock
+        self.records = 0
+        self.segments = [] # Closed segment paths, oldest first
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        self._file = None
+        self._path = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._segment_bytes = 0
+
+    def write(self, record: dict):
+        record['ts'] = round(self.clock(), 3)
+        line = self._encode(record) + "\n"
+        self._pending.append(line)
+        self._pending_bytes += len(line)
+        self.records += 1
+        if self._pending_bytes >= WRITE_CHUNK:
+            self.flush()
+            if self._segment_bytes >= self.max_bytes:
+                self.rotate()
+
+    __call__ = write
+
+    def flush(self):
+        """Compresses the buffered lines into the open segment."""
+        if not self._pending:
+            return
+        if self._file is None:
+            self._path = os.path.join(self.folder, f"{self.prefix}-{len(self.segments):05d}{EVENT_SUFFIX}")
+            self._file = gzip.open(self._path + PARTIAL_SUFFIX, 'wt', encoding='utf-8',
+                                   compresslevel=self.compresslevel)
+            self._segment_bytes = 0
+        self._file.write("".join(self._pending))
+        self._segment_bytes += self._pending_bytes
+        self._pending.clear()
+        self._pending_bytes = 0
+
+    def rotate(self):
+        """Closes the current segment (making it visible to readers); the next write opens a new one."""
+        self.flush()
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + PARTIAL_SUFFIX, self._path)
+        self.segments.append(self._path)
+        self._file = None
+        if self.keep is not None:
+            while len(self.segments) > self.keep:
+                os.remove(self.segments.pop(0))
+
+    close = rotate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionEvents:
+    """
+    Event bookkeeping for a game played outside GameSession (adventure_quest.py):
+    stamps 'sid' and 'turn', emits each milestone once and times dwell the same
+    way GameSession does. The game advances `turn` itself.
+    """
+
+    def __init__(self, sink, session_id: str = None):
+        self.sink = sink
+        self.session_id = session_id if session_id is not None else uuid.uuid4().hex[:12]
+        self.turn = 0
+        self._entered_turn = 0
+        self._milestones = set()
+
+    def emit(self, event: str, **fields):
+        fields['event'] = event
+        fields['sid'] = self.session_id
+        fields['turn'] = self.turn
+        self.sink(fields)
+
+    def milestone(self, name: str):
+        if name not in self._milestones:
+            self._milestones.add(name)
+            self.emit('milestone', name=name)
+
+    def moved(self, origin: str, destination: str, first: bool):
+        self.emit('move', origin=origin, to=destination, dwell=self.turn - self._entered_turn, first=first)
+        if first:
+            self.milestone('reached:' + destination)
+        self._entered_turn = self.turn
+
+    def end(self, outcome: str, final_score: int, player: dict):
+        self.emit('end', outcome=outcome, final_score=final_score, score=player['score'], health=player['health'],
+                  location=player['location'], dwell=self.turn - self._entered_turn)
+
+
+# --- Streaming pipeline ---
+
+def event_files(folder: str) -> list:
+    """Closed segments in `folder`, oldest first (segment names sort chronologically)."""
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(EVENT_SUFFIX))
+
+
+def read_events(path: str):
+    """Yields the records of one segment; a damaged or truncated tail just ends the stream."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return # Cut off mid-line
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def stream_events(paths, kinds=None):
+    """Chains the records of several segments, optionally keeping only the given event kinds."""
+    for path in paths:
+        if kinds is None:
+            yield from read_events(path)
+        else:
+            yield from (record for record in read_events(path) if record['event'] in kinds)
+
+
+class EventStats:
+    """Streaming reduction of event records: funnel counts, score distribution and dwell times."""
+
+    def __init__(self):
+        self.events = 0
+        self.kinds = {}
+        self.milestones = {} # Funnel steps: 'start', milestone names and ending outcomes
+        self.scores = SweepStats()
+        self.dwell = {} # location -> [stays, total turns, longest stay]
+        self.combat_rounds = 0
+        self.damage_taken = 0
+        self.puzzle_attempts = 0
+        self.puzzle_solved = 0
+        self.casts = 0
+        self.catches = 0
+
+    def _count(self, table: dict, key: str):
+        table[key] = table.get(key, 0) + 1
+
+    def _stay(self, location: str, turns: int):
+        entry = self.dwell.get(location)
+        if entry is None:
+            entry = self.dwell[location] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += turns
+        if turns > entry[2]:
+            entry[2] = turns
+
+    def add(self, record: dict):
+        event = record['event']
+        self.events += 1
+        self._count(self.kinds, event)
+        if event == 'milestone':
+            self._count(self.milestones, record['name'])
+        elif event == 'move':
+            self._stay(record['origin'], record['dwell'])
+        elif event == 'combat_round':
+            self.combat_rounds += 1
+            self.damage_taken += record['damage']
+        elif event == 'puzzle':
+            self.puzzle_attempts += 1
+            self.puzzle_solved += record['correct']
+        elif event == 'fish':
+            self.casts += 1
+            self.catches += record['caught']
+        elif event == 'start':
+            self._count(self.milestones, 'start')
+        elif event == 'end':
+            self._count(self.milestones, record['outcome'])
+            self._stay(record['location'], record['dwell'])
+            self.scores.add({'outcome': record['outcome'], 'final_score': record['final_score'],
+                             'turns': record['turn'], 'health': record['health']})
+
+    def update(self, records):
+        """Consumes an iterable of records (typically a generator from stream_events)."""
+        for record in records:
+            self.add(record)
+        return self
+
+    def merge(self, other: 'EventStats'):
+        self.events += other.events
+        for mine, theirs in ((self.kinds, other.kinds), (self.milestones, other.milestones)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self.scores.merge(other.scores)
+        for location, (stays, turns, longest) in other.dwell.items():
+            entry = self.dwell.setdefault(location, [0, 0, 0])
+            entry[0] += stays
+            entry[1] += turns
+            entry[2] = max(entry[2], longest)
+        self.combat_rounds += other.combat_rounds
+        self.damage_taken += other.damage_taken
+        self.puzzle_attempts += other.puzzle_attempts
+        self.puzzle_solved += other.puzzle_solved
+        self.casts += other.casts
+        self.catches += other.catches
+        return self
+
+    def funnel(self, steps=DEFAULT_FUNNEL, exits=DEFAULT_EXITS) -> list:
+        """
+        Sessions reaching each step, with conversion from the first and from the
+        previous step, followed by the exits (their 'of_previous' is None).
+        """
+        rows = []
+        first = previous = None
+        for step in steps:
+            count = self.milestones.get(step, 0)
+            if first is None:
+                first = previous = count
+            rows.append({'step': step, 'sessions': count,
+                         'of_first': count / first if first else 0.0,
+                         'of_previous': count / previous if previous else 0.0})
+            previous = count
+        for step in exits:
+            count = self.milestones.get(step, 0)
+            rows.append({'step': step, 'sessions': count, 'of_first': count / first if first else 0.0,
+                         'of_previous': None})
+        return rows
+
+    def summary(self, steps=DEFAULT_FUNNEL, exits=DEFAULT_EXITS) -> dict:
+        return {
+            'events': self.events,
+            'event_counts': dict(sorted(self.kinds.items())),
+            'sessions': self.milestones.get('start', 0),
+            'funnel': self.funnel(steps, exits),
+            'milestones': dict(sorted(self.milestones.items())),
+            'scores': self.scores.summary(),
+            'dwell_turns': {location: {'stays': stays, 'mean': turns / stays, 'max': longest}
+                            for location, (stays, turns, longest) in sorted(self.dwell.items())},
+            'combat': {'rounds': self.combat_rounds,
+                       'mean_damage': self.damage_taken / self.combat_rounds if self.combat_rounds else 0.0},
+            'puzzle': {'attempts': self.puzzle_attempts, 'solved': self.puzzle_solved},
+            'fishing': {'casts': self.casts, 'catches': self.catches},
+        }
+
+
+def analyze_files(paths: list) -> EventStats:
+    """Worker entry point: reduces a batch of segments."""
+    return EventStats().update(stream_events(paths))
+
+
+def analyze_logs(folder: str, workers: int = None, chunk_size: int = 4) -> EventStats:
+    """Reduces every closed segment in `folder` across a process pool (one task per `chunk_size` files)."""
+    paths = event_files(folder)
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    stats = EventStats()
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            stats.merge(analyze_files(chunk))
+        return stats
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(analyze_files, chunks):
+            stats.merge(partial)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    from game_session import GameSession
+    from sweep_runner import derive_seed, random_policy
+
+    parser = argparse.ArgumentParser(description="Record session event logs and stream analytics over them.")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    record = sub.add_parser('record', help="play N random-policy sessions into an event log directory")
+    record.add_argument('folder')
+    record.add_argument('-n', '--sessions', type=int, default=10_000)
+    record.add_argument('--seed', type=int, default=42)
+    record.add_argument('--max-steps', type=int, default=300)
+    record.add_argument('--segment-mb', type=float, default=DEFAULT_SEGMENT_BYTES / (1 << 20),
+                        help="uncompressed megabytes per segment before rotating")
+    analyze = sub.add_parser('analyze', help="funnels, score distribution and dwell times over a directory")
+    analyze.add_argument('folder')
+    analyze.add_argument('-w', '--workers', type=int, default=None)
+    analyze.add_argument('--funnel', nargs='+', default=list(DEFAULT_FUNNEL), help="funnel steps in order")
+    analyze.add_argument('--exits', nargs='*', default=list(DEFAULT_EXITS),
+                         help="outcomes that can end a session at any step (e.g. defeat)")
+    analyze.add_argument('--json', action='store_true', help="print the full summary as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.mode == 'record':
+        with EventLog(args.folder, max_bytes=int(args.segment_mb * (1 << 20))) as log:
+            for i in range(args.sessions):
+                seed = derive_seed(args.seed, 'events', i)
+                session = GameSession(seed=seed, name='Hero', difficulty=1.5 if i % 2 else 1.0, events=log)
+                policy_rng = random.Random(seed)
+                session.start()
+                while session.result is None and session.steps < args.max_steps:
+                    session.feed(random_policy(session, policy_rng))
+                session.run(())
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(path) for path in log.segments)
+        print(f"Recorded {args.sessions:,} sessions ({log.records:,} events) into {len(log.segments)} segments, "
+              f"{size / (1 << 20):.1f} MiB compressed, in {elapsed:.2f}s ({log.records / elapsed:,.0f} events/sec)")
+    else:
+        stats = analyze_logs(args.folder, args.workers)
+        elapsed = time.perf_counter() - start
+        summary = stats.summary(args.funnel, args.exits)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print(f"{summary['sessions']:,} sessions, {summary['events']:,} events")
+            print("Funnel:")
+            for row in summary['funnel']:
+                previous = "   (exit)" if row['of_previous'] is None else f"{row['of_previous']:7.1%} of previous"
+                print(f"  {row['step']:<26} {row['sessions']:>10,}  {row['of_first']:7.1%} of first  {previous}")
+            scores = summary['scores']
+            print(f"Final score: mean {scores['score_mean']:.1f}, stddev {scores['score_stddev']:.1f}, "
+                  f"range {scores['score_min']}..{scores['score_max']}; outcomes {scores['outcome_rates']}")
+            print("Dwell (turns per stay):")
+            for location, dwell in summary['dwell_turns'].items():
+                print(f"  {location:<26} {dwell['stays']:>10,} stays  mean {dwell['mean']:6.2f}  max {dwell['max']}")
+        print(f"Analyzed {summary['events']:,} events in {elapsed:.2f}s ({summary['events'] / elapsed:,.0f} events/sec)")
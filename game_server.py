@@ -0,0 +1,330 @@
+import asyncio
+import collections
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+
+from game_session import GameSession
+from renderer import Renderer, SocketSink
+from replay import LOG_SUFFIX, write_log
+
+# --- Multi-Player Line Server ---
+# Every TCP connection gets its own GameSession. The session never blocks: each
+# received line is fed to it, the text it printed is collected by a
+# renderer.Renderer over the connection, and the whole frame (game text + next
+# prompt) goes out in a single write followed by drain(), so a slow reader only
+# ever stalls its own coroutine.
+#
+# Framing: every frame ends with the pending prompt on its own line. A finished
+# game ends with GAME_OVER and the connection is closed.
+#
+# With a shared_world.SharedWorld every session plays in the same world, so an
+# item one player takes is gone for everybody. What other players do in your
+# room arrives with your next frame. Such a session depends on everyone else's
+# moves, so its replay log could not be replayed on its own: a server records
+# replay logs or shares its world, never both.
+#
+# Event-log records and leaderboard inserts never run on the event loop: the
+# sessions hand them to a Recorder, whose single thread applies them in order
+# (an EventLog gzip flush then stalls that thread, not every connection). A
+# session's rank is read from the leaderboard's in-memory index right away,
+# before its insert is queued; the loop never waits on a lock the Recorder holds
+# across a write.
+
+GAME_OVER = "[game over]"
+MAX_LINE = 1024
+
+
+class Recorder:
+    """One background thread applying queued writes (event records, leaderboard inserts) in order."""
+
+    def __init__(self):
+        self.errors = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='game-server-recorder', daemon=True)
+        self._thread.start()
+
+    def submit(self, write, *args):
+        self._queue.put((write, args))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            write, args = job
+            try:
+                write(*args)
+            except (OSError, ValueError):
+                self.errors += 1 # A full disk loses records, not the server
+
+    def events(self, sink):
+        """A GameSession `events` callable that queues each record for `sink`."""
+        return lambda record: self.submit(sink, record)
+
+    def leaderboard(self, board) -> 'QueuedLeaderboard':
+        return QueuedLeaderboard(board, self)
+
+    def close(self):
+        """Waits for every queued write to finish."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class QueuedLeaderboard:
+    """
+    The add() a GameSession needs: the rank comes from the in-memory index plus
+    the scores still queued, and the insert itself is left to the Recorder.
+
+    Only the event loop touches the queued scores, so add() takes no lock the
+    Recorder holds: the Recorder just calls board.add, and add() works out which
+    queued scores have landed from the board's entry count (inserts apply in
+    submission order, so the landed ones are always a prefix).
+    """
+
+    def __init__(self, board, recorder: Recorder):
+        self.board = board
+        self.recorder = recorder
+        self._queued = collections.deque() # (entry count once added, score, difficulty)
+        self._submitted = len(board)
+
+    def add(self, name: str, score: int, difficulty: float = 1.0) -> int:
+        rank, count = self.board.standing(score, difficulty)
+        while self._queued and self._queued[0][0] <= count:
+            self._queued.popleft() # Already counted by the index
+        rank += sum(1 for _, queued, level in self._queued if level == difficulty and queued > score)
+        self._submitted += 1
+        self._queued.append((self._submitted, score, difficulty))
+        self.recorder.submit(self.board.add, name, score, difficulty)
+        return rank
+
+
+class GameServer:
+    """asyncio server hosting one independent GameSession per connection."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, base_seed: int = 42, idle_timeout: float = None,
+                 record_dir: str = None, events=None, leaderboard=None, shared_world=None):
+        if record_dir is not None and shared_world is not None:
+            raise ValueError("Replay logs of sessions in a shared world cannot be replayed; pick one")
+        self.host = host
+        self.port = port
+        self.base_seed = base_seed
+        self.idle_timeout = idle_timeout
+        self.record_dir = record_dir
+        # Both are shared by every session (e.g. an event_log.EventLog and a leaderboard.Leaderboard)
+        self.recorder = Recorder() if events is not None or leaderboard is not None else None
+        self.events = self.recorder.events(events) if events is not None else None
+        self.leaderboard = self.recorder.leaderboard(leaderboard) if leaderboard is not None else None
+        self.shared_world = shared_world
+        self.connections = 0
+        self.total_connections = 0
+        self.commands = 0
+        self._seeds = itertools.count(base_seed)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self.handle_client, self.host, self.port, limit=MAX_LINE, backlog=4096)
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    async def handle_client(self, reader, writer):
+        renderer = Renderer(SocketSink(writer))
+        session = GameSession(seed=next(self._seeds), output=renderer.write, record=self.record_dir is not None,
+                              events=self.events, leaderboard=self.leaderboard, world=self.shared_world)
+        self.connections += 1
+        self.total_connections += 1
+        try:
+            prompt = session.start()
+            await self._send(writer, renderer, prompt)
+            while prompt is not None:
+                try:
+                    if self.idle_timeout:
+                        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                    else:
+                        line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                    break # Oversized line or idle client
+                if not line:
+                    break # Client hung up
+                self.commands += 1
+                prompt = session.feed(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                await self._send(writer, renderer, prompt if prompt is not None else GAME_OVER)
+        except ConnectionError:
+            pass # A cancelled task still runs the cleanup below, then stays cancelled
+        finally:
+            self.connections -= 1
+            writer.close()
+            session.close()
+            if self.record_dir is not None:
+                # Replay logs are written off the event loop
+                path = os.path.join(self.record_dir, f"session_{session.seed}{LOG_SUFFIX}")
+                await asyncio.get_running_loop().run_in_executor(None, write_log, path, session)
+
+    async def _send(self, writer, renderer: Renderer, prompt: str):
+        """Writes the buffered game text and the prompt as one frame, honouring backpressure."""
+        renderer.flush(prompt + "\n")
+        await writer.drain()
+
+
+# --- Load Generator ---
+
+LOAD_SCRIPT = ['look around', 'status', 'go east', 'look around', 'inventory', 'go west']
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def _read_frame(reader) -> str:
+    """Reads lines until the prompt (or GAME_OVER) line that closes a frame."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return GAME_OVER
+        text = line.decode('utf-8', 'replace').rstrip('\n')
+        if text == GAME_OVER or text.endswith((': ', '? ')):
+            return text
+
+
+async def _idle_client(host: str, port: int, hold: asyncio.Event):
+    reader, writer = await asyncio.open_connection(host, port)
+    await _read_frame(reader)
+    await hold.wait()
+    writer.close()
+
+
+async def _active_client(host: str, port: int, stop_at: float, interval: float, latencies: list, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    await _read_frame(reader)
+    lines = itertools.chain(['Loadbot', '1'], itertools.cycle(LOAD_SCRIPT))
+    await asyncio.sleep(rng.random() * interval) # Spread clients over the interval
+    while time.perf_counter() < stop_at:
+        sent = time.perf_counter()
+        writer.write((next(lines) + "\n").encode())
+        await writer.drain()
+        frame = await _read_frame(reader)
+        latencies.append(time.perf_counter() - sent)
+        if frame == GAME_OVER:
+            break
+        await asyncio.sleep(interval)
+    writer.close()
+
+
+async def run_load(host: str, port: int, idle: int, active: int, duration: float, interval: float) -> dict:
+    """Opens `idle` silent connections plus `active` scripted ones and measures command latency."""
+    hold = asyncio.Event()
+    idle_tasks = []
+    for _ in range(idle):
+        idle_tasks.append(asyncio.create_task(_idle_client(host, port, hold)))
+        if len(idle_tasks) % 500 == 0:
+            await asyncio.sleep(0) # Let the connects drain instead of flooding the backlog
+
+    latencies = []
+    rng = random.Random(0)
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(*(_active_client(host, port, stop_at, interval, latencies, rng) for _ in range(active)))
+    hold.set()
+    await asyncio.gather(*idle_tasks, return_exceptions=True)
+
+    latencies.sort()
+    return {
+        'idle_connections': idle,
+        'active_connections': active,
+        'commands': len(latencies),
+        'commands_per_sec': len(latencies) / duration,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def _raise_fd_limit():
+    """Lifts the soft open-file limit so thousands of sockets fit in one process."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Host Adventure Quest sessions over TCP, or load-test a server.")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    serve = sub.add_parser('serve', help="run the game server")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--seed', type=int, default=42)
+    serve.add_argument('--idle-timeout', type=float, default=None)
+    serve.add_argument('--record-dir', default=None, help="write a replay log per session into this directory")
+    serve.add_argument('--events-dir', default=None, help="write rotating gameplay event logs into this directory")
+    serve.add_argument('--leaderboard', default=None, help="record final scores in this leaderboard file")
+    serve.add_argument('--shared-world', action='store_true', help="let every player change the same world")
+    load = sub.add_parser('load', help="run the load generator against a server")
+    load.add_argument('--host', default='127.0.0.1')
+    load.add_argument('--port', type=int, default=8765)
+    load.add_argument('--idle', type=int, default=10_000)
+    load.add_argument('--active', type=int, default=1_000)
+    load.add_argument('--duration', type=float, default=10.0)
+    load.add_argument('--interval', type=float, default=0.5, help="think time between commands per client")
+    args = parser.parse_args()
+
+    if args.mode == 'serve' and args.record_dir and args.shared_world:
+        parser.error("--record-dir cannot be combined with --shared-world (the logs would not replay)")
+    _raise_fd_limit()
+    if args.mode == 'serve':
+        if os.environ.get('AQ_METRICS') or os.environ.get('AQ_PROFILE'):
+            import instrumentation
+            instrumentation.from_environment() # Hooks every GameSession the server creates
+        if args.record_dir:
+            os.makedirs(args.record_dir, exist_ok=True)
+        events = None
+        if args.events_dir:
+            from event_log import EventLog
+            events = EventLog(args.events_dir)
+        leaderboard = None
+        if args.leaderboard:
+            from leaderboard import Leaderboard
+            leaderboard = Leaderboard(args.leaderboard)
+        shared_world = None
+        if args.shared_world:
+            from shared_world import SharedWorld
+            shared_world = SharedWorld()
+        server = GameServer(args.host, args.port, args.seed, args.idle_timeout, args.record_dir, events, leaderboard,
+                            shared_world)
+        print(f"Adventure Quest server listening on {args.host}:{args.port}")
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            print(f"\nServed {server.total_connections} connections and {server.commands} commands.")
+        finally:
+            server.close() # Drains the queued event records and leaderboard inserts first
+            if events is not None:
+                events.close()
+            if leaderboard is not None:
+                leaderboard.close()
+    else:
+        report = asyncio.run(run_load(args.host, args.port, args.idle, args.active, args.duration, args.interval))
+        print(json.dumps(report, indent=2))
@@ -1,70 +1,65 @@
+import os
 import random
 import math
 
+from world_loader import DEFAULT_CACHE_SIZE, LazyWorld
+
 # --- Global Game State (Demonstrating appropriate use for constants/data) ---
-# Location data uses a nested dictionary structure
-LOCATIONS = {
-    'start_clearing': {
-        'description': "You are in a quiet **Start Clearing**. A weathered sign points North and East. You hear the distant rush of water.",
-        'actions': ['go north', 'go east', 'examine sign', 'look around'],
-        'items': ['old map fragment'],
-        'challenge': None,
-        'neighbors': {'north': 'dark_woods_edge', 'east': 'river_bank'}
-    },
-    'dark_woods_edge': {
-        'description': "The air is heavy and cold here, at the **Dark Woods Edge**. A narrow, barely visible path heads deeper into the woods.",
-        'actions': ['go south', 'go west', 'enter woods', 'look around'],
-        'items': [],
-        'challenge': 'GHOSTLY_ENCOUNTER',
-        'neighbors': {'south': 'start_clearing', 'west': 'mountain_path'}
-    },
-    'river_bank': {
-        'description': "The **River Bank** is lush. A swift, dark river blocks the path to the East. A small, strange-looking **fishing rod** lies abandoned near the water.",
-        'actions': ['go west', 'fish', 'take rod', 'look around'],
-        'items': ['fishing rod'],
-        'challenge': None,
-        'neighbors': {'west': 'start_clearing'}
-    },
-    'mountain_path': {
-        'description': "You are on a steep, winding **Mountain Path**. The air is thin. A hidden cave entrance is rumored to be nearby.",
-        'actions': ['go east', 'search for cave', 'look around'],
-        'items': ['healing potion'],
-        'challenge': None,
-        'neighbors': {'east': 'dark_woods_edge'}
-    },
-    'secret_cave': {
-        'description': "You found the **Secret Cave**! It's small, damp, and lit by a faint blue glow. A large, ornate **chest** is in the center.",
-        'actions': ['examine chest', 'go outside'],
-        'items': ['ancient relic'],
-        'challenge': 'FINAL_PUZZLE',
-        'neighbors': {'outside': 'mountain_path'}
-    }
-}
+# Location data uses a nested dictionary structure, loaded lazily from world.jsonl
+# (description, actions, items, challenge, neighbors and ASCII art per location).
+# AQ_WORLD / AQ_WORLD_CACHE override the data file and the LRU cache size.
+# The file is only opened on first use, so the game's first prompt never waits for it.
+WORLD_PATH = os.environ.get('AQ_WORLD', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'world.jsonl'))
+LOCATIONS = LazyWorld(WORLD_PATH, cache_size=int(os.environ.get('AQ_WORLD_CACHE', DEFAULT_CACHE_SIZE)), defer=True)
 # --- End Global Game State ---
 
-def display_status(player: dict):
+# Commands available everywhere, after each location's own actions
+STANDARD_ACTIONS = ('status', 'inventory', 'quit', 'save')
+
+_STATUS_RULE = '=' * 30
+
+
+_TITLES = {} # Dropped whole once MAX_TITLES is reached (huge generated worlds)
+MAX_TITLES = 4096
+
+
+def location_title(location_key: str) -> str:
+    """'dark_woods_edge' -> 'Dark Woods Edge' (cached; called every turn)."""
+    title = _TITLES.get(location_key)
+    if title is None:
+        if len(_TITLES) >= MAX_TITLES:
+            _TITLES.clear()
+        title = _TITLES[location_key] = location_key.replace('_', ' ').title()
+    return title
+
+
+def display_status(player: dict, output=print):
     """Shows current player health, score, and inventory using f-strings."""
     # String Slicing Demonstration: Shows only first 3 items in inventory if more than 3
     inventory_display = ", ".join(player['inventory'][:3])
     if len(player['inventory']) > 3:
         inventory_display += f" and {len(player['inventory']) - 3} others..."
 
-    print(f"\n{'='*30}")
-    print(f"| 🧑 **{player['name']}**'s Status")
-    print(f"| **HEALTH**: {player['health']} HP")
-    print(f"| **SCORE**: {player['score']}")
-    print(f"| **LOCATION**: {player['location'].replace('_', ' ').title()}")
-    print(f"| **INVENTORY**: {inventory_display if inventory_display else 'Empty'}")
-    print(f"{'='*30}\n")
+    # Composed into one string so the whole box is a single write
+    output(f"\n{_STATUS_RULE}\n"
+           f"| 🧑 **{player['name']}**'s Status\n"
+           f"| **HEALTH**: {player['health']} HP\n"
+           f"| **SCORE**: {player['score']}\n"
+           f"| **LOCATION**: {location_title(player['location'])}\n"
+           f"| **INVENTORY**: {inventory_display if inventory_display else 'Empty'}\n"
+           f"{_STATUS_RULE}\n")
 
 
-def move_player(player: dict, direction: str) -> tuple:
+def move_player(player: dict, direction: str, locations=None) -> tuple:
     """
     Updates player position based on direction and returns new description and a boolean indicating success.
     Returns multiple values using tuple unpacking.
+    `locations` defaults to the global LOCATIONS; sessions pass their own world view.
     """
+    if locations is None:
+        locations = LOCATIONS
     current_location_key = player['location']
-    current_location = LOCATIONS.get(current_location_key)
+    current_location = locations.get(current_location_key)
 
     # Nested Conditional (3 levels deep)
     if current_location and 'neighbors' in current_location:
@@ -83,32 +78,47 @@ def move_player(player: dict, direction: str) -> tuple:
             # Set demonstration: Add location to visited set
             player['visited_locations'].add(new_location_key) 
             
-            new_description = LOCATIONS[new_location_key]['description']
+            new_description = locations[new_location_key]['description']
             return new_description, True
         elif normalized_direction == 'outside' and current_location_key == 'secret_cave':
             # Handle the specific 'go outside' action for the cave
-            player['location'] = LOCATIONS['secret_cave']['neighbors']['outside']
+            player['location'] = locations['secret_cave']['neighbors']['outside']
             player['visited_locations'].add(player['location'])
-            return LOCATIONS[player['location']]['description'], True
+            return locations[player['location']]['description'], True
         else:
             return f"You can't go {direction} from here.", False
     else:
         # Should not happen in a correctly structured game
         return "You seem to be lost in the void. An error occurred.", False
 
-def calculate_damage(difficulty_mod: float) -> tuple:
+def use_hidden_exit(player: dict, action: str, locations=None) -> tuple:
+    """
+    Follows an action-triggered exit such as 'search for cave' (a location's 'hidden_exits').
+    Returns the new description and whether the player moved, like move_player.
+    """
+    if locations is None:
+        locations = LOCATIONS
+    target = locations.get(player['location'], {}).get('hidden_exits', {}).get(action)
+    if target is None:
+        return None, False
+    player['location'] = target
+    player['visited_locations'].add(target)
+    return locations[target]['description'], True
+
+def calculate_damage(difficulty_mod: float, rng=random) -> tuple:
     """
     Uses random module and math operations to determine combat outcomes.
     Returns damage taken and a success message.
+    `rng` defaults to the shared random module; sessions pass their own random.Random.
     """
     # Use random.random() for probability check
-    if random.random() < (0.3 * difficulty_mod): # Easier to take damage on Hard
+    if rng.random() < (0.3 * difficulty_mod): # Easier to take damage on Hard
         # Use random.randint()
-        base_damage = random.randint(15, 25)
+        base_damage = rng.randint(15, 25)
         
         # Math Module Demonstration: Use math.floor() to ensure integer damage
         # Damage is increased by a random factor based on difficulty
-        final_damage = math.floor(base_damage + (base_damage * (random.random() * 0.5 * difficulty_mod)))
+        final_damage = math.floor(base_damage + (base_damage * (rng.random() * 0.5 * difficulty_mod)))
         
         # Modulus Demonstration: Check if damage is a 'critical' (even number)
         is_critical = final_damage % 2 == 0
@@ -122,47 +132,155 @@ def calculate_damage(difficulty_mod: float) -> tuple:
         return final_damage, message
     else:
         # Use random.choice()
-        safe_message = random.choice([
+        safe_message = rng.choice([
             "You narrowly dodged the attack!",
             "The monster missed!",
             "A scratch, no damage taken."
         ])
         return 0, safe_message
 
-def validate_input(prompt: str, valid_options: list) -> str:
+def validate_input(prompt: str, valid_options: list, output=None, read_line=None) -> str:
     """
-    Takes user input and list of valid options, returns validated choice.
-    Uses string methods like lower() and strip().
+    Takes user input and list of valid options (or a compiled CommandTable), returns validated choice.
+    Uses string methods like lower() and strip(). `output` and `read_line` default to print and input.
     """
+    output = output if output is not None else print
+    read_line = read_line if read_line is not None else input # Looked up per call, so patching input works
+    table = valid_options if isinstance(valid_options, CommandTable) else compile_commands(tuple(valid_options))
     while True:
-        user_input = input(f"> {prompt} (Options: {', '.join(valid_options)}): ").strip().lower()
-        
-        # Check if the input is one of the valid options
-        if user_input in [opt.lower() for opt in valid_options]:
-            return user_input
-        
-        # Check for multi-word commands (like 'go north' or 'take rod')
-        # This allows for more flexible command handling
-        first_word = user_input.split()[0]
-        if first_word in [opt.lower().split()[0] for opt in valid_options if len(opt.split()) > 1]:
-            # Simple check for 'go' commands
-            if first_word == 'go':
-                # Allow 'go north' if 'go north' is in valid_options
-                if user_input in [opt.lower() for opt in valid_options]:
-                    return user_input
-            
-            # Simple check for 'take' commands
-            elif first_word == 'take':
-                if user_input in [opt.lower() for opt in valid_options]:
-                    return user_input
-            
-            # Allow "fish" command even if it's not a multi-word command in the list
-            elif first_word == 'fish':
-                if 'fish' in [opt.lower() for opt in valid_options]:
-                    return 'fish'
+        user_input = read_line(table.prompt(prompt))
+        command = table.parse(user_input)
+        if command is not None:
+            return command.text
+
+        output(f"**Invalid action.** Please choose from: {table.listing}")
+
+
+# --- Command Compiler ---
+# Every menu is compiled once into a hash of case-folded option text -> Command,
+# so parsing a line is a strip, a lower and one dict lookup.
+
+class Command:
+    """One parsed menu option: its full text, first word and the rest."""
+    __slots__ = ('text', 'verb', 'argument')
+
+    def __init__(self, text: str, verb: str, argument: str):
+        self.text = text
+        self.verb = verb
+        self.argument = argument
+
+    def __repr__(self) -> str:
+        return f"Command(text={self.text!r}, verb={self.verb!r}, argument={self.argument!r})"
+
+
+class CommandTable:
+    """Precompiled lookup for one list of valid options."""
+    __slots__ = ('options', 'listing', 'lookup', 'fish_fallback', '_prompts')
+
+    def __init__(self, valid_options: tuple):
+        self.options = tuple(valid_options)
+        self.listing = ', '.join(self.options)
+        self.lookup = {}
+        for option in self.options:
+            text = option.lower()
+            verb, _, argument = text.partition(' ')
+            self.lookup.setdefault(text, Command(text, verb, argument))
+        # validate_input's old quirk: 'fish <anything>' means 'fish' when a
+        # multi-word option also starts with 'fish'
+        self.fish_fallback = 'fish' in self.lookup and any(
+            command.verb == 'fish' and command.argument for command in self.lookup.values())
+        self._prompts = {}
+
+    def parse(self, user_input: str):
+        """Returns the matching Command, or None when the input is not a valid option."""
+        text = user_input.strip().lower()
+        command = self.lookup.get(text)
+        if command is None and self.fish_fallback and text.startswith('fish') and text[4:5].isspace():
+            command = self.lookup['fish']
+        return command
+
+    def prompt(self, prompt: str) -> str:
+        """The full '> prompt (Options: ...): ' line, built once per prompt text."""
+        text = self._prompts.get(prompt)
+        if text is None:
+            text = self._prompts[prompt] = f"> {prompt} (Options: {self.listing}): "
+        return text
+
+
+_COMMAND_TABLES = {} # Dropped whole once MAX_COMMAND_TABLES is reached
+MAX_COMMAND_TABLES = 256
 
-        print(f"**Invalid action.** Please choose from: {', '.join(valid_options)}")
 
+def compile_commands(valid_options: tuple) -> CommandTable:
+    """Builds (and caches) the CommandTable for a tuple of valid options."""
+    table = _COMMAND_TABLES.get(valid_options)
+    if table is None:
+        if len(_COMMAND_TABLES) >= MAX_COMMAND_TABLES:
+            _COMMAND_TABLES.clear()
+        table = _COMMAND_TABLES[valid_options] = CommandTable(valid_options)
+    return table
+
+
+# Location key -> (its actions, its CommandTable). Keyed per location rather
+# than per options tuple, so a big world cannot churn a small LRU; locations
+# with the same actions still share one table through compile_commands().
+_LOCATION_MENUS = {}
+
+
+def location_commands(location_key: str, locations=None) -> CommandTable:
+    """The compiled menu for a location: its actions plus the standard commands."""
+    location_data = (LOCATIONS if locations is None else locations).get(location_key, {})
+    actions = location_data.get('actions', [])
+    cached = _LOCATION_MENUS.get(location_key)
+    if cached is not None and cached[0] == actions: # Another world may reuse the key
+        return cached[1]
+    table = compile_commands(tuple(actions) + STANDARD_ACTIONS)
+    _LOCATION_MENUS[location_key] = (list(actions), table)
+    return table
+
+
+# --- Action Routing ---
+# adventure_quest.py and game_session.GameSession route a chosen action the
+# same way: its exact text first, then its verb (first word), and 'other'
+# (hidden exits, location events, flavour actions like "look around") for the
+# rest. Each front end binds the route names to its own handlers.
+
+ACTION_ROUTES = {
+    'quit': 'quit',
+    'status': 'status',
+    'inventory': 'inventory',
+    'save': 'save',
+    'examine chest': 'examine_chest',
+}
+VERB_ROUTES = {
+    'go': 'go',
+    'take': 'take',
+}
+
+
+def bind_routes(handlers: dict) -> tuple:
+    """
+    Turns {route name: handler} into (exact text -> handler, verb -> handler);
+    look a Command up in the first, then the second, else use handlers['other'].
+    """
+    return ({text: handlers[name] for text, name in ACTION_ROUTES.items()},
+            {verb: handlers[name] for verb, name in VERB_ROUTES.items()})
+
+
+def parse(command: str, valid_options) -> Command:
+    """Non-interactive parser shared by the game loop and batch drivers."""
+    if not isinstance(valid_options, CommandTable):
+        valid_options = compile_commands(tuple(valid_options))
+    return valid_options.parse(command)
+
+
+def match_option(user_input: str, valid_options: list):
+    """
+    Non-interactive half of validate_input: returns the matched option text or None.
+    Shared with headless sessions that cannot block on input().
+    """
+    command = parse(user_input, valid_options)
+    return command.text if command is not None else None
 
 def save_game(player: dict) -> str:
     """
@@ -190,29 +308,40 @@ def get_location_data(location_key: str) -> dict:
     """Helper to safely retrieve location data."""
     return LOCATIONS.get(location_key, {})
 
-def get_location_ascii(location_key: str) -> str:
-    """Bonus: Provides ASCII art for specific locations."""
-    if location_key == 'start_clearing':
-        return (
-            "    🌳  🌳  🌳\n"
-            "      | | |\n"
-            "   ---|* *|---\n"
-            "  /  CLEARING  \\\n"
-            " /____\\ /____\\\n"
-        )
-    elif location_key == 'dark_woods_edge':
-        return (
-            "   🌲 🌲 🌲 🌲\n"
-            "   / | | \\ |\n"
-            "  ( |DARK|  )\n"
-            "   \\ WOODS /\n"
-        )
-    elif location_key == 'secret_cave':
-         return (
-             "       ⛏️\n"
-             "  ______/|______\n"
-             " /  \\ **GLOW** /  \\\n"
-             "| SECRET CAVE |\n"
-         )
-    else:
-        return ""
\ No newline at end of file
+def get_location_ascii(location_key: str, location_data: dict = None) -> str:
+    """Bonus: Provides ASCII art for specific locations (stored with the world data)."""
+    if location_data is None:
+        location_data = get_location_data(location_key)
+    return location_data.get('ascii', '')
+
+
+def load_world(data_path: str, cache_size: int = DEFAULT_CACHE_SIZE, validate: bool = True):
+    """Switches the global LOCATIONS to another world data file (checked by world_graph.check_world)."""
+    global LOCATIONS
+    LOCATIONS = LazyWorld(data_path, cache_size=cache_size, validate=validate)
+    _LOCATION_MENUS.clear()
+    import renderer # Imports this module, so it cannot be imported at the top
+    renderer.invalidate()
+    return LOCATIONS
+
+
+def _mutable_location(location_key: str) -> dict:
+    # Lazily loaded locations must be pinned before editing them in place
+    pin = getattr(LOCATIONS, 'pin', None)
+    return pin(location_key) if pin is not None else LOCATIONS[location_key]
+
+
+def clear_location_challenge(location_key: str):
+    """Marks the challenge at a location of the global world as completed."""
+    _mutable_location(location_key)['challenge'] = None
+
+
+def take_location_item(location_key: str, item_name: str) -> bool:
+    """Removes an item from a location of the global world; returns False if it is not there."""
+    items = _mutable_location(location_key)['items']
+    try:
+        # List method remove(): one atomic step, so two threads can never both take the same item
+        items.remove(item_name)
+    except ValueError:
+        return False
+    return True
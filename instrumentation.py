@@ -0,0 +1,461 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import game_utils as gu
+
+# --- Per-Turn Instrumentation ---
+# Hooks are installed by swapping functions for timing wrappers, so an
+# uninstalled or never-installed Instrumentation costs exactly nothing: the game
+# calls its own functions. instrument_game() wraps adventure_quest.py's turn
+# functions (display_location, check_for_challenge, validate_input,
+# handle_action); instrument_sessions() wraps GameSession's, which covers the
+# server, script and sweep sessions. Both count actions, and both read random
+# event, combat and puzzle outcomes straight from the results of
+# event_engine.resolve_event(), combat_round() and check_answer().
+# Installed wrappers record per-phase latencies into HDR-style histograms.
+# Each thread writes to its own shard, so recording never takes a lock; shards
+# are only merged when metrics are exported.
+#
+# Phase times are wall-clock self times: a wrapped call nested in another one
+# (the combat prompt's validate_input inside check_for_challenge, the frame
+# rendered inside a session's feed) counts toward its own phase only. The wait
+# for input() is therefore all in 'input', except the puzzle's answer, which
+# adventure_quest.py reads with ask(), not validate_input, inside 'challenge'.
+
+SUB_BUCKET_BITS = 4 # 16 linear sub-buckets per power of two: values within ~6%
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value: int) -> int:
+    """Log-linear bucket of a non-negative integer (HDR histogram layout)."""
+    if value < SUB_BUCKETS:
+        return max(0, value)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_bounds(index: int) -> tuple:
+    """[low, high) range of values that fall into bucket `index`."""
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS + SUB_BUCKETS
+    return sub << shift, (sub + 1) << shift
+
+
+class LatencyHistogram:
+    """Nanosecond latencies in log-linear buckets; constant memory per magnitude."""
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value: int):
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, fraction: float) -> int:
+        """Upper edge of the bucket holding the given fraction of samples (never under-reports)."""
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_bounds(index)[1] - 1, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_ns': self.total,
+            'min_ns': self.min or 0,
+            'max_ns': self.max or 0,
+            'p50_ns': self.percentile(0.50),
+            'p90_ns': self.percentile(0.90),
+            'p99_ns': self.percentile(0.99),
+            'buckets': {bucket_bounds(index)[1]: count for index, count in sorted(self.counts.items())},
+        }
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+
+
+class Metrics:
+    """Counters and latency histograms, sharded per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._register = threading.Lock() # Taken once per thread, never while recording
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._register:
+                self._shards.append(shard)
+        return shard
+
+    def count(self, name: str, label: str = '', amount: int = 1):
+        self._shard().counters[(name, label)] += amount
+
+    def observe(self, phase: str, nanoseconds: int):
+        histograms = self._shard().histograms
+        histogram = histograms.get(phase)
+        if histogram is None:
+            histogram = histograms[phase] = LatencyHistogram()
+        histogram.record(nanoseconds)
+
+    def merged(self) -> tuple:
+        counters = Counter()
+        histograms = {}
+        for shard in list(self._shards):
+            counters.update(shard.counters)
+            for phase, histogram in list(shard.histograms.items()):
+                histograms.setdefault(phase, LatencyHistogram()).merge(histogram)
+        return counters, histograms
+
+    def to_json(self) -> dict:
+        counters, histograms = self.merged()
+        grouped = {}
+        for (name, label), value in sorted(counters.items()):
+            grouped.setdefault(name, {})[label] = value
+        return {'counters': grouped, 'phases': {phase: h.summary() for phase, h in sorted(histograms.items())}}
+
+    def to_prometheus(self, prefix: str = 'aq') -> str:
+        counters, histograms = self.merged()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, label), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f'{prefix}_{name}_total{{label="{_escape(label)}"}} {value}')
+        if histograms:
+            lines.append(f"# TYPE {prefix}_phase_seconds histogram")
+        for phase, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for index in sorted(histogram.counts):
+                cumulative += histogram.counts[index]
+                upper = bucket_bounds(index)[1] / 1e9
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{upper:.9g}"}} {cumulative}')
+            lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram.total / 1e9:.9f}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> str:
+        """Writes Prometheus text for *.prom / *.txt paths, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else json.dumps(self.to_json(), indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+
+def _escape(label: str) -> str:
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- Hooks ---
+
+class Instrumentation:
+    """
+    Installs timing wrappers and calls hooks after every wrapped call as
+    hook(phase, elapsed_ns, args, result, before), where `before` is whatever
+    the wrapper's `state` callable returned just before the call.
+    """
+
+    def __init__(self, metrics: Metrics = None):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.hooks = []
+        self._patches = [] # (owner, attribute, original)
+        self._nested = threading.local() # .inner: time spent in wrapped calls nested in the current one
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._patches)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def wrap(self, phase: str, function, state=None, timed: bool = True):
+        """
+        A wrapper that records the call's self time under `phase` (unless not
+        `timed`, e.g. for generators, whose call returns before any work is done).
+        """
+        observe = self.metrics.observe
+        hooks = self.hooks
+        nested = self._nested
+        clock = time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            before = state() if state is not None else None
+            result = None
+            outer = getattr(nested, 'inner', 0)
+            nested.inner = 0
+            started = clock()
+            try:
+                result = function(*args, **kwargs)
+                return result
+            finally:
+                # Also runs when the game ends through sys.exit() inside the call
+                elapsed = clock() - started
+                inner, nested.inner = nested.inner, outer + elapsed
+                if timed:
+                    observe(phase, elapsed - inner)
+                for hook in hooks:
+                    hook(phase, elapsed, args, result, before)
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def patch(self, owner, attribute: str, phase: str, state=None, timed: bool = True):
+        original = getattr(owner, attribute)
+        setattr(owner, attribute, self.wrap(phase, original, state, timed))
+        self._patches.append((owner, attribute, original))
+
+    def uninstall(self):
+        """Puts every original function back; afterwards the game runs unmodified code."""
+        while self._patches:
+            owner, attribute, original = self._patches.pop()
+            setattr(owner, attribute, original)
+
+
+def _count_outcomes(instrumentation: Instrumentation):
+    """Counts random events, combat rounds and challenge outcomes from event_engine's results."""
+    import event_engine
+
+    count = instrumentation.metrics.count
+
+    def classify(phase, elapsed, args, result, before):
+        if phase == 'event':
+            event = args[0]
+            count('random_events', f"{event.name}:{'unmet' if result is None else result.name}")
+        elif phase == 'combat_round' and result is not None:
+            challenge = args[0]
+            if result.escaped:
+                count('combat_rounds', 'escaped')
+                count('challenges', f"{challenge.name}:escaped")
+                return
+            count('combat_rounds', 'dodge' if result.damage == 0 else 'critical' if 'CRITICAL' in result.message
+                  else 'hit')
+            if result.won:
+                count('challenges', f"{challenge.name}:won")
+            elif result.health <= 0:
+                count('challenges', f"{challenge.name}:defeated")
+        elif phase == 'puzzle' and result is not None:
+            count('challenges', f"{args[0].name}:{'won' if result else 'failed'}")
+
+    instrumentation.add_hook(classify)
+    instrumentation.patch(event_engine, 'resolve_event', 'event')
+    instrumentation.patch(event_engine, 'combat_round', 'combat_round')
+    instrumentation.patch(event_engine, 'check_answer', 'puzzle')
+
+
+def instrument_game(game, instrumentation: Instrumentation = None) -> Instrumentation:
+    """Hooks adventure_quest-style `game` module functions and event_engine's results."""
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    count = instrumentation.metrics.count
+
+    def count_action(phase, elapsed, args, result, before):
+        if phase == 'action':
+            count('actions', args[0] if args else '')
+
+    instrumentation.add_hook(count_action)
+    instrumentation.patch(game, 'display_location', 'render')
+    instrumentation.patch(game, 'check_for_challenge', 'challenge')
+    instrumentation.patch(game, 'handle_action', 'action')
+    instrumentation.patch(gu, 'validate_input', 'input')
+    _count_outcomes(instrumentation)
+    return instrumentation
+
+
+def instrument_sessions(instrumentation: Instrumentation = None) -> Instrumentation:
+    """
+    Hooks every GameSession (and event_engine's results). A session's 'turn' is
+    one feed(): everything the game does with a line, without waiting for it.
+    """
+    from game_session import GameSession
+
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    count = instrumentation.metrics.count
+
+    def count_action(phase, elapsed, args, result, before):
+        if phase == 'action':
+            command = args[1]
+            count('actions', getattr(command, 'text', command))
+
+    instrumentation.add_hook(count_action)
+    instrumentation.patch(GameSession, 'display_location', 'render')
+    instrumentation.patch(GameSession, 'feed', 'turn')
+    instrumentation.patch(GameSession, 'handle_action', 'action', timed=False) # A generator
+    _count_outcomes(instrumentation)
+    return instrumentation
+
+
+# --- Sampling Profiler ---
+
+class SamplingProfiler:
+    """Opt-in statistical profiler: a daemon thread samples one thread's Python stack every `interval` s."""
+
+    def __init__(self, interval: float = 0.002, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='aq-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """Folded stacks ("outer;inner count" per line), ready for flamegraph tools."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top(self, limit: int = 15) -> list:
+        """Functions by share of samples in which they were running (the leaf frame)."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        return [(name, count / max(1, self.samples)) for name, count in leaves.most_common(limit)]
+
+    def dump(self, path: str) -> str:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        return path
+
+
+def from_environment(game=None) -> Instrumentation:
+    """
+    Enables instrumentation when AQ_METRICS names an output file (.prom/.txt for
+    Prometheus text, otherwise JSON), and the sampling profiler when AQ_PROFILE
+    names a folded-stacks file. Both are written when the process exits.
+    Without a `game` module, GameSession is instrumented.
+    """
+    metrics_path = os.environ.get('AQ_METRICS')
+    profile_path = os.environ.get('AQ_PROFILE')
+    instrumentation = None
+    if metrics_path:
+        instrumentation = instrument_game(game) if game is not None else instrument_sessions()
+        atexit.register(instrumentation.metrics.dump, metrics_path)
+    if profile_path:
+        profiler = SamplingProfiler().start()
+        atexit.register(lambda: (profiler.stop(), profiler.dump(profile_path)))
+    return instrumentation
+
+
+if __name__ == "__main__":
+    import argparse
+    from contextlib import ExitStack
+
+    import adventure_quest
+    from benchmarks.cases import CASES
+    from benchmarks.runner import measure
+
+    parser = argparse.ArgumentParser(description="Measure instrumentation overhead on scripted playthroughs.")
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--dump', help="write the enabled run's metrics here (.prom or .json)")
+    args = parser.parse_args()
+
+    playthrough = CASES['playthrough_script']
+    phases = ('display_location', 'check_for_challenge', 'handle_action')
+    originals = {name: getattr(adventure_quest, name) for name in phases}
+    enabled = None
+
+    def run_mode(mode):
+        global enabled
+        if mode == 'disabled':
+            instrument_game(adventure_quest).uninstall()
+        elif mode == 'enabled':
+            enabled = instrument_game(adventure_quest)
+        try:
+            return measure(playthrough, samples=args.samples)['ops_per_sec']
+        finally:
+            if mode == 'enabled':
+                enabled.uninstall()
+
+    # 'disabled' installs and uninstalls the hooks first, so it runs exactly the
+    # code 'baseline' does; any gap between the two is measurement noise. Each
+    # round rotates the order of the modes and the median is kept, so drift and
+    # noise hit every mode alike.
+    modes = ['baseline', 'disabled', 'enabled']
+    rates = {mode: [] for mode in modes}
+    for round_number in range(args.rounds):
+        order = modes[round_number % 3:] + modes[:round_number % 3]
+        for mode in order:
+            rates[mode].append(run_mode(mode))
+    medians = {mode: sorted(values)[len(values) // 2] for mode, values in rates.items()}
+
+    restored = all(getattr(adventure_quest, name) is originals[name] for name in phases)
+    print(f"Disabled hooks restore the original functions: {restored}")
+    reference = medians['baseline']
+    for mode, rate in medians.items():
+        print(f"{mode:>9}: {rate:>9,.1f} playthroughs/sec (median of {args.rounds})   "
+              f"overhead {1 - rate / reference:+.2%}")
+    if args.dump:
+        print(f"Metrics from the last enabled run: {enabled.metrics.dump(args.dump)}")
+
+    with ExitStack() as stack:
+        profiler = SamplingProfiler(interval=0.001).start()
+        op = playthrough(stack, 42)
+        deadline = time.perf_counter() + 1.0
+        while time.perf_counter() < deadline:
+            op()
+        profiler.stop()
+    print(f"Sampling profiler: {profiler.samples} samples; hottest functions:")
+    for name, share in profiler.top(8):
+        print(f"  {share:6.1%}  {name}")
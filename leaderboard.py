@@ -0,0 +1,409 @@
+import bisect
+import os
+import struct
+import threading
+import time
+from array import array
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: single-writer use is then up to the caller
+    fcntl = None
+
+# --- Leaderboard ---
+# Final scores live in an append-only file of fixed-size entries:
+#   MAGIC, then per entry <f64 time><f64 difficulty><i32 final score><32-byte UTF-8 name>
+# Fixed-size entries let a restart load millions of them with one np.fromfile.
+# Memory holds only the index. That is the time, score and board of every entry
+# in arrival order, plus one sorted int64 key array per difficulty. A key packs
+# (score << 32 | ~entry_id), so it sorts by score and then by age, and it
+# decodes back to both. Names stay on disk and are read only for the
+# entries a query returns.
+#
+# New entries go into a small sorted list per board. Once that list reaches
+# MERGE_AT it is merged into the array in one vectorized pass. Rank lookups
+# are therefore two binary searches. The all-time top-K is the tail of the
+# array plus the tail of the list. Appends to the file are batched by a
+# background thread, so add() never waits on the disk.
+#
+# Entry times never decrease, so a time window is a suffix of the entry IDs.
+# A windowed top-K takes whichever path is cheaper: scan the board from the
+# top and skip older entries, or rank only the entries inside the window.
+#
+# Entry IDs are positions in the file, so a file has one writer: the
+# constructor takes an exclusive lock on it and raises OSError while another
+# process (a server, or another game) has it open.
+
+MAGIC = b'AQLB\x01'
+NAME_BYTES = 32
+_ENTRY = struct.Struct(f'<ddi{NAME_BYTES}s')
+_DTYPE = np.dtype([('time', '<f8'), ('difficulty', '<f8'), ('score', '<i4'), ('name', f'S{NAME_BYTES}')])
+_ID_MASK = 0xFFFFFFFF
+MERGE_AT = 16384 # Sorted-list entries per board before they are merged into its array
+FLUSH_INTERVAL = 0.25 # Seconds between background appends
+FLUSH_BATCH = 4096 # Queued entries that wake the writer early
+
+
+def _name_bytes(name: str) -> bytes:
+    """UTF-8 name cut to NAME_BYTES without splitting a character."""
+    return name.encode('utf-8')[:NAME_BYTES].decode('utf-8', 'ignore').encode('utf-8')
+
+
+class _Board:
+    """Sorted keys of one difficulty: a merged array plus a small sorted list of recent keys."""
+    __slots__ = ('keys', 'recent')
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.recent = []
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.recent)
+
+    def add(self, key: int):
+        bisect.insort(self.recent, key)
+        if len(self.recent) >= MERGE_AT:
+            self.extend(np.array(self.recent, dtype=np.int64))
+            self.recent = []
+
+    def extend(self, keys):
+        keys = np.sort(keys)
+        if len(self.keys):
+            keys = np.insert(self.keys, np.searchsorted(self.keys, keys), keys)
+        self.keys = keys
+
+    def count_from(self, key: int) -> int:
+        """Number of keys >= key."""
+        return (len(self.keys) - int(np.searchsorted(self.keys, key))
+                + len(self.recent) - bisect.bisect_left(self.recent, key))
+
+    def top(self, k: int, first_id: int = 0) -> list:
+        """The k largest keys whose entry id is at least `first_id`, best first."""
+        if not first_id:
+            return sorted(self.keys[-k:].tolist() + self.recent[-k:], reverse=True)[:k]
+        found = [key for key in self.recent if _ID_MASK - (key & _ID_MASK) >= first_id]
+        end = len(self.keys)
+        chunk = max(4 * k, 1024)
+        needed = k
+        while end > 0 and needed > 0:
+            block = self.keys[max(0, end - chunk):end][::-1]
+            block = block[(_ID_MASK - (block & _ID_MASK)) >= first_id][:needed].tolist()
+            found.extend(block)
+            needed -= len(block)
+            end -= chunk
+            chunk *= 2
+        return sorted(found, reverse=True)[:k]
+
+
+class Leaderboard:
+    """
+    Persistent high-score table with one board per difficulty.
+    add() returns the entry's rank on its board; top() and rank() answer
+    queries, optionally restricted to one difficulty and to entries since a
+    unix time. close() (or leaving a with block) writes out everything queued.
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._times = array('d')
+        self._scores = array('i')
+        self._codes = array('B')
+        self._boards = [] # Indexed by board code
+        self._board_difficulties = [] # Board code -> difficulty
+        self._board_codes = {} # difficulty -> board code
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._outbox = [] # Packed entries waiting for the writer
+        self._queued = 0 # Entries handed to the outbox so far (all IDs below this)
+        self._pending_names = [] # Names of entries >= self._written, not yet on disk
+        self._written = 0
+        self._file = open(path, 'ab')
+        try:
+            self._lock_file()
+            self._load()
+        except BaseException:
+            self._file.close()
+            raise
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+        self._reader = os.open(path, os.O_RDONLY)
+        self._closed = False
+        self._wake = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, args=(flush_interval,),
+                                        name='leaderboard-writer', daemon=True)
+        self._writer.start()
+
+    # --- Loading and indexing ---
+
+    def _lock_file(self):
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB) # Released when the file is closed
+        except BlockingIOError:
+            raise OSError(f"{self.path} is in use by another process") from None
+
+    def _load(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not an Adventure Quest leaderboard")
+        size = os.path.getsize(self.path) - len(MAGIC)
+        count = size // _ENTRY.size
+        if count * _ENTRY.size != size:
+            os.truncate(self.path, len(MAGIC) + count * _ENTRY.size) # Torn final append
+        data = np.fromfile(self.path, dtype=_DTYPE, count=count, offset=len(MAGIC))
+        self._index(data['time'], data['difficulty'], data['score'])
+        self._queued = self._written = count
+
+    def _board_code(self, difficulty: float) -> int:
+        code = self._board_codes.get(difficulty)
+        if code is None:
+            code = self._board_codes[difficulty] = len(self._boards)
+            self._boards.append(_Board())
+            self._board_difficulties.append(difficulty)
+        return code
+
+    def _index(self, times, difficulties, scores):
+        """Appends a block of entries to the columns and merges them into their boards."""
+        first = len(self._times)
+        ids = np.arange(first, first + len(scores), dtype=np.int64)
+        keys = (np.asarray(scores, dtype=np.int64) << 32) | (_ID_MASK - ids)
+        codes = np.empty(len(scores), dtype=np.uint8)
+        for difficulty in np.unique(difficulties):
+            chosen = difficulties == difficulty
+            code = self._board_code(float(difficulty))
+            codes[chosen] = code
+            self._boards[code].extend(keys[chosen])
+        self._times.frombytes(np.asarray(times, dtype=np.float64).tobytes())
+        self._scores.frombytes(np.asarray(scores, dtype=np.int32).tobytes())
+        self._codes.frombytes(codes.tobytes())
+
+    # --- Inserts ---
+
+    def add(self, name: str, score: int, difficulty: float = 1.0) -> int:
+        """Records a final score; returns its rank on the difficulty's board (1 = best)."""
+        name = _name_bytes(name)
+        with self._lock:
+            entry_id = len(self._times)
+            now = self.clock()
+            if entry_id and now < self._times[-1]:
+                now = self._times[-1] # Keeps entry times ordered so windows stay suffixes
+            code = self._board_code(difficulty)
+            self._times.append(now)
+            self._scores.append(score)
+            self._codes.append(code)
+            board = self._boards[code]
+            board.add((score << 32) | (_ID_MASK - entry_id))
+            self._outbox.append(_ENTRY.pack(now, difficulty, score, name))
+            self._pending_names.append(name)
+            self._queued += 1
+            rank = board.count_from((score + 1) << 32) + 1
+        if len(self._outbox) >= FLUSH_BATCH:
+            self._wake.set()
+        return rank
+
+    def add_many(self, entries) -> int:
+        """Bulk insert of (name, score, difficulty) tuples with one timestamp; returns how many."""
+        entries = list(entries)
+        if not entries:
+            return 0
+        block = np.empty(len(entries), dtype=_DTYPE)
+        block['name'] = [_name_bytes(name) for name, _, _ in entries]
+        block['score'] = [score for _, score, _ in entries]
+        block['difficulty'] = [difficulty for _, _, difficulty in entries]
+        with self._lock:
+            now = self.clock()
+            if self._times and now < self._times[-1]:
+                now = self._times[-1]
+            block['time'] = now
+            self._index(block['time'], block['difficulty'], block['score'])
+            self._outbox.append(block.tobytes())
+            self._pending_names.extend(block['name'].tolist())
+            self._queued += len(entries)
+        self._wake.set()
+        return len(entries)
+
+    # --- Background appends ---
+
+    def _write_loop(self, interval: float):
+        while not self._closed:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Appends every queued entry to the file now."""
+        with self._write_lock:
+            with self._lock:
+                chunks, queued = self._outbox, self._queued
+                self._outbox = []
+            if not chunks:
+                return
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+            with self._lock:
+                del self._pending_names[:queued - self._written]
+                self._written = queued
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        self._file.close()
+        os.close(self._reader)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Queries ---
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    @property
+    def difficulties(self) -> list:
+        return sorted(self._board_codes)
+
+    def _boards_for(self, difficulty) -> list:
+        if difficulty is None:
+            return list(self._boards)
+        code = self._board_codes.get(difficulty)
+        return [] if code is None else [self._boards[code]]
+
+    def rank(self, score: int, difficulty: float = None) -> int:
+        """The rank a score would take (1 + entries scoring strictly higher); O(log n) per board."""
+        with self._lock:
+            return 1 + sum(board.count_from((score + 1) << 32) for board in self._boards_for(difficulty))
+
+    def standing(self, score: int, difficulty: float = None) -> tuple:
+        """(rank, entries so far) read together, so a caller can tell which of its adds the rank counts."""
+        with self._lock:
+            rank = 1 + sum(board.count_from((score + 1) << 32) for board in self._boards_for(difficulty))
+            return rank, len(self._times)
+
+    def top(self, k: int = 10, difficulty: float = None, since: float = None) -> list:
+        """
+        Best k entries (all difficulties when `difficulty` is None), restricted
+        to entries recorded at or after unix time `since` when given.
+        """
+        with self._lock:
+            boards = self._boards_for(difficulty)
+            first_id = 0
+            if since is not None:
+                first_id = int(np.searchsorted(np.frombuffer(self._times, dtype=np.float64), since))
+            window = len(self._times) - first_id
+            # A scan from the top reads about k * n / window keys; ranking the window reads
+            # `window` entries at a higher cost per entry
+            if first_id and 16 * window * window < k * len(self._times):
+                keys = self._top_in_window(k, difficulty, first_id)
+            else:
+                keys = sorted((key for board in boards for key in board.top(k, first_id)), reverse=True)[:k]
+            return [self._entry(rank, key) for rank, key in enumerate(keys, 1)]
+
+    def _top_in_window(self, k: int, difficulty, first_id: int) -> list:
+        """Top keys among the (few) entries recorded since first_id, without touching the boards."""
+        scores = np.frombuffer(self._scores, dtype=np.int32)[first_id:]
+        ids = np.arange(first_id, first_id + len(scores), dtype=np.int64)
+        if difficulty is not None:
+            code = self._board_codes.get(difficulty)
+            chosen = np.frombuffer(self._codes, dtype=np.uint8)[first_id:] == code
+            scores, ids = scores[chosen], ids[chosen]
+        keys = (scores.astype(np.int64) << 32) | (_ID_MASK - ids)
+        if len(keys) > k:
+            keys = keys[np.argpartition(keys, len(keys) - k)[len(keys) - k:]]
+        return sorted(keys.tolist(), reverse=True)
+
+    def _entry(self, rank: int, key: int) -> dict:
+        entry_id = _ID_MASK - (key & _ID_MASK)
+        if entry_id >= self._written:
+            name = self._pending_names[entry_id - self._written]
+        else:
+            record = os.pread(self._reader, _ENTRY.size, len(MAGIC) + entry_id * _ENTRY.size)
+            name = _ENTRY.unpack(record)[3]
+        return {
+            'rank': rank,
+            'name': name.rstrip(b'\0').decode('utf-8', 'replace'),
+            'score': key >> 32,
+            'difficulty': self._board_difficulties[self._codes[entry_id]],
+            'time': self._times[entry_id],
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Benchmark leaderboard inserts and queries.")
+    parser.add_argument('-n', '--entries', type=int, default=10_000_000)
+    parser.add_argument('--single', type=int, default=200_000, help="entries inserted one add() at a time")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--path', default=None, help="leaderboard file (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    folder = tempfile.mkdtemp()
+    path = args.path or os.path.join(folder, 'bench.aql')
+
+    def timed(label, count, run):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        print(f"{label:<34} {count / elapsed:>14,.0f} /sec   {elapsed / count * 1e6:>9.2f} us each")
+        return result
+
+    # Simulated clock: the entries are spread over 30 days, oldest first
+    now = [time.time() - 30 * 86400]
+    step = 30 * 86400 / (args.entries + args.single)
+
+    def clock():
+        now[0] += step
+        return now[0]
+
+    def random_entry():
+        return f"Player{rng.randrange(1_000_000)}", rng.randrange(0, 700), rng.choice((1.0, 1.5))
+
+    with Leaderboard(path, clock=clock) as board:
+        batch = 100_000
+        bulk_time = 0.0
+        for first in range(0, args.entries - args.single, batch):
+            bulk = [random_entry() for _ in range(min(batch, args.entries - args.single - first))]
+            started = time.perf_counter()
+            board.add_many(bulk)
+            bulk_time += time.perf_counter() - started
+        count = args.entries - args.single
+        print(f"{f'add_many ({batch:,} per call)':<34} {count / bulk_time:>14,.0f} /sec   "
+              f"{bulk_time / count * 1e6:>9.2f} us each")
+        singles = [random_entry() for _ in range(args.single)]
+        timed("add (one at a time)", len(singles), lambda: [board.add(*entry) for entry in singles])
+        scores = [rng.randrange(0, 700) for _ in range(args.queries)]
+        timed("rank (all boards)", args.queries, lambda: [board.rank(score) for score in scores])
+        timed("rank (one difficulty)", args.queries, lambda: [board.rank(score, 1.5) for score in scores])
+        timed("top 100 (one difficulty)", args.queries, lambda: [board.top(100, 1.0) for _ in scores])
+        timed("top 100 (all boards)", args.queries, lambda: [board.top(100) for _ in scores])
+        for label, days in (('last 7 days', 7), ('last hour', 1 / 24)):
+            since = now[0] - days * 86400
+            timed(f"top 100 ({label})", args.queries, lambda: [board.top(100, 1.0, since) for _ in scores])
+        best = board.top(3)
+    print(f"{len(board):,} entries; best: {[(e['name'], e['score'], e['difficulty']) for e in best]}")
+    started = time.perf_counter()
+    reopened = Leaderboard(path)
+    print(f"Reopened {len(reopened):,} entries in {time.perf_counter() - started:.2f}s; "
+          f"top entry matches: {reopened.top(1) == best[:1]}")
+    reopened.close()
+    if args.path is None:
+        os.remove(path)
+        os.rmdir(folder)
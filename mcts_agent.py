@@ -0,0 +1,162 @@
+import math
+import random
+import time
+from bisect import bisect
+
+from event_engine import puzzle_answer
+from game_session import STANDARD_ACTIONS
+from policy_solver import WIN_BONUS, GameModel
+
+# --- Monte Carlo Tree Search Player ---
+# The agent never touches a live session while it thinks. It takes an immutable
+# GameSession.snapshot() of the pending prompt, packs it into a GameModel state
+# (a plain tuple, so every tree node shares it for free) and searches with the
+# model's pure transitions: each (state, action) is expanded once into
+# cumulative outcome weights, after which stepping is a bisect on a float from
+# the agent's own RNG. Neither the session's RNG nor the global one is touched,
+# so searches never disturb the game they are playing or each other.
+#
+# Tree nodes are keyed by state (transpositions share statistics). Selection is
+# UCT on rewards scaled by the win bonus; leaves are valued by a random rollout
+# of at most `rollout_depth` moves.
+
+
+class MCTSAgent:
+    """UCT player; call it like a sweep_runner policy: agent(session, rng) -> next line."""
+
+    def __init__(self, difficulty: float = 1.0, iterations: int = 200, exploration: float = 1.0,
+                 rollout_depth: int = 30, max_depth: int = 60, seed: int = 0, model: GameModel = None):
+        self.model = model if model is not None else GameModel(difficulty)
+        self.iterations = iterations
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.max_depth = max_depth
+        self.rng = random.Random(seed)
+        self.scale = float(WIN_BONUS)
+        self.rollouts = 0
+        self.search_seconds = 0.0
+        self._moves = {} # state -> (actions, branches); a branch is (cumulative weights, rewards, next states)
+
+    def _moves_of(self, state: tuple) -> tuple:
+        entry = self._moves.get(state)
+        if entry is None:
+            actions = []
+            branches = []
+            for action, outcomes in self.model.choices(state):
+                cumulative = []
+                total = 0.0
+                for p, _, _ in outcomes:
+                    total += p
+                    cumulative.append(total)
+                cumulative[-1] = 2.0 # Absorbs rounding so bisect never runs off the end
+                actions.append(action)
+                branches.append((tuple(cumulative), tuple(r for _, r, _ in outcomes),
+                                 tuple(after for _, _, after in outcomes)))
+            entry = self._moves[state] = (tuple(actions), tuple(branches))
+        return entry
+
+    def _rollout(self, state) -> float:
+        """Plays random moves from `state`; returns the score gained."""
+        random_ = self.rng.random
+        moves = self._moves
+        gained = 0.0
+        depth = self.rollout_depth
+        while state is not None and depth:
+            entry = moves.get(state) or self._moves_of(state)
+            branches = entry[1]
+            cumulative, rewards, nexts = branches[int(random_() * len(branches))]
+            i = bisect(cumulative, random_())
+            gained += rewards[i]
+            state = nexts[i]
+            depth -= 1
+        return gained
+
+    def search(self, root: tuple, iterations: int = None) -> str:
+        """Runs UCT from `root` and returns the most visited action."""
+        started = time.perf_counter()
+        random_ = self.rng.random
+        exploration = self.exploration
+        scale = self.scale
+        log, sqrt, inf = math.log, math.sqrt, math.inf
+        tree = {} # state -> [visits, per-action visits, per-action total return, branches]
+        for _ in range(iterations or self.iterations):
+            state = root
+            path = []
+            gained = 0.0
+            depth = 0
+            while state is not None and depth < self.max_depth:
+                node = tree.get(state)
+                expanded = node is None
+                if expanded:
+                    branches = self._moves_of(state)[1]
+                    node = tree[state] = [0, [0] * len(branches), [0.0] * len(branches), branches]
+                counts, totals = node[1], node[2]
+                if 0 in counts:
+                    choice = counts.index(0)
+                else:
+                    log_visits = log(node[0])
+                    choice = 0
+                    best = -inf
+                    for a, count in enumerate(counts):
+                        score = totals[a] / (count * scale) + exploration * sqrt(log_visits / count)
+                        if score > best:
+                            best = score
+                            choice = a
+                path.append((node, choice, gained))
+                cumulative, rewards, nexts = node[3][choice]
+                i = bisect(cumulative, random_())
+                gained += rewards[i]
+                state = nexts[i]
+                depth += 1
+                if expanded:
+                    break
+            value = gained + (self._rollout(state) if state is not None else 0.0)
+            for node, choice, before in path:
+                node[0] += 1
+                node[1][choice] += 1
+                node[2][choice] += value - before
+        self.rollouts += iterations or self.iterations
+        self.search_seconds += time.perf_counter() - started
+        counts = tree[root][1]
+        return self._moves_of(root)[0][counts.index(max(counts))]
+
+    def __call__(self, session, rng=None) -> str:
+        if session.options is None:
+            return str(puzzle_answer(session.player))
+        command = self.search(self.model.state_of(session.snapshot()))
+        if command not in session.options:
+            command = next((option for option in session.options if option not in STANDARD_ACTIONS),
+                           session.options[0])
+        return command
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from policy_solver import solve
+    from sweep_runner import SweepStats, derive_seed, play_game, random_policy
+
+    parser = argparse.ArgumentParser(description="Benchmark the MCTS player against a random policy.")
+    parser.add_argument('-n', '--games', type=int, default=200, help="games per difficulty and player")
+    parser.add_argument('-d', '--difficulty', type=float, nargs='+', default=[1.0, 1.5])
+    parser.add_argument('-i', '--iterations', type=int, default=200, help="rollouts per move")
+    parser.add_argument('--max-steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for difficulty in args.difficulty:
+        agent = MCTSAgent(difficulty, iterations=args.iterations, seed=args.seed)
+        players = {'random': random_policy, 'mcts': agent}
+        for label, policy in players.items():
+            stats = SweepStats()
+            started = time.perf_counter()
+            for i in range(args.games):
+                stats.add(play_game(derive_seed(args.seed, difficulty, i), policy, difficulty=difficulty,
+                                    max_steps=args.max_steps))
+            elapsed = time.perf_counter() - started
+            summary = stats.summary()
+            print(f"Difficulty {difficulty} {label:>6}: win rate {summary['outcome_rates'].get('victory', 0.0):6.1%}, "
+                  f"mean final score {summary['score_mean']:7.1f}, {args.games / elapsed:,.1f} games/sec")
+        rate = agent.rollouts / agent.search_seconds if agent.search_seconds else 0.0
+        print(f"Difficulty {difficulty}   mcts: {agent.rollouts:,} rollouts in {agent.search_seconds:.2f}s "
+              f"({rate:,.0f} rollouts/sec); optimal expected score {solve(difficulty).expected_score:.1f}")
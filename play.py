@@ -0,0 +1,6 @@
+# Fast-start launcher: `python play.py` runs the same game as `python adventure_quest.py`.
+# A script run directly is recompiled from source on every launch; an imported
+# module's bytecode is cached, so this file stays tiny and the game is imported.
+import adventure_quest
+
+adventure_quest.main()
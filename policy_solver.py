@@ -0,0 +1,464 @@
+import json
+import math
+import time
+from functools import lru_cache
+
+import numpy as np
+
+import event_engine
+import game_utils as gu
+from compact_state import shared_table
+from game_session import COMBAT_PHASE, STANDARD_ACTIONS
+
+# --- Exact Policy Solver ---
+# The game is a small Markov decision process. A state is the packed tuple
+#   (kind, location id, health, inventory bits, visited bits, cleared bits, taken slot bits)
+# where kind is COMBAT ("Attack or Run?") or ACTION ("What do you do?"). Every
+# random draw the rules make has a known distribution (calculate_damage, and
+# the flee roll, victory roll and random events declared in event_engine), so
+# the transitions of each reachable state are enumerated once, exactly, and
+# packed into flat numpy arrays. The odds, effects and challenges are read from
+# the EventEngine, so the model follows edits to the declared rules. Health
+# only goes up through events that heal (fishing), so value iteration sweeps
+# the states one health level at a time, lowest first: each level only waits
+# on itself and on levels that are already solved.
+#
+# Rewards are score changes; reaching the end adds the victory_or_defeat_ending
+# bonuses, so the value of the start state is the expected final score. The one
+# simplification is that score is not part of the state: the max(0, ...) floor
+# on the flee penalty is ignored, which slightly undervalues fleeing while the
+# score is still below 10. The chest puzzle is always answered correctly.
+
+COMBAT, ACTION = 0, 1
+RELIC = 'ancient relic'
+WIN_BONUS = 500
+VISIT_BONUS = 10
+_WAIT_ACTIONS = tuple(action for action in STANDARD_ACTIONS if action != 'quit') # quit has no final score
+
+
+@lru_cache(maxsize=None)
+def damage_distribution(difficulty_mod: float) -> tuple:
+    """Exact ((damage, probability), ...) of a calculate_damage() hit, critical bonus included."""
+    spread = 0.5 * difficulty_mod
+    distribution = {}
+    for base in range(15, 26):
+        width = base * spread # floor(base + width * u) for u uniform in [0, 1)
+        for value in range(base, math.ceil(base + width)):
+            low = (value - base) / width
+            high = min(1.0, (value + 1 - base) / width)
+            damage = value + 5 if value % 2 == 0 else value
+            distribution[damage] = distribution.get(damage, 0.0) + (high - low) / 11
+    return tuple(sorted(distribution.items()))
+
+
+class GameModel:
+    """Transition model of the game rules over packed states for one difficulty."""
+
+    def __init__(self, difficulty: float = 1.0, table=None, hp_bucket: int = 1, engine=None):
+        self.table = table if table is not None else shared_table()
+        self.engine = engine if engine is not None else event_engine.shared_engine()
+        self.difficulty = difficulty
+        self.hp_bucket = hp_bucket
+        self.relic_bit = 1 << self.table.item_ids[RELIC]
+        self.cave = self.table.location_ids.get('secret_cave', -1)
+
+        hit_chance = min(1.0, 0.3 * difficulty)
+        self.hits = tuple((damage, hit_chance * p) for damage, p in damage_distribution(difficulty))
+        self.dodge_chance = 1.0 - hit_chance
+        self._choices = {}
+        self._events = {}
+
+    def _item_bit(self, item: str) -> int:
+        """Inventory bit of an item (0 for items the table does not know, which nobody can hold)."""
+        item_id = self.table.item_ids.get(item)
+        return 0 if item_id is None else 1 << item_id
+
+    def _challenge(self, loc: int, clr: int):
+        """The location's Challenge while it is not cleared, else None."""
+        name = None if clr >> loc & 1 else self.table.row(loc).challenge
+        return None if name is None else self.engine.challenges[name]
+
+    def events(self, loc: int, trigger: str) -> tuple:
+        """
+        The location's events for `trigger`, compiled to ((required item bit or
+        None, ((chance, health, score, removed bits, added bits), ...)), ...).
+        Quiet outcomes (no message) change nothing, as in the game.
+        """
+        key = (loc, trigger)
+        compiled = self._events.get(key)
+        if compiled is None:
+            compiled = []
+            for event in self.engine.events(self.table.location_names[loc], trigger):
+                sampler = event.sampler
+                effects = []
+                for i, outcome in enumerate(sampler.outcomes):
+                    chance = sampler.bounds[i] - (sampler.bounds[i - 1] if i else 0.0)
+                    if outcome.message is None:
+                        effects.append((chance, 0, 0, 0, 0))
+                    else:
+                        effects.append((chance, outcome.health, outcome.score,
+                                        sum(self._item_bit(item) for item in outcome.remove),
+                                        sum(self._item_bit(item) for item in outcome.add)))
+                required = None if event.requires is None else self._item_bit(event.requires)
+                compiled.append((required, tuple(effects)))
+            compiled = self._events[key] = tuple(compiled)
+        return compiled
+
+    def _resolve(self, loc, trigger, hp, inv, vis, clr, taken) -> list:
+        """Fires the location's events for `trigger` in order, then enters it: [(probability, reward, state)]."""
+        branches = [(1.0, 0, hp, inv)]
+        for required, effects in self.events(loc, trigger):
+            fired = []
+            for p, reward, hp, inv in branches:
+                if required is not None and not inv & required:
+                    fired.append((p, reward, hp, inv)) # Missing the required item: nothing is drawn
+                    continue
+                for chance, health, score, remove, add in effects:
+                    after = min(event_engine.MAX_HEALTH, hp + health) if health > 0 else hp + health
+                    fired.append((p * chance, reward + score, after, inv & ~remove | add))
+            branches = fired
+        outcomes = []
+        for p, reward, hp, inv in branches:
+            entered = self._enter(loc, hp, inv, vis, clr, taken)
+            outcomes.append((p, reward + entered[0], entered[1]))
+        return outcomes
+
+    def bucket(self, health: int) -> int:
+        """Rounds health down to its bucket (pessimistic); 1 keeps health exact."""
+        if self.hp_bucket == 1 or health <= 0:
+            return health
+        return max(1, health - health % self.hp_bucket)
+
+    def start_state(self, location: str = 'start_clearing') -> tuple:
+        loc = self.table.location_ids[location]
+        return self._enter(loc, event_engine.MAX_HEALTH, 0, 1 << loc, 0, 0)[1]
+
+    def _enter(self, loc, hp, inv, vis, clr, taken) -> tuple:
+        """Top of main_game_loop: (reward, next state), next state None once the game ended."""
+        if inv & self.relic_bit:
+            return WIN_BONUS + VISIT_BONUS * bin(vis).count('1'), None
+        if hp <= 0:
+            return 0, None
+        hp = self.bucket(hp)
+        challenge = self._challenge(loc, clr)
+        if challenge is not None and challenge.kind == 'combat':
+            return 0, (COMBAT, loc, hp, inv, vis, clr, taken)
+        if challenge is not None:
+            inv |= self._item_bit(challenge.reward) # The puzzle is always answered correctly
+            clr |= 1 << loc
+        return 0, (ACTION, loc, hp, inv, vis, clr, taken)
+
+    def state_of(self, snapshot) -> tuple:
+        """Packs a GameSession.snapshot() into a model state."""
+        table = self.table
+        inventory = 0
+        for item in snapshot.inventory:
+            item_id = table.item_ids.get(item)
+            if item_id is not None:
+                inventory |= 1 << item_id
+        visited = 0
+        for name in snapshot.visited:
+            visited |= 1 << table.location_ids[name]
+        return (COMBAT if snapshot.phase == COMBAT_PHASE else ACTION, table.location_ids[snapshot.location],
+                self.bucket(snapshot.health), inventory, visited, snapshot.cleared, snapshot.taken)
+
+    def choices(self, state: tuple) -> tuple:
+        """The distinct (action, outcomes) choices of a state, memoized."""
+        options = self._choices.get(state)
+        if options is None:
+            options = []
+            seen = set()
+            for action in self.actions(state):
+                outcomes = self.outcomes(state, action)
+                if outcomes == [(1.0, 0, state)]:
+                    continue # Pure no-op: never better than the choices that remain
+                signature = tuple(outcomes)
+                if signature in seen:
+                    continue # Same effect as an earlier action ('look around' vs 'status')
+                seen.add(signature)
+                options.append((action, outcomes))
+            if not options:
+                options.append(('status', [(1.0, 0, state)]))
+            options = self._choices[state] = tuple(options)
+        return options
+
+    def actions(self, state: tuple) -> tuple:
+        if state[0] == COMBAT:
+            return ('attack', 'run')
+        return self.table.row(state[1]).actions + _WAIT_ACTIONS
+
+    def outcomes(self, state: tuple, action: str) -> list:
+        """[(probability, reward, next state or None), ...] for taking `action` in `state`."""
+        if state[0] == COMBAT:
+            return self._combat(state, action)
+        kind, loc, hp, inv, vis, clr, taken = state
+        verb, _, argument = action.partition(' ')
+        table = self.table
+
+        if verb == 'go':
+            target = dict(table.row(loc).neighbors).get(argument.strip())
+            if target is not None:
+                target = table.location_ids[target]
+                return self._resolve(target, event_engine.MOVE_TRIGGER, hp, inv, vis | 1 << target, clr, taken)
+        elif verb == 'take':
+            item_id = table.item_ids.get(argument.strip())
+            for slot in table.slots_of(loc, item_id):
+                if not taken >> slot & 1:
+                    reward, after = self._enter(loc, hp, inv | 1 << item_id, vis, clr, taken | 1 << slot)
+                    return [(1.0, 10 + reward, after)]
+        elif action == 'examine chest' and loc == self.cave:
+            return [(1.0,) + self._enter(loc, hp, inv | self.relic_bit, vis, clr | 1 << loc, taken)]
+        elif action == 'examine chest' or action not in gu.ACTION_ROUTES: # Routed like GameSession._do_other
+            target = dict(table.row(loc).hidden_exits).get(action)
+            if target is not None:
+                target = table.location_ids[target]
+                return [(1.0,) + self._enter(target, hp, inv, vis | 1 << target, clr, taken)]
+            # Actions that trigger the location's declared events (like "fish")
+            return self._resolve(loc, action, hp, inv, vis, clr, taken)
+        # Valid but unhandled actions change nothing
+        return [(1.0,) + self._enter(loc, hp, inv, vis, clr, taken)]
+
+    def _combat(self, state: tuple, action: str) -> list:
+        kind, loc, hp, inv, vis, clr, taken = state
+        challenge = self._challenge(loc, clr)
+        outcomes = []
+        weight = 1.0
+        if action == 'run':
+            flee_chance = challenge.flee.chance(True)
+            outcomes.append((flee_chance, -challenge.flee_penalty, (ACTION,) + state[1:]))
+            weight = 1.0 - flee_chance
+        for damage, p in self.hits:
+            left = hp - damage
+            if left <= 0:
+                # Defeated in combat: the loop top decides the ending
+                outcomes.append((weight * p,) + self._enter(loc, left, inv, vis, clr, taken))
+            else:
+                outcomes.append((weight * p, 0, (COMBAT, loc, self.bucket(left), inv, vis, clr, taken)))
+        dodge = weight * self.dodge_chance
+        dodge_reward = int(challenge.hit_score * (1 / self.difficulty))
+        victory_chance = challenge.finish_percent / 100 # rng.randint(1, 100) <= finish_percent
+        outcomes.append((dodge * victory_chance, dodge_reward + challenge.finish_score,
+                         (ACTION, loc, hp, inv, vis, clr | 1 << loc, taken)))
+        outcomes.append((dodge * (1 - victory_chance), dodge_reward, state))
+        return outcomes
+
+
+# --- Value Iteration ---
+
+class Solution:
+    """Optimal values and the policy table: packed state -> best command."""
+
+    def __init__(self, model: GameModel, start: tuple, states: list, values, policy: dict, stats: dict):
+        self.model = model
+        self.difficulty = model.difficulty
+        self.start = start
+        self.states = states
+        self.values = values
+        self.policy = policy
+        self.stats = stats
+
+    @property
+    def expected_score(self) -> float:
+        """Expected final score from the start of the game under the optimal policy."""
+        return float(self.values[self.states.index(self.start)]) if self.start is not None else 0.0
+
+    def save(self, path: str) -> str:
+        """Writes the policy table as JSON (commands interned into a list)."""
+        commands = sorted(set(self.policy.values()))
+        code = {command: i for i, command in enumerate(commands)}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'difficulty': self.difficulty,
+                'hp_bucket': self.model.hp_bucket,
+                'expected_score': self.expected_score,
+                'commands': commands,
+                'policy': [list(state) + [code[command]] for state, command in self.policy.items()],
+            }, f, separators=(',', ':'))
+        return path
+
+
+def _build(model: GameModel, start: tuple):
+    """Enumerates every state reachable from `start` with its distinct choices."""
+    index = {start: 0}
+    states = [start]
+    choices = []
+    i = 0
+    while i < len(states):
+        state = states[i]
+        i += 1
+        options = model.choices(state)
+        for _, outcomes in options:
+            for _, _, after in outcomes:
+                if after is not None and after not in index:
+                    index[after] = len(states)
+                    states.append(after)
+        choices.append(options)
+    return states, choices
+
+
+def solve(difficulty: float = 1.0, hp_bucket: int = 1, tolerance: float = 1e-9, table=None,
+          max_iterations: int = 100_000) -> Solution:
+    """Builds the reachable state space for one difficulty and solves it by value iteration."""
+    started = time.perf_counter()
+    model = GameModel(difficulty, table, hp_bucket)
+    start = model.start_state()
+    states, choices = _build(model, start)
+    built = time.perf_counter()
+
+    # Lay states out by health so every health level is one contiguous slice
+    order = sorted(range(len(states)), key=lambda i: states[i][2])
+    position = {states[old]: new for new, old in enumerate(order)}
+    states = [states[i] for i in order]
+    choices = [choices[i] for i in order]
+    terminal = len(states) # Absorbing end state, value 0
+
+    commands, action_start, action_reward = [], [], []
+    outcome_action, outcome_next, outcome_prob = [], [], []
+    for options in choices:
+        action_start.append(len(commands))
+        for command, outcomes in options:
+            expected_reward = 0.0
+            for p, reward, after in outcomes:
+                expected_reward += p * reward
+                outcome_action.append(len(commands))
+                outcome_next.append(terminal if after is None else position[after])
+                outcome_prob.append(p)
+            commands.append(command)
+            action_reward.append(expected_reward)
+    action_start.append(len(commands))
+    action_start = np.array(action_start, dtype=np.int64)
+    action_reward = np.array(action_reward)
+    outcome_action = np.array(outcome_action, dtype=np.int64)
+    outcome_next = np.array(outcome_next, dtype=np.int64)
+    outcome_prob = np.array(outcome_prob)
+
+    levels = []
+    first = 0
+    for i in range(1, len(states) + 1):
+        if i == len(states) or states[i][2] != states[first][2]:
+            a_lo, a_hi = action_start[first], action_start[i]
+            o_lo, o_hi = np.searchsorted(outcome_action, (a_lo, a_hi))
+            levels.append((first, i, a_lo, a_hi, o_lo, o_hi))
+            first = i
+
+    values = np.zeros(len(states) + 1)
+    iterations = 0
+    passes = 0
+    while True:
+        passes += 1
+        largest_first_change = 0.0
+        for s_lo, s_hi, a_lo, a_hi, o_lo, o_hi in levels:
+            local_action = outcome_action[o_lo:o_hi] - a_lo
+            probabilities = outcome_prob[o_lo:o_hi]
+            successors = outcome_next[o_lo:o_hi]
+            rewards = action_reward[a_lo:a_hi]
+            starts = action_start[s_lo:s_hi] - a_lo
+            for sweep in range(max_iterations):
+                iterations += 1
+                q = rewards + np.bincount(local_action, probabilities * values[successors], minlength=a_hi - a_lo)
+                fresh = np.maximum.reduceat(q, starts)
+                change = float(np.max(np.abs(fresh - values[s_lo:s_hi])))
+                values[s_lo:s_hi] = fresh
+                if sweep == 0:
+                    largest_first_change = max(largest_first_change, change)
+                if change < tolerance:
+                    break
+        # Only fishing moves health upwards; a pass that changes nothing proves convergence
+        if largest_first_change < tolerance or passes * len(levels) >= max_iterations:
+            break
+
+    q = action_reward + np.bincount(outcome_action, outcome_prob * values[outcome_next], minlength=len(commands))
+    owner = np.repeat(np.arange(len(states)), np.diff(action_start))
+    best = q >= values[owner] - tolerance * 10
+    first_best = np.minimum.reduceat(np.where(best, np.arange(len(commands)), len(commands)), action_start[:-1])
+    policy = {state: commands[a] for state, a in zip(states, first_best.tolist())}
+
+    stats = {
+        'states': len(states),
+        'choices': len(commands),
+        'transitions': len(outcome_prob),
+        'levels': len(levels),
+        'passes': passes,
+        'iterations': iterations,
+        'build_seconds': built - started,
+        'solve_seconds': time.perf_counter() - built,
+    }
+    return Solution(model, start, states, values[:-1], policy, stats)
+
+
+# --- Bot Driver ---
+
+class SolverPolicy:
+    """
+    Plays a GameSession from a policy table, as a sweep_runner-style policy
+    (called with (session, rng), returns the next line). Sessions must use the
+    default WorldOverlay world; states the table never reached fall back to the
+    first game action on offer.
+    """
+
+    def __init__(self, policy: dict, table=None, hp_bucket: int = 1):
+        self.policy = policy
+        self.table = table if table is not None else shared_table()
+        self.model = GameModel(1.0, self.table, hp_bucket)
+
+    @classmethod
+    def from_solution(cls, solution: Solution) -> 'SolverPolicy':
+        return cls(solution.policy, solution.model.table, solution.model.hp_bucket)
+
+    def __call__(self, session, rng) -> str:
+        if session.options is None:
+            return str(event_engine.puzzle_answer(session.player))
+        command = self.policy.get(self.model.state_of(session.snapshot()))
+        if command is None or command not in session.options:
+            command = next((option for option in session.options if option not in STANDARD_ACTIONS),
+                           session.options[0])
+        return command
+
+
+def load_policy(path: str) -> SolverPolicy:
+    """Reads a policy table written by Solution.save()."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    commands = data['commands']
+    policy = {tuple(row[:-1]): commands[row[-1]] for row in data['policy']}
+    return SolverPolicy(policy, hp_bucket=data['hp_bucket'])
+
+
+@lru_cache(maxsize=None)
+def optimal_policy(difficulty: float) -> SolverPolicy:
+    """Solved once per process and difficulty (sweep workers reuse it across chunks)."""
+    return SolverPolicy.from_solution(solve(difficulty))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sweep_runner import SweepStats, derive_seed, play_game
+
+    parser = argparse.ArgumentParser(description="Solve Adventure Quest exactly and report the optimal expected score.")
+    parser.add_argument('-d', '--difficulty', type=float, nargs='+', default=[1.0, 1.5])
+    parser.add_argument('--hp-bucket', type=int, default=1, help="health bucket width (1 = exact)")
+    parser.add_argument('--save', metavar='PREFIX', help="write each policy table to PREFIX_<difficulty>.json")
+    parser.add_argument('--check', type=int, default=0, metavar='N',
+                        help="also play N games with the policy and compare the mean score")
+    args = parser.parse_args()
+
+    for difficulty in args.difficulty:
+        solution = solve(difficulty, args.hp_bucket)
+        stats = solution.stats
+        print(f"Difficulty {difficulty}: expected final score {solution.expected_score:.2f} "
+              f"({stats['states']:,} states, {stats['transitions']:,} transitions, "
+              f"built in {stats['build_seconds']:.2f}s, solved in {stats['solve_seconds']:.2f}s)")
+        print(f"  Opening move: {solution.policy[solution.start]}")
+        if args.save:
+            print(f"  Policy table: {solution.save(f'{args.save}_{difficulty}.json')}")
+        if args.check:
+            bot = SolverPolicy.from_solution(solution)
+            played = SweepStats()
+            for i in range(args.check):
+                played.add(play_game(derive_seed(0, 'solver', difficulty, i), bot, difficulty=difficulty,
+                                     max_steps=100_000))
+            summary = played.summary()
+            print(f"  Played {args.check:,} games: mean final score {summary['score_mean']:.2f} "
+                  f"(stddev {summary['score_stddev']:.1f}), outcomes {summary['outcome_rates']}, "
+                  f"mean turns {summary['mean_turns']:.0f}")
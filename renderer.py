@@ -0,0 +1,186 @@
+import sys
+
+import game_utils as gu
+
+# --- Buffered Frame Renderer ---
+# The static part of a location screen (ASCII art, title, description and the
+# action list) only changes when the location's data does, so it is built once
+# and cached as a single string, keyed on exactly what it shows. Taking an
+# item or clearing a challenge does not touch the frame, so it stays cached.
+# A Renderer collects everything a turn prints in one buffer and hands it to
+# its sink in a single write when the next prompt is shown.
+
+MAX_FRAMES = 4096 # Frames kept before the cache is dropped (huge generated worlds)
+_FRAMES = {}
+
+
+def location_frame(location_key: str, location_data: dict) -> str:
+    """The text display_location() prints, built once per location state."""
+    key = (location_key, location_data.get('ascii', ''), location_data['description'],
+           tuple(location_data['actions']))
+    frame = _FRAMES.get(key)
+    if frame is None:
+        lines = [gu.get_location_ascii(location_key, location_data),
+                 f"\n🗺️ You are at the **{gu.location_title(location_key)}**.",
+                 "-" * 50,
+                 location_data['description'],
+                 "-" * 50,
+                 "Available actions:"]
+        lines.extend(f"- {action.title()}" for action in location_data['actions'])
+        lines.extend(f"- {action.title()}" for action in gu.STANDARD_ACTIONS)
+        frame = "\n".join(lines)
+        if len(_FRAMES) >= MAX_FRAMES:
+            _FRAMES.clear()
+        _FRAMES[key] = frame
+    return frame
+
+
+def invalidate():
+    """Drops every cached frame (after switching worlds or editing location data in place)."""
+    _FRAMES.clear()
+
+
+# --- Sinks: anything with write(text) ---
+
+class NullSink:
+    """Discards output (headless runs)."""
+
+    def write(self, text: str):
+        return None
+
+
+class StreamSink:
+    """
+    Writes to a text stream such as a TTY or a redirected stdout, flushing once
+    per write. Without a `stream` it writes wherever sys.stdout points at the time.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, text: str):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(text)
+        stream.flush()
+
+
+class SocketSink:
+    """
+    Sends UTF-8 text over a connected socket, or into an asyncio StreamWriter
+    (which only queues it; the caller awaits the writer's drain()).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._send = getattr(connection, 'sendall', None) or connection.write
+
+    def write(self, text: str):
+        self._send(text.encode('utf-8'))
+
+
+class Renderer:
+    """
+    Turn buffer in front of a sink. Pass `renderer.write` as a GameSession's
+    `output`; flush(prompt) then emits the turn's text plus the prompt at once.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else NullSink()
+        self._parts = []
+        self.writes = 0
+
+    def write(self, text: str):
+        self._parts.append(text)
+
+    __call__ = write
+
+    def flush(self, prompt: str = None):
+        """Writes the buffered lines (followed by `prompt`, if any) in one sink call."""
+        if not self._parts and prompt is None:
+            return
+        text = "\n".join(self._parts) + "\n" if self._parts else ""
+        self._parts.clear()
+        self.sink.write(text + prompt if prompt is not None else text)
+        self.writes += 1
+
+
+def play(session, renderer: Renderer, read_line=input) -> dict:
+    """Drives a GameSession (created with output=renderer.write) from `read_line` until it ends."""
+    prompt = session.start()
+    while prompt is not None:
+        renderer.flush(prompt)
+        try:
+            line = read_line()
+        except EOFError:
+            break
+        prompt = session.feed(line)
+    renderer.flush()
+    return session.run(())
+
+
+if __name__ == "__main__":
+    import argparse
+    import io
+    import os
+    import time
+
+    from game_session import GameSession
+
+    parser = argparse.ArgumentParser(
+        description="Turns/sec writing game text to stdout; run with stdout redirected, e.g. > /dev/null.")
+    parser.add_argument('-n', '--sessions', type=int, default=2000)
+    parser.add_argument('--tty-like', action='store_true',
+                        help="line-buffer stdout the way a terminal is (one write syscall per line)")
+    args = parser.parse_args()
+
+    script = (['go north'] + ['attack'] * 40
+              + ['go west', 'go east', 'status', 'go south', 'go east', 'go west'] * 4 + ['quit'])
+    stdout = sys.stdout
+    if args.tty_like:
+        stdout = io.TextIOWrapper(open(os.dup(sys.stdout.fileno()), 'wb', buffering=0), line_buffering=True)
+
+    class PerLineSession(GameSession):
+        """display_location() as it was before frames: a dozen prints, rebuilt every turn."""
+
+        def display_location(self):
+            location_key = self.player['location']
+            location_data = self.world.get(location_key, {})
+            self._print(gu.get_location_ascii(location_key, location_data))
+            self._print(f"\n🗺️ You are at the **{location_key.replace('_', ' ').title()}**.")
+            self._print("-" * 50)
+            self._print(location_data['description'])
+            self._print("-" * 50)
+            self._print("Available actions:")
+            for action in location_data['actions']:
+                self._print(f"- {action.title()}")
+            for action in gu.STANDARD_ACTIONS:
+                self._print(f"- {action.title()}")
+            return gu.location_commands(location_key, self.world)
+
+    def per_line(seed):
+        # Every output line is its own print() call
+        session = PerLineSession(seed=seed, name='Hero', difficulty=1.0, output=lambda text: print(text, file=stdout))
+        session.start()
+        for line in script:
+            print(session.prompt, file=stdout)
+            if session.feed(line) is None:
+                break
+        return session.turns
+
+    def buffered(seed, sink):
+        renderer = Renderer(sink)
+        session = GameSession(seed=seed, name='Hero', difficulty=1.0, output=renderer.write)
+        lines = iter(script)
+        play(session, renderer, lambda: next(lines, 'quit'))
+        return session.turns
+
+    modes = {
+        'print per line': per_line,
+        'renderer -> stdout': lambda seed: buffered(seed, StreamSink(stdout)),
+        'renderer -> null': lambda seed: buffered(seed, NullSink()),
+    }
+    for label, run in modes.items():
+        started = time.perf_counter()
+        turns = sum(run(seed) for seed in range(args.sessions))
+        elapsed = time.perf_counter() - started
+        print(f"{label:>20}: {turns / elapsed:>10,.0f} turns/sec ({turns:,} turns in {elapsed:.2f}s)", file=sys.stderr)
@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from game_session import GameSession
+
+# --- Deterministic Replay ---
+# A GameSession's outcome depends only on its seed, its name/difficulty
+# arguments and the lines it was fed. A replay log stores exactly that plus the
+# final state, gzip-compressed:
+#   line 1:  JSON header {"v", "seed", "name", "difficulty", "final", "count"}
+#   line 2+: the fed commands, one per line
+# Replaying re-runs the commands headlessly and reports any field of the final
+# state that no longer matches.
+
+LOG_VERSION = 1
+LOG_SUFFIX = '.aqr'
+CHECKED_FIELDS = ('outcome', 'health', 'score', 'inventory', 'location')
+
+
+def session_log(session: GameSession) -> dict:
+    """Builds the replay record of a session created with record=True."""
+    if session.commands is None:
+        raise ValueError("Session was not created with record=True")
+    if session.result is None:
+        session.run(()) # Finalize as 'incomplete' so the log has an expected end state
+    return {
+        'v': LOG_VERSION,
+        'seed': session.seed,
+        **session.preset,
+        'final': {field: session.result[field] for field in CHECKED_FIELDS},
+        'commands': session.commands,
+    }
+
+
+def write_log(path: str, session: GameSession) -> str:
+    """Writes a session's replay log; returns the path."""
+    log = session_log(session)
+    commands = log.pop('commands')
+    log['count'] = len(commands)
+    body = json.dumps(log, separators=(',', ':')) + "\n" + "\n".join(commands)
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        f.write(body)
+    return path
+
+
+def read_log(path: str) -> dict:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header, _, body = f.read().partition("\n")
+    log = json.loads(header)
+    if log.get('v') != LOG_VERSION:
+        raise ValueError(f"{path}: unsupported replay log version {log.get('v')}")
+    # Commands never contain newlines (they arrive one line at a time)
+    log['commands'] = body.split("\n") if log['count'] else []
+    return log
+
+
+def replay(log: dict) -> dict:
+    """Re-runs a replay log headlessly; returns the fresh result and any divergent fields."""
+    session = GameSession(seed=log['seed'], name=log['name'], difficulty=log['difficulty'])
+    result = session.run(log['commands'])
+    expected = log['final']
+    diverged = {field: {'expected': expected[field], 'actual': result[field]}
+                for field in CHECKED_FIELDS if expected.get(field) != result[field]}
+    return {'result': result, 'diverged': diverged}
+
+
+def replay_file(path: str) -> dict:
+    outcome = replay(read_log(path))
+    outcome['path'] = path
+    return outcome
+
+
+def _replay_chunk(paths: list) -> tuple:
+    """Worker entry point: returns (replayed count, divergent logs, unreadable logs)."""
+    divergent = []
+    errors = []
+    for path in paths:
+        try:
+            outcome = replay_file(path)
+        except (OSError, ValueError, KeyError) as e:
+            errors.append({'path': path, 'error': str(e)})
+            continue
+        if outcome['diverged']:
+            divergent.append({'path': path, 'diverged': outcome['diverged']})
+    return len(paths), divergent, errors
+
+
+def replay_directory(folder: str, workers: int = None, chunk_size: int = 500) -> dict:
+    """Replays every log in `folder` across a process pool and collects divergences."""
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(LOG_SUFFIX))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    report = {'replayed': 0, 'divergent': [], 'errors': []}
+    if not chunks:
+        return report
+    if workers == 1:
+        results = map(_replay_chunk, chunks)
+        return _collect(report, results)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return _collect(report, pool.map(_replay_chunk, chunks))
+
+
+def _collect(report: dict, results) -> dict:
+    for count, divergent, errors in results:
+        report['replayed'] += count
+        report['divergent'].extend(divergent)
+        report['errors'].extend(errors)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Record and replay Adventure Quest sessions.")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    check = sub.add_parser('check', help="replay every log in a directory and report divergences")
+    check.add_argument('folder')
+    check.add_argument('-w', '--workers', type=int, default=None)
+    record = sub.add_parser('record', help="record N random-policy sessions into a directory")
+    record.add_argument('folder')
+    record.add_argument('-n', '--sessions', type=int, default=1000)
+    record.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        import random
+
+        from sweep_runner import derive_seed, random_policy
+
+        os.makedirs(args.folder, exist_ok=True)
+        for i in range(args.sessions):
+            seed = derive_seed(args.seed, 'replay', i)
+            session = GameSession(seed=seed, name='Hero', difficulty=1.5 if i % 2 else 1.0, record=True)
+            policy_rng = random.Random(seed)
+            session.start()
+            while session.result is None and session.steps < 200:
+                session.feed(random_policy(session, policy_rng))
+            write_log(os.path.join(args.folder, f"session_{i:06d}{LOG_SUFFIX}"), session)
+        print(f"Recorded {args.sessions} sessions into {args.folder}")
+    else:
+        start = time.perf_counter()
+        report = replay_directory(args.folder, args.workers)
+        elapsed = time.perf_counter() - start
+        print(json.dumps({key: value[:20] if isinstance(value, list) else value for key, value in report.items()}, indent=2))
+        rate = report['replayed'] / elapsed * 60 if elapsed else 0
+        print(f"{report['replayed']:,} replays in {elapsed:.2f}s ({rate:,.0f} replays/min)")
+        sys.exit(1 if report['divergent'] or report['errors'] else 0)
@@ -0,0 +1,402 @@
+import mmap
+import os
+import struct
+
+from compact_state import WorldOverlay, bit_ids, id_set, shared_table, with_id
+
+# --- Binary Save Journal ---
+# A save file starts with a full binary snapshot of the player and the world
+# overlay (taken items, cleared challenges). Every later save only appends a
+# DELTA record holding the fields that changed since the previous save, so the
+# cost of a save is proportional to what happened, not to the size of the state.
+# Once the deltas outgrow the snapshot the file is compacted back to a single
+# snapshot (written to a temp file of its own and swapped in atomically, so two
+# processes compacting the same journal never write into each other's file).
+#
+# The records hold location, item and slot IDs, which only mean something in
+# the world they were saved in: the file starts with MAGIC and that world's
+# WorldTable.content_hash, and a journal from any other world refuses to load.
+#
+# Journal layout: MAGIC, <u64 world content hash>, then records
+# Record layout: <u8 kind><u32 length><payload>
+# Location and item IDs are u32, so generated worlds far past 65k locations fit.
+# An ID set (see compact_state) is stored as <u32 size><little-endian bitset>,
+# or, once it is sparse, as <u32 SPARSE_FLAG | count><u32 ID>*count.
+
+MAGIC = b'AQSJ\x03'
+BATCH_MAGIC = b'AQSB\x02'
+
+KIND_SNAPSHOT = 1
+KIND_DELTA = 2
+
+# Field codes used inside snapshots and deltas
+F_NAME, F_HEALTH, F_SCORE, F_LOCATION, F_DIFFICULTY, F_VISITED, F_INVENTORY, F_TAKEN, F_CLEARED = range(9)
+FIELDS = (F_NAME, F_HEALTH, F_SCORE, F_LOCATION, F_DIFFICULTY, F_VISITED, F_INVENTORY, F_TAKEN, F_CLEARED)
+
+_RECORD = struct.Struct('<BI')
+_I32 = struct.Struct('<i')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_F64 = struct.Struct('<d')
+_NO_ID = 0xFFFFFFFF
+SPARSE_FLAG = 0x80000000
+
+
+def _pack_bits(value) -> bytes:
+    if isinstance(value, frozenset):
+        return _U32.pack(SPARSE_FLAG | len(value)) + struct.pack(f'<{len(value)}I', *sorted(value))
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'little')
+    return _U32.pack(len(data)) + data
+
+
+def _pack_str(text: str) -> bytes:
+    data = text.encode('utf-8')
+    return _U16.pack(len(data)) + data
+
+
+def _state_of(player: dict, world, table) -> dict:
+    """Flattens a player dict and world overlay into the journal's field values."""
+    visited = id_set(table.location_ids[name] for name in player['visited_locations'])
+    return {
+        F_NAME: player['name'],
+        F_HEALTH: player['health'],
+        F_SCORE: player['score'],
+        F_LOCATION: table.location_ids[player['location']],
+        F_DIFFICULTY: player['difficulty'],
+        F_VISITED: visited,
+        F_INVENTORY: tuple(player['inventory']),
+        F_TAKEN: world.taken if world is not None else 0,
+        F_CLEARED: world.cleared if world is not None else 0,
+    }
+
+
+def _encode_fields(state: dict, fields, table) -> bytes:
+    parts = []
+    for field in fields:
+        value = state[field]
+        parts.append(bytes((field,)))
+        if field == F_NAME:
+            parts.append(_pack_str(value))
+        elif field in (F_HEALTH, F_SCORE):
+            parts.append(_I32.pack(value))
+        elif field == F_LOCATION:
+            parts.append(_U32.pack(value))
+        elif field == F_DIFFICULTY:
+            parts.append(_F64.pack(value))
+        elif field == F_INVENTORY:
+            # Interned item IDs; names outside the world table are stored inline
+            parts.append(_U16.pack(len(value)))
+            for item in value:
+                item_id = table.item_ids.get(item)
+                if item_id is None:
+                    parts.append(_U32.pack(_NO_ID) + _pack_str(item))
+                else:
+                    parts.append(_U32.pack(item_id))
+        else:
+            parts.append(_pack_bits(value))
+    return b''.join(parts)
+
+
+def _decode_fields(buf, offset: int, end: int, state: dict, table):
+    """Applies the fields encoded in buf[offset:end] onto `state`."""
+    while offset < end:
+        field = buf[offset]
+        offset += 1
+        if field == F_NAME:
+            (size,) = _U16.unpack_from(buf, offset)
+            state[field] = bytes(buf[offset + 2:offset + 2 + size]).decode('utf-8')
+            offset += 2 + size
+        elif field in (F_HEALTH, F_SCORE):
+            (state[field],) = _I32.unpack_from(buf, offset)
+            offset += 4
+        elif field == F_LOCATION:
+            (state[field],) = _U32.unpack_from(buf, offset)
+            offset += 4
+        elif field == F_DIFFICULTY:
+            (state[field],) = _F64.unpack_from(buf, offset)
+            offset += 8
+        elif field == F_INVENTORY:
+            (count,) = _U16.unpack_from(buf, offset)
+            offset += 2
+            items = []
+            for _ in range(count):
+                (item_id,) = _U32.unpack_from(buf, offset)
+                offset += 4
+                if item_id == _NO_ID:
+                    (size,) = _U16.unpack_from(buf, offset)
+                    items.append(bytes(buf[offset + 2:offset + 2 + size]).decode('utf-8'))
+                    offset += 2 + size
+                else:
+                    items.append(table.item_names[item_id])
+            state[field] = tuple(items)
+        elif field in (F_VISITED, F_TAKEN, F_CLEARED):
+            (size,) = _U32.unpack_from(buf, offset)
+            if size & SPARSE_FLAG:
+                count = size & ~SPARSE_FLAG
+                state[field] = frozenset(struct.unpack_from(f'<{count}I', buf, offset + 4))
+                offset += 4 + 4 * count
+            else:
+                state[field] = int.from_bytes(buf[offset + 4:offset + 4 + size], 'little')
+                offset += 4 + size
+        else:
+            raise ValueError(f"Corrupt save: unknown field code {field}")
+    return state
+
+
+def _restore(state: dict, table) -> tuple:
+    """Turns decoded field values back into (player dict, WorldOverlay)."""
+    player = {
+        'name': state[F_NAME],
+        'health': state[F_HEALTH],
+        'inventory': list(state[F_INVENTORY]),
+        'score': state[F_SCORE],
+        'location': table.location_names[state[F_LOCATION]],
+        'difficulty': state[F_DIFFICULTY],
+        'visited_locations': {table.location_names[i] for i in bit_ids(state[F_VISITED])},
+    }
+    return player, WorldOverlay(table, state[F_TAKEN], state[F_CLEARED])
+
+
+def encode_snapshot(player: dict, world=None, table=None) -> bytes:
+    """Full binary snapshot of one player and world overlay."""
+    table = table if table is not None else shared_table()
+    return _encode_fields(_state_of(player, world, table), FIELDS, table)
+
+
+def decode_snapshot(buf, table=None, offset: int = 0, end: int = None) -> tuple:
+    """Inverse of encode_snapshot; returns (player dict, WorldOverlay)."""
+    table = table if table is not None else shared_table()
+    state = _decode_fields(buf, offset, len(buf) if end is None else end, {}, table)
+    return _restore(state, table)
+
+
+def overlay_from_locations(locations, table=None) -> WorldOverlay:
+    """Diffs a mutated LOCATIONS dict (the interactive game's world) against the pristine table."""
+    table = table if table is not None else shared_table()
+    taken = 0
+    cleared = 0
+    # A LazyWorld only changes the locations it pinned; other mappings are checked in full
+    edited = getattr(locations, 'edited', None)
+    for name in (edited() if edited is not None else table.location_names):
+        loc_id = table.location_ids[name]
+        data = locations[name]
+        row = table.row(loc_id)
+        remaining = list(data['items'])
+        for i, item_id in enumerate(row.items):
+            item = table.item_names[item_id]
+            if item in remaining:
+                remaining.remove(item)
+            else:
+                taken = with_id(taken, row.first_slot + i)
+        if row.challenge and not data.get('challenge'):
+            cleared = with_id(cleared, loc_id)
+    return WorldOverlay(table, taken, cleared)
+
+
+class SaveJournal:
+    """
+    Snapshot + append-only delta journal for one save slot.
+    `compact_ratio`: compact once the deltas are this many times bigger than the snapshot.
+    """
+
+    def __init__(self, path: str, table=None, compact_ratio: float = 4.0):
+        self.path = path
+        self.table = table if table is not None else shared_table()
+        self.compact_ratio = compact_ratio
+        self._last = None
+        self._snapshot_bytes = 0
+        self._delta_bytes = 0
+
+    def save(self, player: dict, world=None) -> int:
+        """Appends the changes since the last save; returns the number of bytes written."""
+        state = _state_of(player, world, self.table)
+        if self._last is None and os.path.exists(self.path):
+            self._resume()
+        if self._last is None:
+            return self.compact(state)
+
+        changed = [field for field in FIELDS if state[field] != self._last[field]]
+        if not changed:
+            return 0
+        payload = _encode_fields(state, changed, self.table)
+        with open(self.path, 'ab') as f:
+            f.write(_RECORD.pack(KIND_DELTA, len(payload)) + payload)
+        self._last = state
+        self._delta_bytes += _RECORD.size + len(payload)
+        if self._delta_bytes > self.compact_ratio * max(self._snapshot_bytes, 64):
+            self.compact(state)
+        return _RECORD.size + len(payload)
+
+    def compact(self, state: dict = None) -> int:
+        """Rewrites the journal as a single snapshot of the latest state."""
+        if state is None:
+            state = self._last if self._last is not None else self._resume()
+        payload = _encode_fields(state, FIELDS, self.table)
+        data = MAGIC + _U64.pack(self.table.content_hash) + _RECORD.pack(KIND_SNAPSHOT, len(payload)) + payload
+        _write_atomic(self.path, data)
+        self._last = state
+        self._snapshot_bytes = len(data)
+        self._delta_bytes = 0
+        return len(data)
+
+    def restart(self, player: dict, world=None) -> int:
+        """Replaces whatever the file holds (say a foreign or corrupt journal) with a snapshot of this state."""
+        return self.compact(_state_of(player, world, self.table))
+
+    def _resume(self) -> dict:
+        """Replays the file on disk so appends continue from its latest state."""
+        self._last, self._snapshot_bytes, self._delta_bytes = _replay_journal(self.path, self.table)
+        return self._last
+
+    def load(self) -> tuple:
+        """Returns (player dict, WorldOverlay) for the latest saved state."""
+        return _restore(self._resume(), self.table)
+
+
+def _write_atomic(path: str, data: bytes):
+    """Writes `data` through a temp file of its own and renames it over `path`."""
+    import tempfile
+
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644) # mkstemp creates it private
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _replay_journal(path: str, table) -> tuple:
+    with open(path, 'rb') as f:
+        buf = f.read()
+    if not buf.startswith(MAGIC) or len(buf) < len(MAGIC) + _U64.size:
+        raise ValueError(f"{path} is not an Adventure Quest save journal")
+    (world_hash,) = _U64.unpack_from(buf, len(MAGIC))
+    if world_hash != table.content_hash:
+        raise ValueError(f"{path} was saved in a different world")
+    offset = len(MAGIC) + _U64.size
+    state = None
+    snapshot_bytes = delta_bytes = 0
+    while offset + _RECORD.size <= len(buf):
+        kind, length = _RECORD.unpack_from(buf, offset)
+        start, end = offset + _RECORD.size, offset + _RECORD.size + length
+        if end > len(buf):
+            break # Torn final append: ignore it
+        try:
+            if kind == KIND_SNAPSHOT:
+                state = _decode_fields(buf, start, end, {}, table)
+                snapshot_bytes, delta_bytes = end, 0
+            elif kind == KIND_DELTA and state is not None:
+                _decode_fields(buf, start, end, state, table)
+                delta_bytes += end - offset
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"{path} is corrupt: {e}") from None
+        offset = end
+    if state is None:
+        raise ValueError(f"{path} holds no snapshot")
+    return state, snapshot_bytes, delta_bytes
+
+
+def load_game(path: str, table=None) -> tuple:
+    """Loads a save journal; returns (player dict, WorldOverlay)."""
+    return SaveJournal(path, table).load()
+
+
+# --- Batch Checkpoints ---
+# Layout: MAGIC, <u32 count>, count x <u64 end offset>, then the snapshots back to back.
+
+_COUNT = struct.Struct('<I')
+
+
+def write_batch(path: str, states, table=None) -> int:
+    """
+    Writes many (player, world) pairs into one file with a single sequential write.
+    Returns the number of sessions written.
+    """
+    table = table if table is not None else shared_table()
+    blobs = [encode_snapshot(player, world, table) for player, world in states]
+    ends = []
+    position = 0
+    for blob in blobs:
+        position += len(blob)
+        ends.append(position)
+    header = BATCH_MAGIC + _COUNT.pack(len(blobs)) + struct.pack(f'<{len(ends)}Q', *ends)
+    with open(path, 'wb') as f:
+        f.write(b''.join([header] + blobs))
+    return len(blobs)
+
+
+class BatchCheckpoint:
+    """Memory-mapped reader for write_batch files; sessions are decoded on demand."""
+
+    def __init__(self, path: str, table=None):
+        self.table = table if table is not None else shared_table()
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(BATCH_MAGIC)] != BATCH_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an Adventure Quest batch checkpoint")
+        (self.count,) = _COUNT.unpack_from(self._map, len(BATCH_MAGIC))
+        self._index = len(BATCH_MAGIC) + _COUNT.size
+        self._data = self._index + 8 * self.count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> tuple:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        start = struct.unpack_from('<Q', self._map, self._index + 8 * (i - 1))[0] if i else 0
+        (end,) = struct.unpack_from('<Q', self._map, self._index + 8 * i)
+        return decode_snapshot(self._map, self.table, self._data + start, self._data + end)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+
+    from game_session import new_player
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    states = []
+    for i in range(count):
+        player = new_player(f'Hero{i}', 1.5 if i % 2 else 1.0)
+        player['visited_locations'].update(('start_clearing', 'river_bank'))
+        player['score'] = i % 500
+        states.append((player, WorldOverlay(cleared=i & 2)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'batch.aqsb')
+        start = time.perf_counter()
+        write_batch(path, states)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        print(f"Checkpointed {count:,} sessions in {elapsed:.3f}s ({size / count:.1f} bytes/session)")
+
+        start = time.perf_counter()
+        with BatchCheckpoint(path) as checkpoint:
+            for i in range(0, count, max(1, count // 1000)):
+                checkpoint[i]
+        print(f"Random-access loads: {(time.perf_counter() - start) * 1e6 / 1000:.1f} us each")
+
+        journal = SaveJournal(os.path.join(folder, 'slot.aqj'))
+        player, world = states[0]
+        first = journal.save(player, world)
+        player['health'] -= 7
+        delta = journal.save(player, world)
+        print(f"Journal: first save {first} bytes, one-field delta {delta} bytes")
@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from game_session import GameSession
+
+# --- Scripted Input Mode ---
+# A QA script is plain text with one line per prompt, exactly what would be
+# typed into `python play.py`: the hero's name, the difficulty, then the
+# commands (a blank line is an answer too). The whole script is read at once
+# and fed to a headless GameSession seeded like the interactive game
+# (random.seed(42)), so it plays the same game without input(), prompts or
+# re-rendered location menus. 'quit', victory and defeat end the run as its
+# result's outcome instead of exiting; a script that runs out first ends
+# 'incomplete', and lines left after the game ended are counted as 'unused'.
+#
+# The transcript has one row per line fed, with the columns in
+# TRANSCRIPT_FIELDS; row 0 holds the text printed before the first prompt.
+# Location frames (the description and action menu printed on every turn) are
+# left out unless `frames=True`.
+# A directory of scripts is spread across a process pool in chunks, like
+# replay.py does with replay logs.
+
+DEFAULT_SEED = 42 # adventure_quest.py seeds the random module with this
+TRANSCRIPT_FIELDS = ('step', 'input', 'location', 'health', 'score', 'output')
+
+
+def read_script(path: str) -> list:
+    """The script's lines; '-' reads standard input."""
+    if path == '-':
+        return sys.stdin.read().splitlines()
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read().splitlines()
+
+
+def run_script(lines: list, seed: int = DEFAULT_SEED, frames: bool = False, transcript: bool = True) -> dict:
+    """Plays one script to the end; returns the session result plus line counts (and the transcript)."""
+    buffer = []
+    session = GameSession(seed=seed, output=buffer.append)
+    session.frames = frames
+    rows = [] if transcript else None
+
+    def row(line):
+        player = session.player
+        rows.append([session.steps, line, player['location'], player['health'], player['score'], "\n".join(buffer)])
+        buffer.clear()
+
+    session.start()
+    if rows is not None:
+        row(None)
+    used = 0
+    for line in lines:
+        if session.result is not None:
+            break
+        session.feed(line)
+        used += 1
+        if rows is not None:
+            row(line)
+        else:
+            buffer.clear()
+    result = dict(session.run(())) # Finalizes as 'incomplete' if the script ran out first
+    result['lines'] = len(lines)
+    result['unused'] = len(lines) - used
+    result['steps'] = session.steps
+    if rows is not None:
+        result['transcript'] = rows
+    return result
+
+
+def run_file(path: str, seed: int = DEFAULT_SEED, frames: bool = False, transcript: bool = True) -> dict:
+    started = time.perf_counter()
+    result = run_script(read_script(path), seed, frames, transcript)
+    result['script'] = path
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def _run_chunk(paths: list, seed: int, frames: bool, transcript: bool) -> tuple:
+    """Worker entry point: returns (results, unreadable scripts)."""
+    results, errors = [], []
+    for path in paths:
+        try:
+            results.append(run_file(path, seed, frames, transcript))
+        except (OSError, UnicodeError) as e:
+            errors.append({'script': path, 'error': str(e)})
+    return results, errors
+
+
+def script_paths(paths) -> list:
+    """Expands directories into the (non-hidden) files they contain, sorted."""
+    found = []
+    for path in paths:
+        if path != '-' and os.path.isdir(path):
+            found.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if not name.startswith('.') and os.path.isfile(os.path.join(path, name))))
+        else:
+            found.append(path)
+    return found
+
+
+def run_suite(paths, seed: int = DEFAULT_SEED, frames: bool = False, transcript: bool = False, workers: int = None,
+              chunk_size: int = 50) -> dict:
+    """Runs every script under `paths` across a process pool; results keep the input order."""
+    paths = script_paths(paths)
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    work = partial(_run_chunk, seed=seed, frames=frames, transcript=transcript)
+    started = time.perf_counter()
+    report = {'scripts': len(paths), 'outcomes': Counter(), 'seconds': 0.0, 'results': [], 'errors': []}
+    if workers == 1 or len(chunks) <= 1 or '-' in paths:
+        _collect(report, map(work, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            _collect(report, pool.map(work, chunks))
+    for result in report['results']:
+        report['outcomes'][result['outcome']] += 1
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def _collect(report: dict, batches):
+    for results, errors in batches:
+        report['results'].extend(results)
+        report['errors'].extend(errors)
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='play.py --script', description="Run Adventure Quest from command scripts.")
+    parser.add_argument('--script', nargs='+', required=True, metavar='PATH',
+                        help="script files and/or directories of scripts ('-' reads standard input)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--frames', action='store_true', help="include the location frames in the transcript")
+    parser.add_argument('--transcript', action=argparse.BooleanOptionalAction, default=None,
+                        help="per-turn transcripts (default: only when running a single script)")
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('-o', '--output', default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument('--indent', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    workers = args.workers
+    if os.environ.get('AQ_METRICS') or os.environ.get('AQ_PROFILE'):
+        import instrumentation
+        instrumentation.from_environment()
+        workers = 1 # Pool workers would record into metrics nobody writes out
+    paths = script_paths(args.script)
+    transcript = args.transcript if args.transcript is not None else len(paths) == 1
+    report = run_suite(paths, args.seed, args.frames, transcript, workers)
+    if len(paths) == 1 and report['results']:
+        report = report['results'][0] # A single script reports its own result
+    text = json.dumps(report, ensure_ascii=False, indent=args.indent)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if isinstance(report, dict) and report.get('errors') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+import threading
+from collections import namedtuple
+
+from compact_state import WorldTable, bit_ids, has_id, id_set, shared_table, with_id
+
+# --- Shared World Store ---
+# One SharedWorld is the world of many sessions at once: when one player takes
+# the fishing rod or clears GHOSTLY_ENCOUNTER, every player sees it. Each
+# location's state is an immutable LocationState (version, taken item slots,
+# cleared flag). A writer holds that location's own lock while it checks and
+# builds the next state, then publishes it with one reference assignment;
+# readers never lock and always see a complete state. Takes and clears are
+# therefore atomic per location, players in different locations never wait
+# for each other, and every change bumps the location's version. The location
+# dict for a state is built on first read and cached by version. Locations
+# nobody changed have no state, lock or dict of their own, so a SharedWorld
+# over a huge map costs only what its players touch.
+#
+# Sessions play through a SharedView (see join()), which tags their changes
+# with the player. After a change is published, and outside the lock, the
+# other players standing in the same room are notified.
+
+LocationState = namedtuple('LocationState', 'version taken cleared')
+Change = namedtuple('Change', 'location kind item by version') # kind: 'take' or 'clear'
+
+UNTOUCHED = LocationState(0, 0, False)
+
+
+class SharedWorld:
+    """Thread-safe world shared by many sessions, with per-location locks and change notifications."""
+
+    def __init__(self, table: WorldTable = None):
+        self.table = table if table is not None else shared_table()
+        # Only locations someone changed get a state, a lock and a cached dict
+        self._states = {} # location ID -> LocationState
+        self._entries = {} # location ID -> (version, dict); a stale pair only costs a rebuild, so no lock
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._members = () # Copy-on-write, so notifying never takes a lock
+        self._members_lock = threading.Lock()
+
+    def _lock(self, loc_id: int) -> threading.Lock:
+        lock = self._locks.get(loc_id)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(loc_id, threading.Lock())
+        return lock
+
+    # --- Reads (lock-free) ---
+
+    def _entry(self, loc_id: int) -> dict:
+        state = self._states.get(loc_id, UNTOUCHED)
+        if not state.version:
+            return self.table.pristine(loc_id)
+        version, entry = self._entries.get(loc_id, (0, None))
+        if version != state.version:
+            entry = self.table.materialize(loc_id, state.taken, id_set((loc_id,)) if state.cleared else 0)
+            self._entries[loc_id] = (state.version, entry)
+        return entry
+
+    def get(self, location_key: str, default=None):
+        loc_id = self.table.location_ids.get(location_key)
+        return default if loc_id is None else self._entry(loc_id)
+
+    def __getitem__(self, location_key: str) -> dict:
+        return self._entry(self.table.location_ids[location_key])
+
+    def __contains__(self, location_key: str) -> bool:
+        return location_key in self.table.location_ids
+
+    def state(self, location_key: str) -> LocationState:
+        return self._states.get(self.table.location_ids[location_key], UNTOUCHED)
+
+    def version(self, location_key: str) -> int:
+        """Number of changes made to the location so far."""
+        return self.state(location_key).version
+
+    @property
+    def taken(self):
+        """Taken item slots as one WorldOverlay-style ID set (for saves and snapshots)."""
+        # tuple() copies atomically; writers may be adding
+        return id_set(slot for state in tuple(self._states.values()) for slot in bit_ids(state.taken))
+
+    @property
+    def cleared(self):
+        """Cleared challenges as one WorldOverlay-style ID set."""
+        return id_set(loc_id for loc_id, state in tuple(self._states.items()) if state.cleared)
+
+    # --- Atomic updates ---
+
+    def _publish(self, loc_id: int, state: LocationState, taken, cleared: bool) -> LocationState:
+        new_state = LocationState(state.version + 1, taken, cleared)
+        self._states[loc_id] = new_state
+        return new_state
+
+    def take_item(self, location_key: str, item_name: str, by=None) -> bool:
+        """Takes one copy of an item; exactly one of several racing players gets True."""
+        loc_id = self.table.location_ids[location_key]
+        copies = self.table.slots_of(loc_id, self.table.item_ids.get(item_name))
+        with self._lock(loc_id):
+            state = self._states.get(loc_id, UNTOUCHED)
+            for slot in copies:
+                if not has_id(state.taken, slot):
+                    state = self._publish(loc_id, state, with_id(state.taken, slot), state.cleared)
+                    break
+            else:
+                return False
+        self._notify(Change(location_key, 'take', item_name, by, state.version))
+        return True
+
+    def clear_challenge(self, location_key: str, by=None) -> bool:
+        """Marks the location's challenge as completed; False if someone already did."""
+        loc_id = self.table.location_ids[location_key]
+        with self._lock(loc_id):
+            state = self._states.get(loc_id, UNTOUCHED)
+            if state.cleared:
+                return False
+            state = self._publish(loc_id, state, state.taken, True)
+        self._notify(Change(location_key, 'clear', None, by, state.version))
+        return True
+
+    def reset(self):
+        """Puts every item back and restores every challenge (notifies nobody)."""
+        for loc_id in tuple(self._states):
+            with self._lock(loc_id):
+                self._publish(loc_id, self._states[loc_id], 0, False)
+
+    # --- Players and notifications ---
+
+    def join(self, player_of, notify=None) -> 'SharedView':
+        """
+        Adds a player. `player_of()` returns their current player dict (its
+        'location' decides which room they are in); `notify(change)` is called
+        for every change another player makes there.
+        """
+        view = SharedView(self, player_of, notify)
+        if notify is not None:
+            with self._members_lock:
+                self._members += (view,)
+        return view
+
+    def leave(self, view: 'SharedView'):
+        with self._members_lock:
+            self._members = tuple(member for member in self._members if member is not view)
+
+    @property
+    def players(self) -> int:
+        return len(self._members)
+
+    def _notify(self, change: Change):
+        for member in self._members:
+            if member is not change.by and member.player_of()['location'] == change.location:
+                member.notify(change)
+
+
+class SharedView:
+    """
+    One player's handle on a SharedWorld: the same get/[]/take_item/clear_challenge
+    interface as compact_state.WorldOverlay, with changes credited to the player.
+    A session snapshot taken here restores onto a private WorldOverlay.
+    """
+    __slots__ = ('shared', 'player_of', 'notify')
+
+    def __init__(self, shared: SharedWorld, player_of, notify=None):
+        self.shared = shared
+        self.player_of = player_of
+        self.notify = notify
+
+    @property
+    def table(self) -> WorldTable:
+        return self.shared.table
+
+    @property
+    def taken(self) -> int:
+        return self.shared.taken
+
+    @property
+    def cleared(self) -> int:
+        return self.shared.cleared
+
+    @property
+    def name(self) -> str:
+        return self.player_of()['name']
+
+    def get(self, location_key: str, default=None):
+        return self.shared.get(location_key, default)
+
+    def __getitem__(self, location_key: str) -> dict:
+        return self.shared[location_key]
+
+    def __contains__(self, location_key: str) -> bool:
+        return location_key in self.shared
+
+    def take_item(self, location_key: str, item_name: str) -> bool:
+        return self.shared.take_item(location_key, item_name, self)
+
+    def clear_challenge(self, location_key: str) -> bool:
+        return self.shared.clear_challenge(location_key, self)
+
+    def leave(self):
+        self.shared.leave(self)
+
+
+# --- Stress Test ---
+# Many threads race to take every item of a location, round after round. Each
+# round checks that every item was handed out exactly once (no lost or doubled
+# takes). 'hot' puts all threads in one location; 'spread' gives each thread a
+# location of its own, so they never share a lock. Throughput counts every
+# take_item() call, including the ones that lose the race. check_members()
+# then plays GameSessions in one world and counts who is still a member after
+# some restore a snapshot and after all of them close. The command line fails
+# (exit status 1) if any item was lost or doubled or any member is left.
+
+def stress_table(locations: int, items: int) -> WorldTable:
+    """A synthetic world of `locations` halls holding `items` coins each."""
+    return WorldTable({f'hall_{i}': {'description': f"Hall {i}", 'actions': [], 'challenge': None, 'neighbors': {},
+                                     'items': [f'coin {j}' for j in range(items)]}
+                       for i in range(locations)})
+
+
+def contend(threads: int, items: int = 100, rounds: int = 10, spread: bool = False) -> dict:
+    """Runs the race and returns throughput and correctness counts."""
+    import time
+
+    table = stress_table(threads if spread else 1, items)
+    world = SharedWorld(table)
+    names = [f'coin {j}' for j in range(items)]
+    claims = [[] for _ in range(threads)]
+    start, finish = threading.Barrier(threads + 1), threading.Barrier(threads + 1)
+
+    def worker(t):
+        location_key = table.location_names[t if spread else 0]
+        order = names[t % items:] + names[:t % items] # Staggered, so threads collide mid-list
+        mine = claims[t]
+        for _ in range(rounds):
+            start.wait()
+            for name in order:
+                if world.take_item(location_key, name):
+                    mine.append((location_key, name))
+            finish.wait()
+
+    workers = [threading.Thread(target=worker, args=(t,), daemon=True) for t in range(threads)]
+    for thread in workers:
+        thread.start()
+    expected = len(table.location_names) * items
+    elapsed = lost = doubled = 0
+    for _ in range(rounds):
+        world.reset()
+        started = time.perf_counter()
+        start.wait()
+        finish.wait()
+        elapsed += time.perf_counter() - started
+        taken = [claim for mine in claims for claim in mine]
+        unique = len(set(taken))
+        lost += expected - unique
+        doubled += len(taken) - unique
+        for mine in claims:
+            mine.clear()
+    for thread in workers:
+        thread.join()
+    attempts = threads * items * rounds
+    return {'threads': threads, 'mode': 'spread' if spread else 'hot', 'attempts': attempts,
+            'seconds': elapsed, 'ops_per_s': attempts / elapsed if elapsed else 0.0,
+            'lost': lost, 'doubled': doubled}
+
+
+def check_members(sessions: int = 8, seed: int = 0) -> dict:
+    """
+    Member counts of a SharedWorld played by `sessions` GameSessions: once they
+    joined, after every other one restored a snapshot, and after all closed.
+    """
+    from game_session import GameSession
+    from shared_world import SharedWorld # The class game_session checks for, also when this file runs as a script
+
+    world = SharedWorld()
+    games = [GameSession(seed=seed + i, name=f'Player{i}', difficulty=1.0, world=world) for i in range(sessions)]
+    for game in games:
+        game.start()
+    joined = world.players
+    for game in games[::2]:
+        snapshot = game.snapshot()
+        game.feed('go east')
+        game.restore(snapshot)
+    restored = world.players
+    for game in games:
+        game.close()
+    return {'sessions': sessions, 'joined': joined, 'restored': len(games[::2]),
+            'after_restore': restored, 'after_close': world.players}
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Stress the shared world with racing take_item() calls.")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+    parser.add_argument('--items', type=int, default=100, help="items per location")
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--mode', choices=('hot', 'spread', 'both'), default='both')
+    parser.add_argument('--switch-interval', type=float, default=1e-5,
+                        help="interpreter thread switch interval in seconds (smaller provokes more races)")
+    args = parser.parse_args()
+
+    sys.setswitchinterval(args.switch_interval)
+    modes = ('hot', 'spread') if args.mode == 'both' else (args.mode,)
+    failures = []
+    print(f"{'threads':>7}  {'mode':<6}  {'tries/s':>12}  {'scaling':>7}  {'lost':>4}  {'doubled':>7}")
+    for mode in modes:
+        single = None
+        for threads in args.threads:
+            report = contend(threads, args.items, args.rounds, spread=mode == 'spread')
+            single = single or report['ops_per_s']
+            print(f"{threads:>7}  {mode:<6}  {report['ops_per_s']:>12,.0f}  {report['ops_per_s'] / single:>6.2f}x  "
+                  f"{report['lost']:>4}  {report['doubled']:>7}")
+            if report['lost'] or report['doubled']:
+                failures.append(f"{threads} threads ({mode}): {report['lost']} lost, {report['doubled']} doubled")
+
+    members = check_members()
+    print(f"Members: {members['joined']} joined, {members['after_restore']} after {members['restored']} restored "
+          f"a snapshot, {members['after_close']} after all closed")
+    if members['joined'] != members['sessions']:
+        failures.append(f"{members['joined']} of {members['sessions']} sessions joined")
+    if members['after_restore'] != members['sessions'] - members['restored']:
+        failures.append(f"restored sessions stayed members ({members['after_restore']} left)")
+    if members['after_close']:
+        failures.append(f"{members['after_close']} members left after every session closed")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import time
+
+# --- Startup Measurement ---
+# Time-to-first-prompt is wall time from spawning a fresh interpreter on an
+# entry point until the name prompt reaches its stdout. play.py is the fast
+# entry: a script named on the command line is compiled from source on every
+# launch, while an imported module's bytecode is cached. The floor is
+# an interpreter that only prints the same prompt. The import breakdown comes from CPython's own
+# `-X importtime` report.
+#
+# The yardstick is the game as the repository's first commit shipped it: its
+# files are checked out of git into a temp folder (bytecode precompiled, like
+# ours) and launched alongside, and the report gives play.py's time as a
+# multiple of that baseline's.
+#
+# Keep this module out of the game's import graph; it is only loaded by
+# `python play.py --measure-startup` (or adventure_quest.py).
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GAME = os.path.join(HERE, 'play.py')
+FIRST_PROMPT = b"Enter your hero's name: "
+BASELINE = 'first commit'
+LAUNCHES = {
+    'interpreter': [sys.executable, '-c', f"input({FIRST_PROMPT.decode()!r})"],
+    'adventure_quest.py': [sys.executable, os.path.join(HERE, 'adventure_quest.py')],
+    'play.py': [sys.executable, GAME],
+}
+
+
+def baseline_launch(folder: str):
+    """
+    Checks the first commit's Python files out into `folder`; returns the command
+    launching its adventure_quest.py, or None without git or that history.
+    """
+    import compileall
+
+    def git(*args) -> bytes:
+        return subprocess.run(['git', *args], cwd=HERE, capture_output=True, check=True).stdout
+
+    try:
+        root = git('rev-list', '--max-parents=0', 'HEAD').split()[-1].decode()
+        names = [name for name in git('ls-tree', '--name-only', root).decode().splitlines() if name.endswith('.py')]
+        if 'adventure_quest.py' not in names:
+            return None
+        for name in names:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(git('show', f'{root}:{name}'))
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+    compileall.compile_dir(folder, quiet=1)
+    return [sys.executable, os.path.join(folder, 'adventure_quest.py')]
+
+
+def time_to_prompt(command: list, prompt: bytes = FIRST_PROMPT) -> float:
+    """Seconds from spawning `command` until `prompt` appears on its stdout."""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=HERE, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    seen = b''
+    try:
+        while prompt not in seen:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError(f"{command} exited before printing {prompt!r}")
+            seen += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_breakdown(command: list = None) -> list:
+    """(module, self us, cumulative us, depth) per import of one launch, in import order."""
+    command = command or [sys.executable, GAME]
+    result = subprocess.run([command[0], '-X', 'importtime', *command[1:]], cwd=HERE, input=b'',
+                            capture_output=True)
+    rows = []
+    for line in result.stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(runs: int = 20, launches: dict = None) -> dict:
+    """Median and p90 time-to-first-prompt of each launch (LAUNCHES by default), in milliseconds."""
+    launches = launches if launches is not None else LAUNCHES
+    times = {label: [] for label in launches}
+    for _ in range(runs):
+        for label, command in launches.items(): # Interleaved, so load drift hits all alike
+            times[label].append(time_to_prompt(command))
+    report = {}
+    for label, values in times.items():
+        values.sort()
+        report[label] = {'median_ms': values[len(values) // 2] * 1000,
+                         'p90_ms': values[min(len(values) - 1, int(len(values) * 0.9))] * 1000}
+    return report
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    runs = int(argv[argv.index('--runs') + 1]) if '--runs' in argv else 20
+    if sys.dont_write_bytecode:
+        print("Note: PYTHONDONTWRITEBYTECODE is set, so every launch recompiles changed modules.")
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        launches = dict(LAUNCHES)
+        baseline = baseline_launch(folder)
+        if baseline is not None:
+            launches[BASELINE] = baseline
+        report = measure(runs, launches)
+    floor = report['interpreter']['median_ms']
+    print(f"Time to first prompt over {runs} launches:")
+    for label, stats in report.items():
+        extra = f"   (+{stats['median_ms'] - floor:.1f} ms over the interpreter)" if label != 'interpreter' else ""
+        print(f"  {label:<20} median {stats['median_ms']:6.1f} ms   p90 {stats['p90_ms']:6.1f} ms{extra}")
+    if BASELINE in report:
+        ratio = report['play.py']['median_ms'] / report[BASELINE]['median_ms']
+        print(f"play.py takes {ratio:.2f}x the time of the first commit's adventure_quest.py")
+    else:
+        print("(No git history here, so no comparison with the first commit's game.)")
+
+    rows = import_breakdown()
+    game_modules = {name[:-3] for name in os.listdir(HERE) if name.endswith('.py')}
+    print("Slowest imports of one launch (own time, then including what they import):")
+    for name, self_us, cumulative, _ in sorted(rows, key=lambda row: -row[1])[:12]:
+        print(f"  {self_us / 1000:7.2f} ms  {cumulative / 1000:7.2f} ms  {name}")
+    loaded = [name for name, _, _, _ in rows if name in game_modules]
+    print(f"Game modules loaded before the first prompt: {', '.join(loaded)}")
+
+
+if __name__ == "__main__":
+    main()
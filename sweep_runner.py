@@ -0,0 +1,176 @@
+import hashlib
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from game_session import GameSession, STANDARD_ACTIONS
+
+# --- Parallel Parameter Sweeps ---
+# Every game gets its own random.Random seeded from (base_seed, difficulty, game
+# index), so a sweep produces the same numbers no matter how many workers run it
+# or in which order chunks finish. Workers only ship back small SweepStats
+# accumulators, which keeps memory flat however many games are played.
+
+DEFAULT_CHUNK = 2000
+MAX_STEPS = 500 # Safety net so a wandering bot cannot play forever
+
+
+def derive_seed(base_seed: int, *keys) -> int:
+    """Derives an independent 64-bit seed from a base seed and any number of keys."""
+    material = ":".join(str(part) for part in (base_seed,) + keys).encode()
+    return int.from_bytes(hashlib.blake2b(material, digest_size=8).digest(), 'little')
+
+
+# --- Policies: called with (session, rng) and return the next input line ---
+
+def random_policy(session, rng) -> str:
+    """Picks a random game action; answers the chest puzzle with a random guess."""
+    if session.options is None:
+        return str(rng.randint(0, 130))
+    choices = [opt for opt in session.options if opt not in STANDARD_ACTIONS]
+    return rng.choice(choices or session.options)
+
+
+def script_policy(commands: list):
+    """Wraps a fixed command list as a policy (used for scripted sweeps)."""
+    def policy(session, rng, _commands=tuple(commands)):
+        index = session.steps
+        return _commands[index] if index < len(_commands) else 'quit'
+    return policy
+
+
+class SweepStats:
+    """Streaming reduction of game results (counts, Welford mean/variance, histogram)."""
+
+    def __init__(self):
+        self.games = 0
+        self.outcomes = {}
+        self.score_mean = 0.0
+        self.score_m2 = 0.0
+        self.score_min = None
+        self.score_max = None
+        self.turns_total = 0
+        self.health_total = 0
+        self.score_histogram = {} # Bucketed by tens of final score
+
+    def add(self, result: dict):
+        self.games += 1
+        self.outcomes[result['outcome']] = self.outcomes.get(result['outcome'], 0) + 1
+        score = result['final_score']
+        delta = score - self.score_mean
+        self.score_mean += delta / self.games
+        self.score_m2 += delta * (score - self.score_mean)
+        self.score_min = score if self.score_min is None else min(self.score_min, score)
+        self.score_max = score if self.score_max is None else max(self.score_max, score)
+        self.turns_total += result['turns']
+        self.health_total += result['health']
+        bucket = (score // 10) * 10
+        self.score_histogram[bucket] = self.score_histogram.get(bucket, 0) + 1
+
+    def merge(self, other: 'SweepStats'):
+        """Combines two partial reductions (Chan et al. parallel variance)."""
+        if not other.games:
+            return self
+        total = self.games + other.games
+        delta = other.score_mean - self.score_mean
+        self.score_m2 += other.score_m2 + delta * delta * self.games * other.games / total
+        self.score_mean += delta * other.games / total
+        self.games = total
+        for key, count in other.outcomes.items():
+            self.outcomes[key] = self.outcomes.get(key, 0) + count
+        for key, count in other.score_histogram.items():
+            self.score_histogram[key] = self.score_histogram.get(key, 0) + count
+        self.score_min = other.score_min if self.score_min is None else min(self.score_min, other.score_min)
+        self.score_max = other.score_max if self.score_max is None else max(self.score_max, other.score_max)
+        self.turns_total += other.turns_total
+        self.health_total += other.health_total
+        return self
+
+    def summary(self) -> dict:
+        games = self.games or 1
+        return {
+            'games': self.games,
+            'outcome_rates': {key: count / games for key, count in sorted(self.outcomes.items())},
+            'score_mean': self.score_mean,
+            'score_stddev': math.sqrt(self.score_m2 / games),
+            'score_min': self.score_min,
+            'score_max': self.score_max,
+            'mean_turns': self.turns_total / games,
+            'mean_final_health': self.health_total / games,
+            'score_histogram': dict(sorted(self.score_histogram.items())),
+        }
+
+
+def play_game(seed: int, policy, name: str = 'Hero', difficulty: float = 1.0, max_steps: int = MAX_STEPS) -> dict:
+    """Plays one headless game; the session and the policy get separate streams derived from `seed`."""
+    session = GameSession(seed=derive_seed(seed, 'game'), name=name, difficulty=difficulty)
+    policy_rng = random.Random(derive_seed(seed, 'policy'))
+    session.start()
+    while session.result is None and session.steps < max_steps:
+        session.feed(policy(session, policy_rng))
+    return session.run(())
+
+
+def run_chunk(base_seed: int, difficulty: float, first: int, count: int, policy_spec) -> SweepStats:
+    """Worker entry point: plays games [first, first + count) and reduces them."""
+    policy = random_policy if policy_spec == 'random' else script_policy(policy_spec)
+    stats = SweepStats()
+    for index in range(first, first + count):
+        stats.add(play_game(derive_seed(base_seed, difficulty, index), policy, difficulty=difficulty))
+    return stats
+
+
+def run_sweep(games: int, difficulties=(1.0, 1.5), policy_spec='random', base_seed: int = 42,
+              workers: int = None, chunk_size: int = DEFAULT_CHUNK) -> dict:
+    """
+    Spreads `games` playthroughs per difficulty over a process pool.
+    `policy_spec` is 'random' or a list of commands. Chunks are submitted lazily
+    so no more than a couple of chunks per worker are ever in flight.
+    """
+    totals = {difficulty: SweepStats() for difficulty in difficulties}
+    jobs = ((difficulty, first, min(chunk_size, games - first))
+            for difficulty in difficulties for first in range(0, games, chunk_size))
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        limit = 2 * workers
+        for difficulty, first, count in jobs:
+            if len(in_flight) >= limit:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    totals[in_flight.pop(future)].merge(future.result())
+            future = pool.submit(run_chunk, base_seed, difficulty, first, count, policy_spec)
+            in_flight[future] = difficulty
+        for future in list(in_flight):
+            totals[in_flight.pop(future)].merge(future.result())
+    return totals
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Run reproducible playthrough sweeps across processes.")
+    parser.add_argument('-n', '--games', type=int, default=100_000, help="games per difficulty")
+    parser.add_argument('-d', '--difficulty', type=float, nargs='+', default=[1.0, 1.5])
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--script', help="file with one command per line (default: random policy)")
+    args = parser.parse_args()
+
+    policy_spec = 'random'
+    if args.script:
+        with open(args.script) as f:
+            policy_spec = [line.rstrip('\n') for line in f]
+
+    start = time.perf_counter()
+    totals = run_sweep(args.games, args.difficulty, policy_spec, args.seed, args.workers, args.chunk)
+    elapsed = time.perf_counter() - start
+
+    played = args.games * len(args.difficulty)
+    print(json.dumps({str(d): stats.summary() for d, stats in totals.items()}, indent=2))
+    print(f"{played:,} games in {elapsed:.2f}s ({played / elapsed:,.0f} games/sec)")
@@ -0,0 +1,260 @@
+import warnings
+from array import array
+from collections import deque
+
+import game_utils as gu
+
+# --- World Graph Index ---
+# Built once from a LOCATIONS mapping. Every way of leaving a location is an
+# edge labelled with the command that takes it: 'go <direction>' for neighbors
+# and the action text for hidden exits ('search for cave'). Edges are stored as
+# compact CSR arrays (offsets/targets/labels). For each source location a BFS
+# row of distances and next-hop locations is cached, so once a row exists,
+# next_hop(src, dst) is an O(1) array read. Small worlds precompute every row
+# (all-pairs); large ones fill rows on first use. Edge edits re-run BFS only for
+# the sources whose shortest paths can actually change.
+
+UNREACHABLE = -1
+ALL_PAIRS_LIMIT = 2000 # Precompute every BFS row up to this many locations
+
+
+class WorldGraph:
+    """Routing and reachability index over a world's exits."""
+
+    def __init__(self, locations=None, start: str = 'start_clearing', all_pairs: bool = None):
+        locations = gu.LOCATIONS if locations is None else locations
+        self.names = list(locations)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.start = start
+        self.dangling = [] # (source, label, missing target)
+        self._edges = [[] for _ in self.names] # Mutable adjacency: [(label, target id)]
+        for name in self.names:
+            data = locations[name]
+            exits = [(f"go {direction}", target) for direction, target in data.get('neighbors', {}).items()]
+            exits += list(data.get('hidden_exits', {}).items())
+            for label, target in exits:
+                if target in self.ids:
+                    self._edges[self.ids[name]].append((label, self.ids[target]))
+                else:
+                    self.dangling.append((name, label, target))
+        self._rebuild()
+        self._dist = {}
+        self._hop = {}
+        if all_pairs if all_pairs is not None else len(self.names) <= ALL_PAIRS_LIMIT:
+            for source in range(len(self.names)):
+                self._bfs(source)
+
+    # --- Compact structure ---
+
+    def _rebuild(self):
+        """Packs the adjacency lists into CSR arrays and recomputes the SCCs."""
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.labels = []
+        self._step_label = {} # (from id, to id) -> command of the first such edge
+        for source, exits in enumerate(self._edges):
+            for label, target in exits:
+                self.targets.append(target)
+                self.labels.append(label)
+                self._step_label.setdefault((source, target), label)
+            self.offsets.append(len(self.targets))
+        self.components = self._strongly_connected()
+
+    def _strongly_connected(self) -> list:
+        """Iterative Tarjan: returns the component id of every location."""
+        n = len(self.names)
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        component = [-1] * n
+        stack = []
+        counter = 0
+        components = 0
+        offsets, targets = self.offsets, self.targets
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            work = [(root, offsets[root])]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, edge = work[-1]
+                if edge < offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = targets[edge]
+                    if index[target] == -1:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = True
+                        work.append((target, offsets[target]))
+                    elif on_stack[target]:
+                        low[node] = min(low[node], index[target])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component[member] = components
+                        if member == node:
+                            break
+                    components += 1
+        return component
+
+    def _bfs(self, source: int):
+        """Fills the distance and next-hop rows for one source."""
+        n = len(self.names)
+        dist = array('i', [UNREACHABLE]) * n
+        hop = array('i', [UNREACHABLE]) * n # Location id of the first step
+        dist[source] = 0
+        queue = deque([source])
+        offsets, targets = self.offsets, self.targets
+        while queue:
+            node = queue.popleft()
+            for edge in range(offsets[node], offsets[node + 1]):
+                target = targets[edge]
+                if dist[target] == UNREACHABLE:
+                    dist[target] = dist[node] + 1
+                    hop[target] = target if node == source else hop[node]
+                    queue.append(target)
+        self._dist[source] = dist
+        self._hop[source] = hop
+
+    def _row(self, source: int):
+        if source not in self._dist:
+            self._bfs(source)
+        return self._dist[source], self._hop[source]
+
+    # --- Queries ---
+
+    def distance(self, src: str, dst: str) -> int:
+        """Number of commands on the shortest route, or -1 if dst cannot be reached."""
+        return self._row(self.ids[src])[0][self.ids[dst]]
+
+    def next_hop(self, src: str, dst: str):
+        """The (command, next location) to take from src towards dst, or None."""
+        source = self.ids[src]
+        step = self._row(source)[1][self.ids[dst]]
+        if step == UNREACHABLE:
+            return None
+        return self._step_label[(source, step)], self.names[step]
+
+    def route(self, src: str, dst: str):
+        """Full list of (command, location) steps from src to dst; None if unreachable."""
+        if self.distance(src, dst) == UNREACHABLE:
+            return None
+        steps = []
+        while src != dst:
+            command, src = self.next_hop(src, dst)
+            steps.append((command, src))
+        return steps
+
+    def reachable(self, src: str, dst: str) -> bool:
+        return self.distance(src, dst) != UNREACHABLE
+
+    def same_component(self, a: str, b: str) -> bool:
+        """True when each location can be reached from the other."""
+        return self.components[self.ids[a]] == self.components[self.ids[b]]
+
+    # --- Incremental updates ---
+
+    def add_edge(self, src: str, label: str, dst: str):
+        u, v = self.ids[src], self.ids[dst]
+        self._edges[u].append((label, v))
+        self._rebuild()
+        # Only sources that now reach v more cheaply through u change
+        stale = [s for s, dist in self._dist.items()
+                 if dist[u] != UNREACHABLE and (dist[v] == UNREACHABLE or dist[u] + 1 < dist[v])]
+        self._refresh(stale)
+
+    def remove_edge(self, src: str, label: str):
+        u = self.ids[src]
+        removed = [v for edge_label, v in self._edges[u] if edge_label == label]
+        if not removed:
+            return
+        self._edges[u] = [(edge_label, v) for edge_label, v in self._edges[u] if edge_label != label]
+        self._rebuild()
+        # Only sources whose shortest paths could have used u -> v change
+        stale = [s for s, dist in self._dist.items()
+                 if dist[u] != UNREACHABLE and any(dist[v] == dist[u] + 1 for v in removed)]
+        self._refresh(stale)
+
+    def update_location(self, location_key: str, data: dict):
+        """Re-syncs one location's exits after its data changed."""
+        u = self.ids[location_key]
+        wanted = {f"go {direction}": target for direction, target in data.get('neighbors', {}).items()}
+        wanted.update(data.get('hidden_exits', {}))
+        current = {label: self.names[v] for label, v in self._edges[u]}
+        for label in current.keys() - wanted.keys():
+            self.remove_edge(location_key, label)
+        for label, target in wanted.items():
+            if current.get(label) != target:
+                if label in current:
+                    self.remove_edge(location_key, label)
+                self.add_edge(location_key, label, target)
+
+    def _refresh(self, sources):
+        for source in sources:
+            self._bfs(source)
+
+    # --- Validation ---
+
+    def validate(self) -> dict:
+        """Reports locations unreachable from the start, one-way edges and dangling exits."""
+        report = {'unreachable': [], 'one_way': [], 'dangling': list(self.dangling),
+                  'components': len(set(self.components))}
+        if self.start in self.ids:
+            dist = self._row(self.ids[self.start])[0]
+            report['unreachable'] = [name for i, name in enumerate(self.names) if dist[i] == UNREACHABLE]
+        for u, exits in enumerate(self._edges):
+            for label, v in exits:
+                if not any(back == u for _, back in self._edges[v]):
+                    report['one_way'].append((self.names[u], label, self.names[v]))
+        return report
+
+
+class WorldWarning(UserWarning):
+    """A world data file has unreachable locations, one-way edges or dangling exits."""
+
+
+def check_world(locations=None, start: str = 'start_clearing', source: str = 'world') -> dict:
+    """
+    The load-time validation: warns (WorldWarning) about every unreachable
+    location, one-way edge and dangling exit, and returns the validate() report.
+    Routes are left to be computed on demand, so only the exits are read.
+    """
+    report = WorldGraph(locations, start, all_pairs=False).validate()
+    if report['unreachable'] or report['one_way'] or report['dangling']:
+        warnings.warn(f"{source}: {format_report(report)}", WorldWarning, stacklevel=3)
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"Strongly connected components: {report['components']}"]
+    for name in report['unreachable']:
+        lines.append(f"UNREACHABLE: {name} cannot be reached from the start")
+    for src, label, dst in report['one_way']:
+        lines.append(f"ONE-WAY: {src} --{label}--> {dst} has no way back")
+    for src, label, dst in report['dangling']:
+        lines.append(f"DANGLING: {src} --{label}--> {dst} (no such location)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        gu.load_world(sys.argv[1])
+    graph = WorldGraph()
+    print(format_report(graph.validate()))
+    for target in ('secret_cave',):
+        if target in graph.ids:
+            route = graph.route(graph.start, target)
+            steps = " -> ".join(command for command, _ in route) if route else "unreachable"
+            print(f"Route {graph.start} -> {target}: {steps}")
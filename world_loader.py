@@ -0,0 +1,524 @@
+import marshal
+import os
+import struct
+# The same class as collections.abc.Mapping, without loading the collections
+# package before the game's first prompt (see startup.py)
+from _collections_abc import Mapping
+
+# --- Lazy, Streaming World Loader ---
+# The world lives in a JSON-lines data file (one location per line, see
+# world.jsonl) so content can be edited and diffed as text. Next to it sits a
+# binary index, "<data>.idx", mapping a 64-bit hash of each location key to the
+# position of its line. Both files are memory-mapped: opening a world reads
+# only the index header, a lookup is a binary search over the mapped index, and
+# a location is only decoded on first access, behind an LRU cache. Startup time
+# and resident memory therefore stay flat however many locations the map has.
+# The index also numbers the world's items and item placements, so
+# compact_state.WorldTable can intern a big world without reading all of it.
+#
+# Index layout: <4s magic><u16 version><u32 count><u64 data size><u64 data mtime_ns><u32 items size>
+#               followed by `count` records of <u64 key hash><u32 position>, sorted by hash,
+#               then `count` records of <u64 line offset><u32 items placed before it>, in file order,
+#               then the item names in order of first appearance, as a JSON array
+#
+# Small worlds (the shipped one) skip all of that at startup. They get a
+# precompiled snapshot, "<data>.snap": every location pre-encoded with marshal
+# and the whole table read in one read() call, so opening the world needs
+# neither json (and the re/enum modules behind it) nor hashlib. Each access
+# unmarshals a fresh dict, so pinned edits never leak into the pristine copy.
+#
+# Snapshot layout: <4s magic><u16 version><u16 marshal version><u64 data size><u64 data mtime_ns>
+#                  followed by marshal({location key: marshal(location dict)})
+
+INDEX_MAGIC = b'AQWI'
+INDEX_VERSION = 2
+_HEADER = struct.Struct('<4sHIQQI')
+_RECORD = struct.Struct('<QI') # Key hash, position
+_LINE = struct.Struct('<QI') # Line offset, items placed in earlier locations
+SNAPSHOT_MAGIC = b'AQWS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MAX_BYTES = 1 << 20 # Larger worlds stay lazy (a snapshot is held in memory whole)
+_SNAPSHOT_HEADER = struct.Struct('<4sHHQQ')
+DEFAULT_CACHE_SIZE = 4096
+
+json = None # Bound by _codecs() on first use
+_blake2b = None
+
+
+def _codecs():
+    """Imports json and blake2b the first time the index or data file is read."""
+    global json, _blake2b
+    if json is None:
+        import json as json_module
+        from hashlib import blake2b
+        json, _blake2b = json_module, blake2b
+
+
+def key_hash(location_key: str) -> int:
+    if _blake2b is None:
+        _codecs()
+    return int.from_bytes(_blake2b(location_key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _write_atomic(path: str, data: bytes):
+    """
+    Writes `data` through a temp file of its own and renames it over `path`.
+    Processes building the same file at once (pool workers all import the
+    world) therefore never interleave writes; the last rename simply wins.
+    """
+    import tempfile
+
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644) # mkstemp creates it private
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def build_index(data_path: str, index_path: str = None) -> bytes:
+    """
+    Scans the data file once and returns the index bytes.
+    Writes them to `index_path` (atomically) when one is given.
+    """
+    _codecs()
+    records, lines, items = [], [], {}
+    placed = 0
+    stat = os.stat(data_path)
+    with open(data_path, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                records.append((key_hash(entry['key']), len(lines)))
+                lines.append(_LINE.pack(offset, placed))
+                placed += len(entry['items'])
+                items.update(dict.fromkeys(entry['items']))
+            offset += len(line)
+    records.sort()
+    item_names = json.dumps(list(items), ensure_ascii=False).encode('utf-8')
+    parts = [_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(records), stat.st_size, stat.st_mtime_ns, len(item_names))]
+    parts.extend(_RECORD.pack(h, position) for h, position in records)
+    parts.extend(lines)
+    parts.append(item_names)
+    data = b''.join(parts)
+    if index_path is not None:
+        _write_atomic(index_path, data)
+    return data
+
+
+def _index_is_fresh(index_path: str, data_path: str) -> bool:
+    """True when the index was built from the current data file and is complete."""
+    try:
+        with open(index_path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            index_size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return False
+    if len(header) < _HEADER.size:
+        return False
+    magic, version, count, size, mtime_ns, items_size = _HEADER.unpack(header)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        return False
+    stat = os.stat(data_path)
+    # A truncated index would otherwise only fail later, mid-lookup
+    expected = _HEADER.size + count * (_RECORD.size + _LINE.size) + items_size
+    return size == stat.st_size and mtime_ns == stat.st_mtime_ns and index_size == expected
+
+
+def _map_file(path: str):
+    import mmap # Only index-backed worlds map files; the shipped world never does
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_snapshot(data_path: str, snapshot_path: str = None) -> dict:
+    """
+    Encodes every location of the data file; returns {key: marshalled location}.
+    Writes the snapshot to `snapshot_path` (atomically) when one is given.
+    """
+    _codecs()
+    stat = os.stat(data_path)
+    entries = {}
+    with open(data_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry.pop('key')] = marshal.dumps(entry)
+    if snapshot_path is not None:
+        header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, marshal.version, stat.st_size,
+                                       stat.st_mtime_ns)
+        _write_atomic(snapshot_path, header + marshal.dumps(entries))
+    return entries
+
+
+def load_snapshot(snapshot_path: str, data_path: str):
+    """The snapshot's {key: marshalled location}, or None if it is missing or older than the data file."""
+    try:
+        with open(snapshot_path, 'rb') as f:
+            buf = f.read()
+        stat = os.stat(data_path)
+    except OSError:
+        return None
+    if len(buf) < _SNAPSHOT_HEADER.size:
+        return None
+    magic, version, marshal_version, size, mtime_ns = _SNAPSHOT_HEADER.unpack_from(buf)
+    if (magic, version, marshal_version, size, mtime_ns) != (
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, marshal.version, stat.st_size, stat.st_mtime_ns):
+        return None
+    try:
+        return marshal.loads(memoryview(buf)[_SNAPSHOT_HEADER.size:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+class LazyWorld(Mapping):
+    """
+    Read-mostly mapping of location key -> location dict backed by a world data file.
+    Entries are decoded on first access and kept in an LRU cache of `cache_size`
+    entries. Locations that the game mutates are pinned with pin() so their
+    changes survive eviction. Data files up to SNAPSHOT_MAX_BYTES are read
+    through a precompiled snapshot instead of the index (`snapshot=False` opts out).
+    `validate` runs world_graph.check_world() on open: always (True), only after
+    a rebuild (None) or never (False); its report is kept in `problems`.
+    `defer` leaves opening (and validating) to the first access.
+    """
+
+    def __init__(self, data_path: str, cache_size: int = DEFAULT_CACHE_SIZE, index_path: str = None,
+                 snapshot: bool = True, validate: bool = None, defer: bool = False):
+        self.data_path = data_path
+        self.index_path = index_path or data_path + '.idx'
+        self.snapshot_path = data_path + '.snap'
+        self.cache_size = cache_size
+        self._cache = {} # Stays empty until opened, so a deferred world misses into _load()
+        self._pinned = {}
+        self.hits = 0
+        self.misses = 0
+        self._content_hash = None
+        self.problems = None
+        self._deferred = (snapshot, validate)
+        if not defer:
+            self._start()
+
+    def _ensure_open(self):
+        # Every path that reads the snapshot or index comes through here; the
+        # cache hit path never does, so an open world pays nothing for `defer`
+        if self._deferred is not None:
+            self._start()
+
+    def _start(self):
+        from collections import OrderedDict
+
+        snapshot, validate = self._deferred
+        self._deferred = None
+        self._cache = OrderedDict()
+        built = self._open(snapshot)
+        # Load-time checks (world_graph.check_world): by default only when the
+        # data file changed, i.e. when its snapshot or index had to be rebuilt
+        if validate or (validate is None and built):
+            from world_graph import check_world
+            self.problems = check_world(self, source=self.data_path)
+
+    def _open(self, snapshot: bool) -> bool:
+        """Reads (or first builds) the snapshot or index; returns True if it had to be built."""
+        self._snapshot = None
+        built = False
+        if snapshot:
+            self._snapshot = load_snapshot(self.snapshot_path, self.data_path)
+            if self._snapshot is None and os.path.getsize(self.data_path) <= SNAPSHOT_MAX_BYTES:
+                built = True
+                try:
+                    self._snapshot = build_snapshot(self.data_path, self.snapshot_path)
+                except OSError:
+                    self._snapshot = build_snapshot(self.data_path) # Read-only install
+        if self._snapshot is not None:
+            self._count = len(self._snapshot)
+            return built
+
+        self._index = None
+        if not _index_is_fresh(self.index_path, self.data_path):
+            built = True
+            try:
+                build_index(self.data_path, self.index_path)
+            except OSError:
+                # Read-only install: keep the index in memory instead
+                self._index = build_index(self.data_path)
+        if self._index is None:
+            self._index = _map_file(self.index_path)
+        self._data = _map_file(self.data_path)
+        (_, _, self._count, _, _, self._items_size) = _HEADER.unpack_from(self._index, 0)
+        self._lines_at = _HEADER.size + self._count * _RECORD.size
+        self._item_names = None
+        return built
+
+    # --- Index lookups ---
+
+    def _record(self, i: int) -> tuple:
+        return _RECORD.unpack_from(self._index, _HEADER.size + i * _RECORD.size)
+
+    def _line(self, position: int) -> tuple:
+        return _LINE.unpack_from(self._index, self._lines_at + position * _LINE.size)
+
+    def _positions(self, location_key: str):
+        """Yields the positions whose key hash matches (normally exactly one)."""
+        self._ensure_open()
+        target = key_hash(location_key)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self._count:
+            found, position = self._record(low)
+            if found != target:
+                return
+            yield position
+            low += 1
+
+    def _line_at(self, offset: int) -> dict:
+        if json is None:
+            _codecs()
+        end = self._data.find(b'\n', offset)
+        if end < 0:
+            end = len(self._data)
+        return json.loads(self._data[offset:end])
+
+    def _load(self, location_key: str):
+        self._ensure_open()
+        if self._snapshot is not None:
+            encoded = self._snapshot.get(location_key)
+            return None if encoded is None else marshal.loads(encoded)
+        for position in self._positions(location_key):
+            entry = self._line_at(self._line(position)[0])
+            if entry.pop('key') == location_key:
+                return entry
+        return None
+
+    # --- Positions (index-backed worlds only; see compact_state.WorldTable) ---
+
+    @property
+    def indexed(self) -> bool:
+        """True when locations are found through the index rather than a snapshot."""
+        self._ensure_open()
+        return self._snapshot is None
+
+    def position(self, location_key: str):
+        """The location's position (line number, blank lines skipped) in the data file, or None."""
+        for position in self._positions(location_key):
+            if self.key_at(position) == location_key:
+                return position
+        return None
+
+    def key_at(self, position: int) -> str:
+        self._ensure_open()
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._line_at(self._line(position)[0])['key']
+
+    def items_before(self, position: int) -> int:
+        """How many item placements the locations before `position` hold."""
+        self._ensure_open()
+        return self._line(position)[1]
+
+    @property
+    def item_names(self) -> tuple:
+        """Every item placed in the world, in order of first appearance."""
+        self._ensure_open()
+        if self._item_names is None:
+            if json is None:
+                _codecs()
+            start = self._lines_at + self._count * _LINE.size
+            self._item_names = tuple(json.loads(bytes(self._index[start:start + self._items_size])))
+        return self._item_names
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, location_key: str) -> dict:
+        entry = self._pinned.get(location_key)
+        if entry is not None:
+            return entry
+        entry = self._cache.get(location_key)
+        if entry is not None:
+            self.hits += 1
+            self._cache.move_to_end(location_key)
+            return entry
+        self.misses += 1
+        entry = self._load(location_key)
+        if entry is None:
+            raise KeyError(location_key)
+        if self.cache_size > 0:
+            self._cache[location_key] = entry
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def __contains__(self, location_key) -> bool:
+        if location_key in self._pinned or location_key in self._cache:
+            return True
+        return isinstance(location_key, str) and self._load(location_key) is not None
+
+    def __len__(self) -> int:
+        self._ensure_open()
+        return self._count
+
+    def __iter__(self):
+        # Keys in data-file order (a full sequential scan; not needed for play)
+        self._ensure_open()
+        if self._snapshot is not None:
+            yield from self._snapshot
+            return
+        _codecs()
+        offset = 0
+        size = len(self._data)
+        while offset < size:
+            end = self._data.find(b'\n', offset)
+            if end < 0:
+                end = size
+            line = self._data[offset:end]
+            if line.strip():
+                yield json.loads(line)['key']
+            offset = end + 1
+
+    def pin(self, location_key: str) -> dict:
+        """Returns the location's dict and keeps it resident so in-place edits are never evicted."""
+        entry = self._pinned.get(location_key)
+        if entry is None:
+            entry = self[location_key]
+            self._cache.pop(location_key, None)
+            self._pinned[location_key] = entry
+        return entry
+
+    def stored(self, location_key: str, default=None):
+        """The location as stored in the data file, ignoring pinned edits (and the cache)."""
+        entry = self._load(location_key)
+        return default if entry is None else entry
+
+    def pristine(self) -> dict:
+        """Every location as stored in the data file, ignoring pinned edits."""
+        return {location_key: self._load(location_key) for location_key in self}
+
+    def content_hash(self) -> int:
+        """64-bit blake2b of the data file, read on first call (names the world a save belongs to)."""
+        if self._content_hash is None:
+            _codecs()
+            digest = _blake2b(digest_size=8)
+            with open(self.data_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._content_hash = int.from_bytes(digest.digest(), 'little')
+        return self._content_hash
+
+    def edited(self) -> tuple:
+        """Keys of the pinned locations, the only ones whose dicts may differ from the data file."""
+        return tuple(self._pinned)
+
+    def discard_changes(self):
+        """Forgets every pinned (edited) location; the next access re-reads it from the data file."""
+        self._pinned.clear()
+
+    def cache_info(self) -> dict:
+        return {'size': len(self._cache), 'max_size': self.cache_size, 'pinned': len(self._pinned),
+                'hits': self.hits, 'misses': self.misses}
+
+
+def write_world(locations, data_path: str) -> str:
+    """Writes a LOCATIONS-style mapping as a world data file (and rebuilds its index)."""
+    _codecs()
+    with open(data_path, 'w', encoding='utf-8') as f:
+        for location_key, data in locations.items():
+            f.write(json.dumps({'key': location_key, **data}, ensure_ascii=False) + "\n")
+    build_index(data_path, data_path + '.idx')
+    return data_path
+
+
+def generate_world(size: int, data_path: str) -> str:
+    """Writes a synthetic ring-of-rooms map with `size` locations (for load testing)."""
+    _codecs()
+    with open(data_path, 'w', encoding='utf-8') as f:
+        for i in range(size):
+            entry = {
+                'key': f'room_{i}',
+                'description': f"You are in room {i} of a very large maze.",
+                'actions': ['go north', 'go south', 'look around'],
+                'items': ['pebble'] if i % 10 == 0 else [],
+                'challenge': 'GHOSTLY_ENCOUNTER' if i % 97 == 0 else None,
+                'neighbors': {'north': f'room_{(i + 1) % size}', 'south': f'room_{(i - 1) % size}'},
+                'ascii': '',
+            }
+            f.write(json.dumps(entry) + "\n")
+    build_index(data_path, data_path + '.idx')
+    return data_path
+
+
+def _private_memory_kb() -> int:
+    """Anonymous (non file-backed) resident memory; mapped world pages are page cache, not heap."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Build world indexes or benchmark the lazy loader.")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    index = sub.add_parser('index', help="(re)build the index for a world data file")
+    index.add_argument('data_path')
+    bench = sub.add_parser('bench', help="startup time and memory for growing synthetic maps")
+    bench.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    probe = sub.add_parser('probe', help=argparse.SUPPRESS)
+    probe.add_argument('data_path')
+    args = parser.parse_args()
+    _codecs()
+
+    if args.mode == 'index':
+        import warnings
+
+        from world_graph import format_report
+
+        build_index(args.data_path, args.data_path + '.idx')
+        print(f"Indexed {args.data_path}")
+        # The load-time checks: unreachable locations, one-way and dangling exits
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') # Printed in full below instead
+            world = LazyWorld(args.data_path, validate=True)
+        print(format_report(world.problems))
+    elif args.mode == 'probe':
+        # Runs in a fresh interpreter so memory reflects only this world
+        start = time.perf_counter()
+        world = LazyWorld(args.data_path, cache_size=1024)
+        opened = time.perf_counter() - start
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(10_000):
+            world.get(f'room_{rng.randrange(len(world))}')
+        lookups = (time.perf_counter() - start) / 10_000
+        print(json.dumps({'open_ms': opened * 1000, 'lookup_us': lookups * 1e6, 'heap_kb': _private_memory_kb()}))
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            for size in args.sizes:
+                path = generate_world(size, os.path.join(folder, f'world_{size}.jsonl'))
+                out = subprocess.run([sys.executable, __file__, 'probe', path], capture_output=True, text=True, check=True)
+                stats = json.loads(out.stdout)
+                print(f"{size:>9,} locations: open {stats['open_ms']:.2f} ms, "
+                      f"lookup {stats['lookup_us']:.1f} us, private memory {stats['heap_kb'] / 1024:.1f} MiB")